@@ -0,0 +1,63 @@
+"""Compare two benchmark result files: ``python -m benchmarks.compare base.json new.json``."""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+# Metrics where a larger value is better; every other metric is a latency
+HIGHER_IS_BETTER = {"throughput_per_s"}
+
+
+def compare(baseline: Dict, candidate: Dict, metric: str = "p50_ms", threshold: float = 0.10) -> List[Dict]:
+    """Pair results by (suite, name) and flag changes worse than ``threshold``."""
+    before = {(r["suite"], r["name"]): r["stats"] for r in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        key = (result["suite"], result["name"])
+        if key not in before or before[key].get(metric) in (None, 0):
+            continue
+        old, new = before[key][metric], result["stats"][metric]
+        change = (new - old) / old
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        rows.append({
+            "suite": key[0],
+            "name": key[1],
+            "baseline": old,
+            "candidate": new,
+            "change": round(change, 4),
+            "regression": worse > threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="p50_ms", help="Stat to compare, e.g. p99_ms or throughput_per_s")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    for label, data in (("baseline", baseline), ("candidate", candidate)):
+        env = data["environment"]
+        print(f"{label}: {env['commit'] or 'unknown'}{' (dirty)' if env['dirty'] else ''} on {env['platform']}")
+
+    rows = compare(baseline, candidate, args.metric, args.threshold)
+    width = max((len(f"{r['suite']}/{r['name']}") for r in rows), default=10)
+    print(f"\n{'benchmark':<{width}}  {'baseline':>12}  {'candidate':>12}  {'change':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['suite'] + '/' + row['name']:<{width}}  {row['baseline']:>12}  "
+            f"{row['candidate']:>12}  {row['change']:>+8.1%}{flag}"
+        )
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import io
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Square thumbnails up to full-resolution phone photos
+SIZES: Dict[str, Tuple[int, int]] = {
+    "small": (320, 320),
+    "medium": (1280, 960),
+    "large": (4032, 3024),
+}
+FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+class CorpusImage(NamedTuple):
+    name: str
+    format: str
+    size: Tuple[int, int]
+    data: bytes
+
+
+def synthetic_image(size: Tuple[int, int], seed: int) -> Image.Image:
+    """A smooth random field: compresses like a photo rather than like noise or a flat colour."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    coarse = rng.integers(0, 256, (max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+
+
+def encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def build_corpus(
+    sizes: Iterable[str] = tuple(SIZES), formats: Iterable[str] = FORMATS, seed: int = 0
+) -> List[CorpusImage]:
+    """Deterministic images for every (size, format) pair, so runs are comparable."""
+    corpus = []
+    for index, size_name in enumerate(sizes):
+        image = synthetic_image(SIZES[size_name], seed + index)
+        for fmt in formats:
+            width, height = image.size
+            corpus.append(CorpusImage(f"{fmt.lower()}-{width}x{height}", fmt, image.size, encode(image, fmt)))
+    return corpus
+
+
+def unique_variant(data: bytes, index: int) -> bytes:
+    """Same pixels, different bytes.
+
+    JPEG, PNG and WebP decoders ignore trailing data, but the result cache
+    hashes the raw bytes, so every request is a genuine cache miss.
+    """
+    return data + b"\0benchmark-" + str(index).encode()
@@ -0,0 +1,101 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+PACKAGES = ("torch", "ultralytics", "onnxruntime", "openvino", "pillow", "numpy", "fastapi")
+
+
+def summarize(
+    samples: Sequence[float], items_per_sample: int = 1, wall_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """Latency percentiles (ms) and throughput (items/s) from per-sample durations in seconds.
+
+    ``wall_seconds`` overrides the elapsed time used for throughput when
+    samples overlapped (concurrent requests).
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(count - 1, int(p * count))] * 1000, 3)
+
+    elapsed = wall_seconds if wall_seconds is not None else sum(ordered)
+    return {
+        "samples": count,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "stdev_ms": round(statistics.stdev(ordered) * 1000, 3) if count > 1 else 0.0,
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "throughput_per_s": round(count * items_per_sample / elapsed, 3) if elapsed else None,
+    }
+
+
+def time_call(fn: Callable[[], Any], repeat: int, warmup: int = 1, items_per_call: int = 1) -> Dict[str, Any]:
+    """Run ``fn`` ``warmup`` times untimed, then ``repeat`` timed times."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, items_per_sample=items_per_call)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Everything needed to tell whether two result files are comparable."""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+class BenchmarkResults:
+    """Collects results as ``{"environment", "config", "results": [...]}``."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, suite: str, name: str, params: Dict[str, Any], stats: Dict[str, Any]) -> None:
+        self.results.append({"suite": suite, "name": name, "params": params, "stats": stats})
+        print(f"[{suite}] {name}: p50={stats['p50_ms']}ms throughput={stats['throughput_per_s']}/s", file=sys.stderr)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"environment": environment(), "config": self.config, "results": self.results}
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
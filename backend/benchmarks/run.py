@@ -0,0 +1,280 @@
+"""Benchmark suite for the detection service.
+
+Run from ``backend/``::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --quick --suites decode inference
+
+Compare two runs with ``python -m benchmarks.compare``.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List
+
+from .corpus import FORMATS, SIZES, build_corpus, unique_variant
+from .harness import BenchmarkResults, summarize, time_call
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_ROOT = os.path.join(BACKEND_ROOT, "src")
+if SRC_ROOT not in sys.path:
+    sys.path.insert(0, SRC_ROOT)
+
+
+def bench_decode(results: BenchmarkResults, corpus, args) -> None:
+    """ImageProcessor decode/resize, then tensor preprocessing (fresh array and reused buffer), per corpus image."""
+    from detection_service.backends import BatchBuffer, preprocess
+    from detection_service.main import Config, ImageProcessor
+
+    buffer = BatchBuffer(Config.MODEL_INPUT_SIZE)
+    for item in corpus:
+        params = {"format": item.format, "width": item.size[0], "height": item.size[1], "bytes": len(item.data)}
+        decode = lambda: ImageProcessor.process_image(ImageProcessor.open_image(item.data))
+        results.add("decode", item.name, params, time_call(decode, args.repeat))
+
+        processed = decode()
+        tensor = lambda: preprocess(processed, Config.MODEL_INPUT_SIZE)
+        results.add("preprocess", item.name, params, time_call(tensor, args.repeat))
+        results.add("preprocess_buffer", item.name, params, time_call(lambda: buffer.fill([processed]), args.repeat))
+
+
+def bench_inference(results: BenchmarkResults, corpus, args) -> None:
+    """Model forward passes by backend and batch size."""
+    from detection_service.backends import load_backend
+    from detection_service.main import Config, ImageProcessor
+
+    images = [ImageProcessor.process_image(ImageProcessor.open_image(item.data)) for item in corpus]
+    for backend_name in args.backends:
+        model = load_backend(backend_name, Config.MODEL_PATH, threads=args.threads)
+        for batch_size in args.batch_sizes:
+            batch = [images[i % len(images)] for i in range(batch_size)]
+            stats = time_call(lambda: model(batch), args.repeat, items_per_call=batch_size)
+            params = {"backend": backend_name, "batch_size": batch_size, "threads": args.threads}
+            results.add("inference", f"{backend_name}-batch{batch_size}", params, stats)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(module_args: List[str]):
+    """Start a server subprocess on a free port and wait until /health answers."""
+    import httpx
+
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_ROOT, os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen(
+        [sys.executable, "-m", *module_args, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120)
+    deadline = time.monotonic() + 300
+    while True:
+        try:
+            if client.get("/health").status_code == 200:
+                return server, client
+        except httpx.TransportError:
+            pass
+        if server.poll() is not None or time.monotonic() > deadline:
+            client.close()
+            _stop_server(server)
+            raise RuntimeError("Benchmark server failed to start")
+        time.sleep(0.5)
+
+
+def _stop_server(server) -> None:
+    server.terminate()
+    server.wait(timeout=30)
+
+
+def _load_test(client, item, concurrency: int, requests: int, counter) -> dict:
+    """POST byte-unique copies of ``item`` with ``concurrency`` clients; latency stats plus errors."""
+    mime_types = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+    def request(_):
+        data = unique_variant(item.data, next(counter))
+        start = time.perf_counter()
+        response = client.post(
+            "/classify-frog",
+            files={"file": (f"{item.name}.img", data, mime_types[item.format])},
+        )
+        return time.perf_counter() - start, response.status_code
+
+    request(None)  # Warm up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(request, range(requests)))
+    stats = summarize([latency for latency, _ in outcomes], wall_seconds=time.perf_counter() - start)
+    stats["errors"] = sum(1 for _, code in outcomes if code != 200)
+    return stats
+
+
+def _child_pids(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_mb(pid: int) -> dict:
+    from detection_service.metrics import memory_usage
+
+    return {name: round(value / 2**20, 1) for name, value in memory_usage(str(pid)).items()}
+
+
+def bench_http(results: BenchmarkResults, corpus, args) -> None:
+    """End-to-end POST /classify-frog against a real uvicorn server, by concurrency."""
+    server, client = _start_server(["uvicorn", "detection_service.main:app"])
+    try:
+        counter = iter(range(sys.maxsize))
+        for item in corpus:
+            for concurrency in args.concurrency:
+                stats = _load_test(client, item, concurrency, args.requests, counter)
+                stats["memory_mb"] = _memory_mb(server.pid)
+                params = {"format": item.format, "width": item.size[0], "height": item.size[1], "concurrency": concurrency}
+                results.add("http", f"{item.name}-c{concurrency}", params, stats)
+    finally:
+        client.close()
+        _stop_server(server)
+
+
+def bench_serve(results: BenchmarkResults, corpus, args) -> None:
+    """Pre-fork server (detection_service.serve) by worker count: throughput and memory per worker.
+
+    Memory is read after the load test. ``pss`` splits pages shared through
+    the fork (the model weights) between processes and ``uss`` counts only
+    private pages, so ``worker_uss_mb`` is the cost of adding one more worker.
+    Needs Linux ``/proc`` for the memory figures.
+    """
+    item = max(corpus, key=lambda entry: entry.size[0] * entry.size[1])
+    concurrency = max(args.concurrency)
+    for workers in args.workers:
+        server, client = _start_server(["detection_service.serve", "--workers", str(workers)])
+        try:
+            stats = _load_test(client, item, concurrency, args.requests * workers, iter(range(sys.maxsize)))
+            parent = _memory_mb(server.pid)
+            children = [_memory_mb(pid) for pid in _child_pids(server.pid)]
+            if children and parent:
+                stats["memory_mb"] = {
+                    "parent": parent,
+                    "worker_rss_mb": round(statistics.fmean(child["rss"] for child in children), 1),
+                    "worker_pss_mb": round(statistics.fmean(child["pss"] for child in children), 1),
+                    "worker_uss_mb": round(statistics.fmean(child["uss"] for child in children), 1),
+                    "total_pss_mb": round(parent["pss"] + sum(child["pss"] for child in children), 1),
+                }
+            params = {"workers": workers, "concurrency": concurrency, "format": item.format,
+                      "width": item.size[0], "height": item.size[1]}
+            results.add("serve", f"workers{workers}", params, stats)
+        finally:
+            client.close()
+            _stop_server(server)
+
+
+def bench_lambda(results: BenchmarkResults, corpus, args) -> None:
+    """lambda_handler in single and batch mode, reading from a local S3 stand-in."""
+    root = tempfile.mkdtemp(prefix="benchmark-s3-")
+    os.environ["LOCAL_S3_ROOT"] = root
+    from detection_service import lambda_function
+    from detection_service.s3io import LocalS3Client
+
+    client = LocalS3Client(root, latency_ms=args.s3_latency_ms)
+    lambda_function.s3 = client
+    lambda_function.fetcher.client = client
+    context = SimpleNamespace(aws_request_id="benchmark")
+
+    def invoke(body):
+        response = lambda_function.lambda_handler({"body": json.dumps(body)}, context)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"Lambda returned {response['statusCode']}: {response['body']}")
+
+    for item in corpus:
+        keys = iter(range(sys.maxsize))
+
+        def upload(count: int) -> List[str]:
+            names = []
+            for _ in range(count):
+                index = next(keys)
+                name = f"{item.name}/{index}"
+                client.put_object(Bucket="benchmark", Key=name, Body=unique_variant(item.data, index))
+                names.append(name)
+            return names
+
+        params = {"format": item.format, "width": item.size[0], "height": item.size[1], "s3_latency_ms": args.s3_latency_ms}
+        single = iter(upload(args.repeat + 1))
+        stats = time_call(lambda: invoke({"bucket": "benchmark", "key": next(single)}), args.repeat)
+        results.add("lambda", f"{item.name}-single", params, stats)
+
+        batch_size = lambda_function.Config.BATCH_MAX_SIZE
+        batches = iter([upload(batch_size) for _ in range(args.repeat + 1)])
+        stats = time_call(
+            lambda: invoke({"items": [{"bucket": "benchmark", "key": key} for key in next(batches)]}),
+            args.repeat, items_per_call=batch_size,
+        )
+        results.add("lambda", f"{item.name}-batch{batch_size}", dict(params, batch_size=batch_size), stats)
+
+
+SUITES = {
+    "decode": bench_decode,
+    "inference": bench_inference,
+    "http": bench_http,
+    "serve": bench_serve,
+    "lambda": bench_lambda,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection service and emit JSON results.")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per benchmark")
+    parser.add_argument("--backends", nargs="+", default=["torch"])
+    parser.add_argument("--threads", type=int, default=0, help="Inference threads (0 = runtime default)")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="HTTP requests per concurrency level (per worker for serve)")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="Worker counts for the serve suite")
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0, help="Simulated S3 round-trip time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="Small corpus and few iterations, for smoke runs")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes = args.sizes[:2]
+        args.formats = ["JPEG"]
+        args.repeat = min(args.repeat, 3)
+        args.batch_sizes = [1, 8]
+        args.concurrency = [1, 4]
+        args.workers = [1, 2]
+        args.requests = min(args.requests, 8)
+
+    # Keep the benchmark's own output readable; the service's basicConfig calls become no-ops
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault("YOLO_VERBOSE", "False")
+    corpus = build_corpus(args.sizes, args.formats, seed=args.seed)
+    results = BenchmarkResults(config={k: v for k, v in vars(args).items() if k != "output"})
+    for suite in args.suites:
+        SUITES[suite](results, corpus, args)
+
+    if args.output:
+        results.write(args.output)
+    else:
+        json.dump(results.to_dict(), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
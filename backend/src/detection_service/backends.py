@@ -0,0 +1,285 @@
+import ast
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+PREPARED_MODEL = "model.onnx"
+PREPARED_WEIGHTS = "model.weights"
+PREPARED_MANIFEST = "prepared.json"
+
+
+class Prediction(NamedTuple):
+    """Class probabilities for one image, independent of the runtime that produced them."""
+    probs: np.ndarray
+    names: Dict[int, str]
+
+
+def preprocess_into(image: Image.Image, out: np.ndarray) -> np.ndarray:
+    """Resize short side, center crop and scale into ``out``, a (3, S, S) float32 array.
+
+    Mirrors ultralytics' ``classify_transforms`` (torchvision Resize with
+    bilinear interpolation, CenterCrop, ToTensor, zero mean / unit std) so
+    scores match the PyTorch predictor. Images already at model resolution
+    (as ``preprocessing`` leaves them) skip the resize; the crop and the
+    HWC -> CHW transpose are views of the pixel array, and the float
+    conversion and scaling are one pass writing straight into ``out``.
+    """
+    input_size = out.shape[-1]
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    width, height = image.size
+    if width <= height:
+        new_size = (input_size, int(input_size * height / width))
+    else:
+        new_size = (int(input_size * width / height), input_size)
+    if new_size != image.size:
+        image = image.resize(new_size, Image.Resampling.BILINEAR)
+
+    left = int(round((new_size[0] - input_size) / 2.0))
+    top = int(round((new_size[1] - input_size) / 2.0))
+    pixels = np.asarray(image)[top:top + input_size, left:left + input_size]
+    return np.divide(pixels.transpose(2, 0, 1), np.float32(255.0), out=out, dtype=np.float32)
+
+
+def preprocess(image: Image.Image, input_size: int) -> np.ndarray:
+    """``preprocess_into`` a freshly allocated CHW float32 array."""
+    return preprocess_into(image, np.empty((3, input_size, input_size), dtype=np.float32))
+
+
+class BatchBuffer:
+    """Reusable (N, 3, S, S) float32 model input, one per calling thread.
+
+    ``fill`` preprocesses images straight into it instead of stacking
+    per-image arrays; the buffer grows to the largest batch seen and is then
+    reused, so steady-state batches allocate no input memory. The returned
+    view is overwritten by the thread's next ``fill``.
+    """
+
+    def __init__(self, input_size: int):
+        self.input_size = input_size
+        self._local = threading.local()
+
+    def fill(self, images: Sequence[Image.Image]) -> np.ndarray:
+        array = getattr(self._local, "array", None)
+        if array is None or len(array) < len(images):
+            array = np.empty((len(images), 3, self.input_size, self.input_size), dtype=np.float32)
+            self._local.array = array
+        batch = array[:len(images)]
+        for image, out in zip(images, batch):
+            preprocess_into(image, out)
+        return batch
+
+
+class InferenceBackend:
+    """Common interface for classifier runtimes.
+
+    Calling a backend with one image or a list of images returns a list of
+    ``Prediction`` objects, one per image, mirroring ``YOLO.__call__``.
+    """
+
+    name = "base"
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self.names: Dict[int, str] = {}
+        self.input_size = 224
+        self._buffer: Optional[BatchBuffer] = None
+
+    def batch_input(self, images: Sequence[Image.Image]) -> np.ndarray:
+        """Preprocess ``images`` into this backend's reusable (N, 3, S, S) input buffer."""
+        if self._buffer is None or self._buffer.input_size != self.input_size:
+            self._buffer = BatchBuffer(self.input_size)
+        return self._buffer.fill(images)
+
+    def predict_probs(self, images: Sequence[Image.Image]) -> np.ndarray:
+        """Return an (N, num_classes) float32 probability matrix."""
+        raise NotImplementedError
+
+    def __call__(self, images: Union[Image.Image, Sequence[Image.Image]]) -> List[Prediction]:
+        if isinstance(images, Image.Image):
+            images = [images]
+        probs = self.predict_probs(list(images))
+        return [Prediction(row, self.names) for row in probs]
+
+    def warmup(self) -> None:
+        """Run one forward pass so lazy allocations happen before the first request."""
+        self.predict_probs([Image.new("RGB", (self.input_size, self.input_size))])
+
+    def share_memory(self) -> None:
+        """Prepare loaded weights to be shared with forked worker processes.
+
+        ONNX Runtime and OpenVINO keep weights in native buffers that forked
+        children share copy-on-write (prepared ONNX artifacts are memory-mapped
+        as well), so by default there is nothing to do.
+        """
+
+
+class TorchBackend(InferenceBackend):
+    """Reference backend running the ultralytics PyTorch model.
+
+    The network is called directly on ``batch_input`` tensors rather than
+    through the ultralytics predictor, which re-checks its setup and round
+    trips every image through BGR numpy and torchvision transforms per call.
+    Conv and batch-norm layers are fused at load, as the predictor would.
+    """
+
+    name = "torch"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None):
+        super().__init__(model_path)
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        args = getattr(self.model.model, "args", None) or {}
+        self.input_size = int(args.get("imgsz", self.input_size))
+        self.network = self.model.model.float().eval().requires_grad_(False)
+        with torch.no_grad():
+            self.network.fuse(verbose=False)
+
+    def predict_probs(self, images: Sequence[Image.Image]) -> np.ndarray:
+        # from_numpy shares the buffer's memory rather than copying it
+        batch = self.torch.from_numpy(self.batch_input(images))
+        with self.torch.inference_mode():
+            probs = self.network(batch)
+        if isinstance(probs, (list, tuple)):
+            # Newer ultralytics classify heads return (probabilities, logits)
+            probs = probs[0]
+        return probs.float().numpy()
+
+    def share_memory(self) -> None:
+        """Move the fused parameters and buffers into shared memory."""
+        self.network.share_memory()
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU backend for models exported with ``detection_service.export``.
+
+    ``model_path`` may also be a prepared runtime directory (see
+    ``export.prepare_runtime_artifact``): a pre-optimized graph whose weights
+    live in a separate file that onnxruntime memory-maps instead of copying.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, intra_op_threads: int = 0, inter_op_threads: int = 1):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        optimization = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if os.path.isdir(model_path):
+            with open(os.path.join(model_path, PREPARED_MANIFEST)) as f:
+                manifest = json.load(f)
+            # A fully optimized graph needs no work at load time
+            if manifest["optimization"] == "all":
+                optimization = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            model_path = os.path.join(model_path, PREPARED_MODEL)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = optimization
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0 lets onnxruntime use one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+        if "imgsz" in metadata:
+            self.input_size = int(ast.literal_eval(metadata["imgsz"])[0])
+
+    def predict_probs(self, images: Sequence[Image.Image]) -> np.ndarray:
+        return self.session.run(None, {self.input_name: self.batch_input(images)})[0]
+
+
+class OpenVINOBackend(InferenceBackend):
+    """OpenVINO CPU backend for a ``<stem>_openvino_model`` export directory."""
+
+    name = "openvino"
+
+    def __init__(self, model_path: str, threads: int = 0):
+        super().__init__(model_path)
+        import openvino as ov
+        import yaml
+
+        xml_path = next(
+            os.path.join(model_path, f) for f in os.listdir(model_path) if f.endswith(".xml")
+        )
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = ov.Core().compile_model(xml_path, "CPU", config)
+
+        with open(os.path.join(model_path, "metadata.yaml")) as f:
+            metadata = yaml.safe_load(f)
+        self.names = {int(k): v for k, v in metadata["names"].items()}
+        self.input_size = int(metadata.get("imgsz", [self.input_size])[0])
+
+    def predict_probs(self, images: Sequence[Image.Image]) -> np.ndarray:
+        return self.compiled(self.batch_input(images))[0]
+
+
+QUANTIZATION_MODES = ("none", "dynamic", "static")
+
+
+def prepared_artifact_dir(onnx_path: str) -> str:
+    """Directory holding the ready-to-run version of an ONNX model."""
+    stem, _ = os.path.splitext(onnx_path)
+    return f"{stem}.prepared"
+
+
+def artifact_path(backend: str, model_path: str, quantization: str = "none") -> str:
+    """Where ``detection_service.export``/``quantize`` write the artifact for a backend."""
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {quantization}")
+    if quantization != "none" and backend != "onnx":
+        raise ValueError("INT8 quantization is only supported for the onnx backend")
+
+    stem, _ = os.path.splitext(model_path)
+    if backend == "onnx":
+        return f"{stem}.onnx" if quantization == "none" else f"{stem}.int8-{quantization}.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    return model_path
+
+
+def load_backend(
+    name: str,
+    model_path: str,
+    threads: int = 0,
+    inter_op_threads: int = 1,
+    quantization: str = "none",
+    prepared: bool = False,
+) -> InferenceBackend:
+    """Instantiate the named backend for the given source ``.pt`` model.
+
+    With ``prepared`` the onnx backend loads the ready-to-run artifact when
+    it exists, falling back to the plain export otherwise.
+    """
+    path = artifact_path(name, model_path, quantization)
+    if prepared and name == "onnx" and os.path.isdir(prepared_artifact_dir(path)):
+        path = prepared_artifact_dir(path)
+    if name == "torch":
+        backend = TorchBackend(path, threads=threads or None)
+    elif name == "onnx":
+        backend = OnnxBackend(path, intra_op_threads=threads, inter_op_threads=inter_op_threads)
+    elif name == "openvino":
+        backend = OpenVINOBackend(path, threads=threads)
+    else:
+        raise ValueError(f"Unknown inference backend: {name}")
+    logger.info(f"Loaded {name} inference backend from {path}")
+    return backend
@@ -0,0 +1,178 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .executors import SaturatedError
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStats:
+    """Thread-safe counters describing scheduler behaviour."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self.batch_sizes: Counter = Counter()
+        self.total_items = 0
+        self.total_batches = 0
+        self._wait_times = deque(maxlen=window)
+
+    def record_batch(self, wait_times: Sequence[float]) -> None:
+        with self._lock:
+            self.batch_sizes[len(wait_times)] += 1
+            self.total_batches += 1
+            self.total_items += len(wait_times)
+            self._wait_times.extend(wait_times)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._wait_times)
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+            total_items, total_batches = self.total_items, self.total_batches
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3)
+
+        return {
+            "total_items": total_items,
+            "total_batches": total_batches,
+            "mean_batch_size": round(total_items / total_batches, 3) if total_batches else 0.0,
+            "batch_size_histogram": batch_sizes,
+            "wait_ms": {
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0,
+            },
+        }
+
+
+class _Request:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """Coalesce single-item requests into batched calls of ``predict_fn``.
+
+    ``predict_fn`` receives a list of items and must return a sequence of
+    results in the same order. Items are collected until ``max_batch_size``
+    is reached or the oldest item has waited ``max_wait_ms``. When
+    ``max_queue_size`` is set, submissions that would exceed it raise
+    ``SaturatedError`` instead of waiting.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        max_queue_size: Optional[int] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self._start()
+
+    def _start(self) -> None:
+        self.stats = BatchStats()
+        self.rejected = 0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._depth_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def after_fork(self) -> None:
+        """Restart in a forked child, which inherits the queue but not the scheduler thread."""
+        self._start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, item: Any) -> Future:
+        """Queue a single item and return a future for its result."""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: Sequence[Any]) -> List[Future]:
+        """Queue several items at once; either all are accepted or none are."""
+        with self._depth_lock:
+            if self.max_queue_size is not None and self.queue_depth + len(items) > self.max_queue_size:
+                self.rejected += 1
+                raise SaturatedError(f"Inference queue full ({self.max_queue_size} items)")
+            requests = [_Request(item) for item in items]
+            for request in requests:
+                self._queue.put(request)
+        return [request.future for request in requests]
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Claiming each future marks it running, so a waiter cancelled from
+            # here on can no longer cancel it; ones already cancelled are dropped
+            batch = [request for request in self._collect() if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            self.stats.record_batch([started - request.enqueued_at for request in batch])
+            try:
+                results = self.predict_fn([request.item for request in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"predict_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}")
+                for request in batch:
+                    self._resolve(request.future, error=e)
+                continue
+
+            for request, result in zip(batch, results):
+                self._resolve(request.future, result)
+
+    @staticmethod
+    def _resolve(future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Complete one waiter; a failure here must not take the scheduler thread down."""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            logger.error(f"Could not deliver a batched result: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, batch-size histogram and wait-time percentiles."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "rejected_submissions": self.rejected,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            **self.stats.snapshot(),
+        }
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def model_fingerprint(model_path: str) -> str:
+    """Identify a model file cheaply so cached results are invalidated on swap."""
+    try:
+        stat = os.stat(model_path)
+        return f"{os.path.basename(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return os.path.basename(model_path)
+
+
+def content_key(data: bytes, model_version: str, threshold: float) -> str:
+    """Hash raw image bytes together with everything that affects the result."""
+    return finish_key(hashlib.sha256(data), model_version, threshold)
+
+
+def finish_key(digest: "hashlib._Hash", model_version: str, threshold: float) -> str:
+    """Complete a key from a sha256 already fed the image bytes (e.g. while streaming)."""
+    digest.update(f"|{model_version}|{threshold!r}".encode())
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """In-process LRU with optional time-to-live per entry."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class CacheBackend:
+    """Shared cache tier interface. Values are JSON-serializable dicts."""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def after_fork(self) -> None:
+        """Drop state a forked child must not share with its parent."""
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache tier in a SQLite file, safe to share between local processes."""
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._connect()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+
+    def after_fork(self) -> None:
+        # SQLite connections must not be used across fork; open one per process
+        self._connect()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if self.ttl_seconds and created + self.ttl_seconds <= time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+
+class FileCacheBackend(CacheBackend):
+    """Cache tier storing one JSON file per key under a directory."""
+
+    def __init__(self, directory: str, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            if self.ttl_seconds and os.path.getmtime(path) + self.ttl_seconds <= time.time():
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+
+def backend_from_uri(uri: Optional[str], ttl_seconds: Optional[float] = None) -> Optional[CacheBackend]:
+    """Build a shared tier from ``sqlite:///path.db`` or ``file:///directory``."""
+    if not uri:
+        return None
+    parsed = urlparse(uri)
+    path = parsed.netloc + parsed.path
+    if parsed.scheme == "sqlite":
+        return SQLiteCacheBackend(path, ttl_seconds=ttl_seconds)
+    if parsed.scheme == "file":
+        return FileCacheBackend(path, ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unsupported cache backend URI: {uri}")
+
+
+class ResultCache:
+    """Two-tier classification result cache keyed by image content hash."""
+
+    def __init__(
+        self,
+        model_version: str,
+        threshold: float,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        shared: Optional[CacheBackend] = None,
+    ):
+        self.model_version = model_version
+        self.threshold = threshold
+        self.local = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+
+    def key_for(self, data: bytes) -> str:
+        return content_key(data, self.model_version, self.threshold)
+
+    def key_from_digest(self, digest: "hashlib._Hash") -> str:
+        return finish_key(digest, self.model_version, self.threshold)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Shared cache lookup failed: {str(e)}")
+                self._count("shared_errors")
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+                self._count("shared_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed: {str(e)}")
+                self._count("shared_errors")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["local_hits"] + counters["shared_hits"] + counters["misses"]
+        hits = counters["local_hits"] + counters["shared_hits"]
+        return {
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_evictions": self.local.evictions,
+            "shared_backend": type(self.shared).__name__ if self.shared else None,
+        }
@@ -0,0 +1,229 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .backends import InferenceBackend, load_backend
+from .scoring import FrogScorer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_band(text: str) -> Tuple[float, float]:
+    """``"0.2:0.8"`` -> (0.2, 0.8)."""
+    low, _, high = text.partition(":")
+    return float(low), float(high)
+
+
+def check_band(low: float, high: float, threshold: float) -> None:
+    if not 0.0 <= low <= threshold <= high <= 1.0:
+        raise ValueError(
+            f"Cascade band [{low}, {high}] must lie within [0, 1] and contain the threshold {threshold}"
+        )
+
+
+class CascadeStats:
+    """Thread-safe escalation counts and per-model inference time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+        self.small_seconds = 0.0
+        self.large_seconds = 0.0
+
+    def record(self, images: int, escalated: int, small_seconds: float, large_seconds: float) -> None:
+        with self._lock:
+            self.images += images
+            self.escalated += escalated
+            self.small_seconds += small_seconds
+            self.large_seconds += large_seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            images, escalated = self.images, self.escalated
+            small_seconds, large_seconds = self.small_seconds, self.large_seconds
+        return {
+            "images": images,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / images, 4) if images else 0.0,
+            "small_ms_per_image": round(small_seconds * 1000 / images, 3) if images else 0.0,
+            "large_ms_per_escalation": round(large_seconds * 1000 / escalated, 3) if escalated else 0.0,
+        }
+
+
+class CascadeBackend(InferenceBackend):
+    """Runs a small classifier on every image and the large one only when it is unsure.
+
+    Images whose summed frog confidence from the small model falls inside
+    ``[low, high]`` (a band around the decision threshold) are re-run on the
+    large model and take its probabilities; the rest keep the small model's.
+    Both models must share a class list so either's probabilities score the
+    same way.
+    """
+
+    name = "cascade"
+
+    def __init__(self, small: InferenceBackend, large: InferenceBackend, scorer: FrogScorer, low: float, high: float):
+        if small.names != large.names:
+            raise ValueError("Cascade models must have identical class names")
+        check_band(low, high, scorer.threshold)
+        super().__init__(large.model_path)
+        self.small = small
+        self.large = large
+        self.names = large.names
+        self.input_size = large.input_size
+        self.scorer = scorer
+        self.low = low
+        self.high = high
+        self.stats = CascadeStats()
+
+    def uncertain(self, probs: np.ndarray) -> np.ndarray:
+        """Boolean mask of rows whose frog confidence lies inside the band."""
+        _, confidence = self.scorer.decisions(probs)
+        return (confidence >= self.low) & (confidence <= self.high)
+
+    def predict_probs(self, images: Sequence[Image.Image]) -> np.ndarray:
+        start = time.perf_counter()
+        probs = np.array(self.small.predict_probs(images), dtype=np.float32)
+        small_seconds = time.perf_counter() - start
+
+        escalate = np.flatnonzero(self.uncertain(probs))
+        large_seconds = 0.0
+        if escalate.size:
+            start = time.perf_counter()
+            probs[escalate] = self.large.predict_probs([images[i] for i in escalate])
+            large_seconds = time.perf_counter() - start
+
+        self.stats.record(len(images), int(escalate.size), small_seconds, large_seconds)
+        return probs
+
+    def warmup(self) -> None:
+        self.small.warmup()
+        self.large.warmup()
+
+    def share_memory(self) -> None:
+        self.small.share_memory()
+        self.large.share_memory()
+
+    def metrics(self) -> Dict:
+        return {
+            "small_model": self.small.model_path,
+            "band": [self.low, self.high],
+            **self.stats.snapshot(),
+        }
+
+
+def _timed_probs(backend: InferenceBackend, images: Sequence[Image.Image]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-image probabilities and latencies (seconds), one image per call as in production."""
+    backend.warmup()
+    rows, seconds = [], []
+    for image in images:
+        start = time.perf_counter()
+        rows.append(backend.predict_probs([image])[0])
+        seconds.append(time.perf_counter() - start)
+    return np.stack(rows), np.array(seconds)
+
+
+def evaluate(
+    small_path: str,
+    large_path: str,
+    images_dir: str,
+    bands: Sequence[Tuple[float, float]],
+    backend: str = "torch",
+    threshold: float = 0.5,
+    limit: Optional[int] = None,
+    threads: int = 0,
+) -> Dict:
+    """Compare cascade mode against large-only for each band.
+
+    Both models run on every image once; each band's escalation rate,
+    latency and decision agreement are then derived from those runs.
+    """
+    from . import core, preprocessing
+
+    paths = preprocessing.list_images(images_dir, limit=limit)
+    if not paths:
+        raise ValueError(f"No images found in {images_dir}")
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(preprocessing.decode_for_model(
+                f.read(), 1, core.Config.MODEL_INPUT_SIZE, core.Config.MAX_IMAGE_PIXELS
+            ))
+
+    small = load_backend(backend, small_path, threads=threads)
+    large = load_backend(backend, large_path, threads=threads)
+    if small.names != large.names:
+        raise ValueError("Cascade models must have identical class names")
+    scorer = FrogScorer(large.names, core.Config.FROG_CLASSES, threshold)
+    small_probs, small_seconds = _timed_probs(small, images)
+    large_probs, large_seconds = _timed_probs(large, images)
+    large_frog, _ = scorer.decisions(large_probs)
+    small_frog, small_conf = scorer.decisions(small_probs)
+
+    def latency_ms(seconds: np.ndarray) -> Dict:
+        ms = seconds * 1000
+        return {
+            "mean": round(float(ms.mean()), 2),
+            "p50": round(float(np.percentile(ms, 50)), 2),
+            "p99": round(float(np.percentile(ms, 99)), 2),
+        }
+
+    reports: List[Dict] = []
+    for low, high in bands:
+        check_band(low, high, threshold)
+        escalate = (small_conf >= low) & (small_conf <= high)
+        cascade_frog = np.where(escalate, large_frog, small_frog)
+        cascade_seconds = small_seconds + np.where(escalate, large_seconds, 0.0)
+        reports.append({
+            "band": [low, high],
+            "escalation_rate": round(float(escalate.mean()), 4),
+            "latency_ms": latency_ms(cascade_seconds),
+            "speedup": round(float(large_seconds.mean() / cascade_seconds.mean()), 2),
+            "is_frog_agreement": round(float((cascade_frog == large_frog).mean()), 4),
+            "is_frog_disagreements": [p for p, a, b in zip(paths, cascade_frog, large_frog) if a != b],
+        })
+
+    return {
+        "images": len(images),
+        "backend": backend,
+        "threshold": threshold,
+        "small_model": small_path,
+        "large_model": large_path,
+        "large_only_latency_ms": latency_ms(large_seconds),
+        "small_only_latency_ms": latency_ms(small_seconds),
+        "small_only_agreement": round(float((small_frog == large_frog).mean()), 4),
+        "bands": reports,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Report escalation rate, latency and agreement of cascade mode versus the large model alone."
+    )
+    parser.add_argument("--images", required=True, help="Image folder to evaluate on")
+    parser.add_argument("--small", default="yolo11n-cls.pt", help="Prefilter model")
+    parser.add_argument("--large", default="yolo11l-cls.pt", help="Model used for uncertain images")
+    parser.add_argument("--bands", nargs="+", type=parse_band, default=[(0.2, 0.8)],
+                        help="Uncertain bands as LOW:HIGH, e.g. 0.3:0.7 0.2:0.8")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    report = evaluate(
+        args.small, args.large, args.images, args.bands, args.backend, args.threshold, args.limit, args.threads
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
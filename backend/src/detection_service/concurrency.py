@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class AdaptiveLimiter:
+    """AIMD cap on in-flight inference work, steered by observed latency.
+
+    The fastest inference in a recent window of samples stands in for the
+    unloaded service time. A sample slower than ``tolerance`` times that
+    means work is queueing behind the model (torch threads contending, the
+    batch queue growing), so the limit is multiplied by ``backoff`` -- at
+    most once per baseline interval, so one burst of slow results counts as
+    a single congestion signal. Otherwise, while at least half the limit is
+    in use, it grows additively by about one per ``limit`` samples.
+
+    Work beyond the limit is refused by ``try_acquire`` rather than queued;
+    callers shed it (HTTP 503). An idle limiter always admits, so a request
+    heavier than the current limit (a large batch) is slowed, not starved.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 32,
+        min_limit: int = 1,
+        max_limit: int = 128,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        window: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(f"Limits must satisfy 1 <= min ({min_limit}) <= initial ({initial_limit}) <= max ({max_limit})")
+        if tolerance <= 1.0 or not 0.0 < backoff < 1.0:
+            raise ValueError("tolerance must be above 1 and backoff between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._clock = clock
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self.counters = {"admitted": 0, "rejected": 0, "increases": 0, "decreases": 0}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def utilization(self) -> float:
+        return self._in_flight / self.limit
+
+    def try_acquire(self, weight: int = 1) -> bool:
+        """Take ``weight`` slots if they fit under the limit; False means shed the work."""
+        with self._lock:
+            if self._in_flight and self._in_flight + weight > int(self._limit):
+                self.counters["rejected"] += weight
+                return False
+            self._in_flight += weight
+            self.counters["admitted"] += weight
+            return True
+
+    def release(self, weight: int = 1) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - weight)
+
+    def observe(self, latency: float, weight: int = 1) -> None:
+        """Feed back the inference latency (seconds) of work that still holds its slots."""
+        with self._lock:
+            self._samples.append(latency)
+            baseline = min(self._samples)
+            now = self._clock()
+            if latency > baseline * self.tolerance:
+                if now - self._last_decrease >= baseline:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_decrease = now
+                    self.counters["decreases"] += 1
+            elif self._in_flight * 2 >= self._limit and self._limit < self.max_limit:
+                self._limit = min(float(self.max_limit), self._limit + weight / self._limit)
+                self.counters["increases"] += 1
+
+    @property
+    def baseline(self) -> Optional[float]:
+        with self._lock:
+            return min(self._samples) if self._samples else None
+
+    def metrics(self) -> Dict[str, Any]:
+        baseline = self.baseline
+        with self._lock:
+            counters = dict(self.counters)
+            limit, in_flight = int(self._limit), self._in_flight
+        return {
+            "limit": limit,
+            "in_flight": in_flight,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_latency_ms": round(baseline * 1000, 2) if baseline is not None else None,
+            **counters,
+        }
@@ -0,0 +1,246 @@
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .backends import load_backend
+from .cascade import CascadeBackend
+from .cache import ResultCache, backend_from_uri, model_fingerprint
+from .metrics import StageTimings
+from . import preprocessing
+from .phash import NearDuplicateIndex, dhash
+from .scoring import FrogScorer
+from .vectors import VectorStore
+
+# Standard library, Pillow and numpy only: the Lambda imports this on the slim
+# startup path, and the runtime itself is only imported by load_backend.
+
+logger = logging.getLogger(__name__)
+
+
+class Config:
+    """Settings shared by every deployment; entry points subclass it for their own."""
+
+    FROG_CLASSES = frozenset(["bullfrog", "tailed_frog", "tree_frog"])
+    FROG_THRESHOLD = 0.5
+    MODEL_PATH = "yolo11l-cls.pt"
+
+    # Inference backend: "torch", or "onnx"/"openvino" after running detection_service.export
+    INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+    INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0))  # 0 = runtime default
+    INFERENCE_INTER_OP_THREADS = 1
+    # INT8 mode for the onnx backend: "none", "dynamic" or "static" (see detection_service.quantize)
+    MODEL_QUANTIZATION = os.environ.get("MODEL_QUANTIZATION", "none")
+
+    # Image limits and preprocessing: images are decoded and resized straight
+    # to model resolution before inference
+    MAX_UPLOAD_SIZE_MB = 50
+    MODEL_INPUT_SIZE = 224  # Classifier input resolution (short side)
+    MIN_DIMENSION = 320
+    MAX_IMAGE_PIXELS = 64_000_000  # Above any phone camera; larger headers are treated as bombs
+
+    # Model-resolution derivatives: a JPEG of the decoded, resized image that
+    # stands in for the original on later classifications. The Lambda stores
+    # one next to each original it decodes as <key>DERIVATIVE_SUFFIX when
+    # STORE_DERIVATIVES is on; clients may also upload their own. Derivatives
+    # only need a short side of MODEL_INPUT_SIZE, not MIN_DIMENSION.
+    STORE_DERIVATIVES = os.environ.get("STORE_DERIVATIVES", "false").lower() == "true"
+    DERIVATIVE_SUFFIX = ".model.jpg"
+    DERIVATIVE_QUALITY = 90
+
+    # Cascade mode: a small model (e.g. yolo11n-cls.pt) classifies every image
+    # and only those whose frog confidence falls inside [CASCADE_LOW,
+    # CASCADE_HIGH] are re-run on MODEL_PATH. Unset to always use MODEL_PATH.
+    CASCADE_MODEL_PATH = os.environ.get("CASCADE_MODEL")
+    CASCADE_LOW = float(os.environ.get("CASCADE_LOW", 0.2))
+    CASCADE_HIGH = float(os.environ.get("CASCADE_HIGH", 0.8))
+
+    # Fallback tier: a faster model with the same classes (e.g.
+    # yolo11n-cls.pt) that the API switches to under load. Unset for none.
+    FALLBACK_MODEL_PATH = os.environ.get("FALLBACK_MODEL")
+
+    # Largest batch per forward pass
+    BATCH_MAX_SIZE = 16
+
+    # Result cache configs; the shared tier is optional (e.g. sqlite:///tmp/results.db)
+    CACHE_MAX_ENTRIES = 1024
+    CACHE_TTL_SECONDS = 24 * 60 * 60
+    CACHE_BACKEND_URI = os.environ.get("RESULT_CACHE_URI")
+
+    # Near-duplicate detection: re-encoded, resized or slightly cropped copies
+    # of an already classified image reuse its result instead of running the
+    # model. Distance is in bits of the 64-bit perceptual hash.
+    NEAR_DUPLICATES_ENABLED = os.environ.get("NEAR_DUPLICATES", "false").lower() == "true"
+    NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", 6))
+    NEAR_DUPLICATE_MAX_ENTRIES = 10000
+
+    # Probability vectors: each main-model prediction's top VECTOR_TOP_K
+    # classes are stored as float16 under the image's sha256, so a new
+    # threshold or class policy can be applied without re-running the model
+    # (see detection_service.vectors). Unset for none.
+    VECTOR_STORE_PATH = os.environ.get("VECTOR_STORE")
+    VECTOR_TOP_K = int(os.environ.get("VECTOR_TOP_K", 10))
+    VECTOR_FLUSH_ROWS = 1024
+
+
+class FrogDetector:
+    """Model, preprocessing, scoring and result cache behind both entry points.
+
+    The FastAPI app and the Lambda handler only adapt their transport (HTTP
+    uploads, S3 objects and events) to these calls, so both deployments
+    validate, resize, batch and cache images the same way.
+    """
+
+    def __init__(self, config=Config, prepared: bool = False):
+        self.config = config
+
+        def load(model_path: str):
+            return load_backend(
+                config.INFERENCE_BACKEND,
+                model_path,
+                threads=config.INFERENCE_THREADS,
+                inter_op_threads=config.INFERENCE_INTER_OP_THREADS,
+                quantization=config.MODEL_QUANTIZATION,
+                prepared=prepared,
+            )
+
+        self.model = load(config.MODEL_PATH)
+        # Resolve the frog class indices now so a mismatched model fails at startup
+        self.scorer = FrogScorer(self.model.names, config.FROG_CLASSES, config.FROG_THRESHOLD)
+        model_version = model_fingerprint(self.model.model_path)
+        if config.CASCADE_MODEL_PATH:
+            self.model = CascadeBackend(
+                load(config.CASCADE_MODEL_PATH), self.model, self.scorer, config.CASCADE_LOW, config.CASCADE_HIGH
+            )
+            # Cascade results differ from the large model's, so cache them separately
+            model_version += (
+                f"+cascade:{model_fingerprint(self.model.small.model_path)}:{config.CASCADE_LOW}-{config.CASCADE_HIGH}"
+            )
+        self.fallback = None
+        if config.FALLBACK_MODEL_PATH:
+            if self.cascade is not None and config.FALLBACK_MODEL_PATH == config.CASCADE_MODEL_PATH:
+                # Reuse the cascade prefilter rather than loading it twice
+                self.fallback = self.cascade.small
+            else:
+                self.fallback = load(config.FALLBACK_MODEL_PATH)
+            if self.fallback.names != self.model.names:
+                raise ValueError("Fallback model must have the same class names as the main model")
+        self.result_cache = ResultCache(
+            model_version=model_version,
+            threshold=config.FROG_THRESHOLD,
+            max_entries=config.CACHE_MAX_ENTRIES,
+            ttl_seconds=config.CACHE_TTL_SECONDS,
+            shared=backend_from_uri(config.CACHE_BACKEND_URI, ttl_seconds=config.CACHE_TTL_SECONDS),
+        )
+        self.near_duplicates: Optional[NearDuplicateIndex] = None
+        if config.NEAR_DUPLICATES_ENABLED:
+            self.near_duplicates = NearDuplicateIndex(
+                max_distance=config.NEAR_DUPLICATE_MAX_DISTANCE,
+                max_entries=config.NEAR_DUPLICATE_MAX_ENTRIES,
+            )
+        self.vectors: Optional[VectorStore] = None
+        if config.VECTOR_STORE_PATH:
+            self.vectors = VectorStore(
+                config.VECTOR_STORE_PATH, model_version, self.model.names,
+                k=config.VECTOR_TOP_K, flush_rows=config.VECTOR_FLUSH_ROWS,
+            )
+
+    @property
+    def max_bytes(self) -> int:
+        return self.config.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+    def min_dimension(self, derivative: bool = False) -> int:
+        """Shortest side accepted for an original upload, or for a model-resolution derivative."""
+        return self.config.MODEL_INPUT_SIZE if derivative else self.config.MIN_DIMENSION
+
+    def probe_header(self, head: bytes, derivative: bool = False):
+        """Validate magic bytes and header dimensions; None if more bytes are needed."""
+        return preprocessing.probe_header(head, self.min_dimension(derivative), self.config.MAX_IMAGE_PIXELS)
+
+    def prepare_image(
+        self, image: Image.Image, timings: Optional[StageTimings] = None, derivative: bool = False
+    ) -> Image.Image:
+        """Decode and resize an opened (not yet loaded) image straight to model resolution."""
+        stages: Dict[str, float] = {}
+        try:
+            return preprocessing.prepare_image(
+                image, self.min_dimension(derivative), self.config.MODEL_INPUT_SIZE, self.config.MAX_IMAGE_PIXELS,
+                stages
+            )
+        finally:
+            if timings is not None:
+                for stage, seconds in stages.items():
+                    timings.add(stage, seconds)
+
+    def decode(self, image_data: bytes, timings: Optional[StageTimings] = None, derivative: bool = False) -> Image.Image:
+        """Open, validate and resize raw bytes; raises ``ImageValidationError``."""
+        return self.prepare_image(preprocessing.open_image(image_data), timings, derivative)
+
+    def decode_args(self, derivative: bool = False) -> tuple:
+        """Limits to pass ``preprocessing.decode_many`` in a worker process."""
+        return self.min_dimension(derivative), self.config.MODEL_INPUT_SIZE, self.config.MAX_IMAGE_PIXELS
+
+    def encode_derivative(self, image: Image.Image) -> bytes:
+        """JPEG bytes of a prepared image to store as its original's derivative."""
+        return preprocessing.encode_derivative(image, self.config.DERIVATIVE_QUALITY)
+
+    def derivative_key(self, key: str) -> str:
+        """Object key of the derivative stored next to ``key``."""
+        return key + self.config.DERIVATIVE_SUFFIX
+
+    def is_derivative_key(self, key: str) -> bool:
+        return key.endswith(self.config.DERIVATIVE_SUFFIX)
+
+    def predict(
+        self,
+        images: Sequence[Image.Image],
+        timings: Optional[StageTimings] = None,
+        fallback: bool = False,
+        digests: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[Dict]:
+        """Classify prepared images in one forward pass; a response payload per image.
+
+        ``fallback`` runs the faster fallback model instead of the main one.
+        ``digests`` (hex sha256 of each image's bytes) stores main-model
+        probability vectors when a vector store is configured.
+        """
+        timings = timings or StageTimings()
+        model = self.fallback if fallback else self.model
+        with timings.stage("inference"):
+            probs = model.predict_probs(list(images))
+        with timings.stage("postprocess"):
+            if self.vectors is not None and digests is not None and not fallback:
+                self.vectors.add(digests, probs)
+            return self.scorer.decide(probs)
+
+    def find_near_duplicate(
+        self, image: Image.Image, timings: Optional[StageTimings] = None
+    ) -> Tuple[Optional[int], Optional[Dict]]:
+        """Perceptual hash of a prepared image and the result of a near-duplicate, if any.
+
+        Returns (None, None) when near-duplicate detection is off. Pass the
+        hash to ``remember`` once the image has been classified.
+        """
+        if self.near_duplicates is None:
+            return None, None
+        timings = timings or StageTimings()
+        with timings.stage("near_duplicate"):
+            image_hash = dhash(image)
+            match = self.near_duplicates.lookup(image_hash)
+        if match is not None:
+            timings.increment("near_duplicate_hits")
+        return image_hash, match
+
+    def remember(self, image_hash: Optional[int], result: Dict) -> None:
+        """Index a freshly classified image for near-duplicate lookups."""
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(image_hash, result)
+
+    @property
+    def cascade(self) -> Optional[CascadeBackend]:
+        return self.model if isinstance(self.model, CascadeBackend) else None
+
+    def confidences(self, prediction) -> Dict[str, float]:
+        """Frog class scores from one backend ``Prediction``."""
+        return self.scorer.confidences(prediction.probs)
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable
+
+
+class SaturatedError(RuntimeError):
+    """Raised instead of queueing work when a stage is at capacity."""
+
+
+class BoundedExecutor:
+    """Wraps an executor so at most ``max_pending`` tasks are queued or running.
+
+    Submitting beyond that raises ``SaturatedError`` immediately, letting the
+    caller shed load (HTTP 429) rather than building an unbounded backlog.
+    """
+
+    def __init__(self, executor: Executor, max_pending: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise SaturatedError(f"{self.max_pending} tasks already pending")
+            self._pending += 1
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
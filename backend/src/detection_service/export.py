@@ -0,0 +1,103 @@
+import argparse
+import json
+import logging
+import os
+
+from .backends import (
+    PREPARED_MANIFEST,
+    PREPARED_MODEL,
+    PREPARED_WEIGHTS,
+    artifact_path,
+    prepared_artifact_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def export_model(model_path: str, fmt: str, input_size: int = 224, half: bool = False) -> str:
+    """Export a ultralytics ``.pt`` classifier to ONNX or OpenVINO.
+
+    Exports use a dynamic batch axis so the batch scheduler can run
+    variable-size batches through a single session.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    kwargs = {"format": fmt, "imgsz": input_size, "dynamic": True, "half": half}
+    if fmt == "onnx":
+        kwargs["simplify"] = True
+    exported = model.export(**kwargs)
+
+    expected = artifact_path(fmt, model_path)
+    if os.path.abspath(exported) != os.path.abspath(expected):
+        os.replace(exported, expected)
+    logger.info(f"Exported {model_path} to {expected}")
+    return expected
+
+
+def prepare_runtime_artifact(onnx_path: str, optimization: str = "extended") -> str:
+    """Write a ready-to-run copy of an ONNX model for fast cold starts.
+
+    onnxruntime applies its graph optimizations once here and saves the
+    result with all weights in one external file, which it then mmaps at
+    load time instead of parsing and copying them. ``extended`` output is
+    portable across CPUs; ``all`` adds layout transforms tied to the CPU
+    it was built on, so only use it when build and run hardware match.
+    """
+    import onnxruntime as ort
+
+    levels = {
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    target = prepared_artifact_dir(onnx_path)
+    os.makedirs(target, exist_ok=True)
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = levels[optimization]
+    options.optimized_model_filepath = os.path.join(target, PREPARED_MODEL)
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_file_name", PREPARED_WEIGHTS
+    )
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_min_size_in_bytes", "1024"
+    )
+    ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    with open(os.path.join(target, PREPARED_MANIFEST), "w") as f:
+        json.dump({"source": os.path.basename(onnx_path), "optimization": optimization}, f)
+    logger.info(f"Prepared runtime artifact for {onnx_path} in {target}")
+    return target
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Export the frog classifier for CPU runtimes.")
+    parser.add_argument("--model", default="yolo11l-cls.pt", help="Source PyTorch model")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--imgsz", type=int, default=224, help="Model input resolution")
+    parser.add_argument("--half", action="store_true", help="FP16 weights (OpenVINO only)")
+    parser.add_argument(
+        "--prepare",
+        choices=["extended", "all"],
+        help="Also write the mmap-able ready-to-run ONNX artifact at this optimization level",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=["none", "dynamic", "static"],
+        default="none",
+        help="Prepare an existing INT8 model instead of exporting (with --prepare)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.quantization == "none":
+        print(export_model(args.model, args.format, args.imgsz, args.half))
+    if args.prepare:
+        if args.format != "onnx":
+            parser.error("--prepare is only supported for --format onnx")
+        onnx_path = artifact_path("onnx", args.model, args.quantization)
+        print(prepare_runtime_artifact(onnx_path, args.prepare))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,34 @@
+import hashlib
 import json
-import boto3
-from ultralytics import YOLO
-from PIL import Image, ImageOps, ExifTags
 import logging
 import time
 import os
-from io import BytesIO
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize S3 client
-s3 = boto3.client("s3")
+from .startup import StartupProfiler
 
-# Set environment variables early
+# Time every cold-start stage below; the report is logged once the model is warm
+startup = StartupProfiler()
+
+# Set environment variables early, before anything can import ultralytics
 os.environ["YOLO_CONFIG_DIR"] = "/tmp"
 os.environ["MPLCONFIGDIR"] = "/tmp"
 os.environ["YOLO_VERBOSE"] = "False"
 os.environ["DISABLE_ULTRALYTICS_ANALYTICS"] = "True"
 
+with startup.stage("import:boto3"):
+    import boto3  # noqa: F401 (imported eagerly so its cost shows in the profile)
+with startup.stage("import:PIL"):
+    from PIL import Image
+with startup.stage("import:detection_service"):
+    from . import core
+    from .metrics import StageTimings, emf_record, resident_memory_bytes
+    from .preprocessing import ImageValidationError
+    from .results import result_store_from_uri
+    from .s3io import FetchedObject, ObjectTooLargeError, S3Fetcher, make_s3_client
+
 # Enhanced logging setup
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -24,96 +36,449 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class Config:
-    """Application configuration."""
+class Config(core.Config):
+    """Lambda configuration; model, image and cache settings are shared in ``core.Config``."""
+
+    # Slim startup: load the prepared, mmap'd ONNX artifact (export --prepare)
+    # and run a warm-up forward pass during init instead of on the first request
+    SLIM_STARTUP = os.environ.get("SLIM_STARTUP", "false").lower() == "true"
+
+    # Batch mode configs
+    MAX_BATCH_ITEMS = 100
+    FETCH_WORKERS = 8
+
+    # S3 I/O configs: objects are fetched header-first (a ranged GET) so bad
+    # or oversized images are rejected before the body is downloaded. Serve
+    # objects from <root>/<bucket>/<key> instead of S3 for offline runs and benchmarks
+    LOCAL_S3_ROOT = os.environ.get("LOCAL_S3_ROOT")
+
+    # Event mode (S3 ObjectCreated / SQS): results are written here for the app
+    # to poll, e.g. s3://results-bucket/results or file:///tmp/results
+    RESULT_STORE_URI = os.environ.get("RESULT_STORE_URI")
 
-    FROG_CLASSES = frozenset(["bullfrog", "tailed_frog", "tree_frog"])
-    FROG_THRESHOLD = 0.5
-    MODEL_PATH = "yolo11l-cls.pt"
+    # Per-invocation stage timings as CloudWatch Embedded Metric Format lines
+    EMIT_METRICS = os.environ.get("EMIT_METRICS", "true").lower() == "true"
+    METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "Frogstagram/Detection")
 
 
+# Initialize S3 client with a connection pool sized for concurrent fetches
+with startup.stage("s3_client"):
+    s3 = make_s3_client(Config.FETCH_WORKERS, local_root=Config.LOCAL_S3_ROOT)
+    fetcher = S3Fetcher(
+        s3,
+        max_workers=Config.FETCH_WORKERS,
+        max_bytes=Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+    )
+
 # Load model at module level for efficient cold starts
 try:
-    model = YOLO(Config.MODEL_PATH)
+    if Config.INFERENCE_BACKEND == "onnx":
+        with startup.stage("import:onnxruntime"):
+            import onnxruntime  # noqa: F401
+    with startup.stage("model_load"):
+        detector = core.FrogDetector(Config, prepared=Config.SLIM_STARTUP)
     logger.info("Model loaded successfully")
+    if Config.SLIM_STARTUP:
+        with startup.stage("first_inference"):
+            detector.model.warmup()
 except Exception as e:
     logger.error(f"Failed to load model: {str(e)}")
     raise RuntimeError("Model initialization failed")
 
 
-class ImageProcessor:
-    @staticmethod
-    def fix_orientation(image: Image.Image) -> Image.Image:
-        """Fix image orientation based on EXIF data."""
+model = detector.model
+result_cache = detector.result_cache
+
+result_store = result_store_from_uri(Config.RESULT_STORE_URI, s3)
+
+startup.emit(logger)
+
+
+def _response(status_code: int, payload) -> Dict:
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(payload),
+    }
+
+
+def validate_header(head: bytes) -> None:
+    """Reject unsupported formats, undersized images and decompression bombs from the header bytes."""
+    detector.probe_header(head)
+
+
+def validate_derivative_header(head: bytes) -> None:
+    """``validate_header`` for model-resolution derivatives, which are smaller than MIN_DIMENSION."""
+    detector.probe_header(head, derivative=True)
+
+
+def fetch_object(bucket: str, key: str) -> FetchedObject:
+    """Fetch raw object bytes from S3, validating the image header first."""
+    return fetcher.fetch(bucket, key, inspect_header=validate_header)
+
+
+def fetch_error(bucket: str, key: str, error: Exception) -> Dict:
+    """Map a failed fetch to a status code and client-facing message."""
+    if isinstance(error, ImageValidationError):
+        return {"statusCode": error.status_code, "error": error.detail}
+    if isinstance(error, ObjectTooLargeError):
+        return {
+            "statusCode": 413,
+            "error": f"Object exceeds {Config.MAX_UPLOAD_SIZE_MB}MB limit",
+        }
+    logger.error(f"Failed to load s3://{bucket}/{key}: {str(error)}")
+    return {"statusCode": 400, "error": "Failed to load image from S3"}
+
+
+def decode_image(
+    image_data: bytes, timings: Optional[StageTimings] = None, derivative: bool = False
+) -> Image.Image:
+    """Decode raw bytes straight to model resolution, as the API does."""
+    return detector.decode(image_data, timings, derivative)
+
+
+def store_derivative(bucket: str, key: str, image: Image.Image, timings: StageTimings) -> Optional[Tuple[str, str]]:
+    """Write the model-resolution copy of a decoded original next to it.
+
+    Returns the derivative's key and result cache key, or None if the write
+    failed; classification goes on either way.
+    """
+    derivative_key = detector.derivative_key(key)
+    with timings.stage("derivative"):
+        data = detector.encode_derivative(image)
         try:
-            for orientation in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation] == "Orientation":
-                    break
-
-            exif = image._getexif()
-            if exif is not None:
-                orientation_value = exif.get(orientation)
-                exif_orientation_map = {
-                    3: Image.Transpose.ROTATE_180,
-                    6: Image.Transpose.ROTATE_270,
-                    8: Image.Transpose.ROTATE_90,
-                }
-                if orientation_value in exif_orientation_map:
-                    image = image.transpose(exif_orientation_map[orientation_value])
-        except (AttributeError, KeyError, IndexError):
-            pass
-        return image
-
-    @staticmethod
-    def process_image(image: Image.Image) -> Image.Image:
-        """Ensure image is processed for model inference, including orientation fix and RGB mode."""
-        image = ImageProcessor.fix_orientation(image)
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        return image
-
-
-class FrogClassifier:
-    @staticmethod
-    def get_frog_confidences(results) -> Dict[str, float]:
-        """Extract confidence scores for frog-related classes."""
+            s3.put_object(Bucket=bucket, Key=derivative_key, Body=data, ContentType="image/jpeg")
+        except Exception as e:
+            logger.error(f"Failed to store derivative s3://{bucket}/{derivative_key}: {str(e)}")
+            return None
+    return derivative_key, result_cache.key_from_digest(hashlib.sha256(data))
+
+
+def emit_metrics(mode: str, timings: StageTimings, request_start: float, images: int, errors: int) -> None:
+    """Print one EMF line; it must reach the log as bare JSON, so it bypasses the logger."""
+    if not Config.EMIT_METRICS:
+        return
+    milliseconds = {f"{stage}_ms": seconds * 1000 for stage, seconds in timings.durations.items()}
+    milliseconds["request_ms"] = (time.time() - request_start) * 1000
+    print(
+        emf_record(
+            Config.METRICS_NAMESPACE,
+            {"Service": "frog-detection", "Mode": mode},
+            milliseconds,
+            counts={
+                "images": images,
+                "cache_hits": timings.counts.get("cache_hits", 0),
+                "near_duplicate_hits": timings.counts.get("near_duplicate_hits", 0),
+                "errors": errors,
+            },
+            megabytes={"memory_rss": resident_memory_bytes() / (1024 * 1024)},
+        ),
+        flush=True,
+    )
+
+
+def classify_batch(
+    items: List[Dict], timings: Optional[StageTimings] = None, prefer_derivatives: bool = False
+) -> List[Dict]:
+    """Classify many S3 objects, returning a result or error for each item.
+
+    With ``prefer_derivatives`` each object's stored derivative is read in
+    place of the original, falling back to the original if there is none.
+    With ``Config.STORE_DERIVATIVES``, every original decoded here gets a
+    derivative, and its result is cached under the derivative's bytes too.
+    Items that used or produced a derivative report its key as
+    ``"derivative"``. Stage durations are summed into ``timings`` across items.
+    """
+    timings = timings or StageTimings()
+    outcomes: List[Dict] = [
+        {"bucket": item.get("bucket"), "key": item.get("key")} for item in items
+    ]
+    images = {}
+    cache_keys = {}
+    image_hashes = {}
+    derivative_cache_keys = {}
+
+    for outcome in outcomes:
+        if not outcome["bucket"] or not outcome["key"]:
+            outcome.update(statusCode=400, error="Bucket and key are required")
+    pending = [index for index, outcome in enumerate(outcomes) if "statusCode" not in outcome]
+
+    sources = {}
+    for index in pending:
+        key = outcomes[index]["key"]
+        use_derivative = prefer_derivatives and not detector.is_derivative_key(key)
+        sources[index] = detector.derivative_key(key) if use_derivative else key
+
+    # All fetches start at once on the fetcher's pool; decoding overlaps the
+    # downloads still in flight. Derivatives are validated against the model
+    # resolution rather than MIN_DIMENSION.
+    futures = {}
+    for derivative, inspect_header in ((False, validate_header), (True, validate_derivative_header)):
+        group = [index for index in pending if detector.is_derivative_key(sources[index]) == derivative]
+        futures.update(zip(group, fetcher.prefetch(
+            [(outcomes[index]["bucket"], sources[index]) for index in group],
+            inspect_header=inspect_header,
+        )))
+
+    def record(index: int, result: Dict) -> None:
+        result_cache.set(cache_keys[index], result)
+        if index in derivative_cache_keys:
+            result_cache.set(derivative_cache_keys[index], result)
+        outcomes[index].update(statusCode=200, result=result)
+
+    def load(index: int) -> None:
+        outcome = outcomes[index]
+        bucket, key, source = outcome["bucket"], outcome["key"], sources[index]
         try:
-            frog_scores = {class_name: 0.0 for class_name in Config.FROG_CLASSES}
-            probs = results[0].probs
-            names = results[0].names
-
-            for class_name in Config.FROG_CLASSES:
-                for i, name in names.items():
-                    if isinstance(name, str) and name.lower() == class_name.lower():
-                        frog_scores[class_name] = float(probs.data[i])
-                        break
-            return frog_scores
+            fetched = futures[index].result()
         except Exception as e:
-            logger.error(f"Error processing prediction results: {str(e)}")
-            raise ValueError(f"Error processing prediction results: {str(e)}")
-
-    @staticmethod
-    def analyze_frog_confidence(frog_scores: Dict[str, float]) -> Dict[str, float]:
-        """Calculate total frog confidence and determine if image is of a frog."""
-        total_confidence = sum(frog_scores.values())
-        is_frog = total_confidence >= Config.FROG_THRESHOLD
-        return {
-            "is_frog": is_frog,
-            "confidence": round(total_confidence, 4),
-            "details": {k: round(v, 4) for k, v in frog_scores.items()},
+            if source == key:
+                outcome.update(fetch_error(bucket, key, e))
+                return
+            # No derivative stored yet: read the original
+            source = key
+            try:
+                fetched = fetch_object(bucket, key)
+            except Exception as e:
+                outcome.update(fetch_error(bucket, key, e))
+                return
+        timings.add("fetch", fetched.seconds)
+        derivative = detector.is_derivative_key(source)
+        if derivative:
+            outcome["derivative"] = source
+        try:
+            with timings.stage("cache_lookup"):
+                cache_keys[index] = result_cache.key_from_digest(fetched.digest)
+                cached = result_cache.get(cache_keys[index])
+            if cached is not None:
+                timings.increment("cache_hits")
+                outcome.update(statusCode=200, result=cached)
+                return
+            image = decode_image(fetched.data, timings, derivative)
+            if Config.STORE_DERIVATIVES and not derivative:
+                stored = store_derivative(bucket, key, image, timings)
+                if stored is not None:
+                    outcome["derivative"], derivative_cache_keys[index] = stored
+            # Re-encoded or resized copies of an image already classified skip the model
+            image_hashes[index], near_duplicate = detector.find_near_duplicate(image, timings)
+            if near_duplicate is not None:
+                record(index, near_duplicate)
+                return
+            images[index] = image
+        except ImageValidationError as e:
+            outcome.update(statusCode=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.error(
+                f"Failed to load s3://{outcome['bucket']}/{outcome['key']}: {str(e)}"
+            )
+            outcome.update(statusCode=400, error="Failed to load image from S3")
+
+    # Decoding is GIL-releasing, so threads overlap it
+    with ThreadPoolExecutor(max_workers=Config.FETCH_WORKERS) as pool:
+        list(pool.map(load, pending))
+
+    loaded = sorted(images)
+    for start in range(0, len(loaded), Config.BATCH_MAX_SIZE):
+        chunk = loaded[start : start + Config.BATCH_MAX_SIZE]
+        try:
+            inference_start = time.time()
+            decisions = detector.predict([images[index] for index in chunk], timings)
+            logger.info(
+                f"Batch inference of {len(chunk)} images completed in "
+                f"{time.time() - inference_start:.2f} seconds"
+            )
+        except Exception as e:
+            logger.error(f"Error during batch model inference: {str(e)}")
+            for index in chunk:
+                outcomes[index].update(statusCode=500, error="Model inference error")
+            continue
+
+        for index, response_data in zip(chunk, decisions):
+            detector.remember(image_hashes[index], response_data)
+            record(index, response_data)
+
+    return outcomes
+
+
+def s3_record_item(record: Dict, message_id: Optional[str] = None) -> Optional[Dict]:
+    """Turn an S3 notification record into a work item, or None if it is not an upload."""
+    if not record.get("eventName", "").startswith("ObjectCreated"):
+        return None
+    s3_info = record.get("s3", {})
+    return {
+        "bucket": s3_info.get("bucket", {}).get("name"),
+        # Keys in notifications are URL-encoded with spaces as '+'
+        "key": unquote_plus(s3_info.get("object", {}).get("key", "")) or None,
+        "message_id": message_id,
+    }
+
+
+def event_items(event: Dict) -> List[Dict]:
+    """Flatten S3 and SQS event records into {"bucket", "key", "message_id"} items.
+
+    SQS message bodies may hold an S3 notification or a plain {"bucket", "key"}.
+    """
+    items = []
+    for record in event.get("Records", []):
+        source = record.get("eventSource")
+        if source == "aws:s3":
+            items.append(s3_record_item(record))
+        elif source == "aws:sqs":
+            message_id = record.get("messageId")
+            try:
+                body = json.loads(record.get("body", ""))
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                items.append({"bucket": None, "key": None, "message_id": message_id})
+            elif "Records" in body:
+                items.extend(s3_record_item(nested, message_id) for nested in body["Records"])
+            elif body.get("Event") == "s3:TestEvent":
+                continue
+            else:
+                items.append(
+                    {"bucket": body.get("bucket"), "key": body.get("key"), "message_id": message_id}
+                )
+        else:
+            logger.warning(f"Ignoring record from unsupported source: {source}")
+
+    # Our own result records and derivatives land in watched buckets too
+    return [
+        item for item in items
+        if item is not None and not (
+            item["bucket"] and item["key"] and (
+                result_store.owns(item["bucket"], item["key"]) or detector.is_derivative_key(item["key"])
+            )
+        )
+    ]
+
+
+def handle_event(event: Dict, timings: Optional[StageTimings] = None) -> Dict:
+    """Classify every uploaded object in an S3/SQS event and persist the results.
+
+    Returns SQS partial batch failures so only messages whose classification
+    failed transiently (inference or result store errors) are redelivered.
+    """
+    if result_store is None:
+        raise RuntimeError("RESULT_STORE_URI must be set to handle S3/SQS events")
+
+    timings = timings or StageTimings()
+    items = event_items(event)
+    failed_messages = set()
+
+    def persist(item: Dict, outcome: Dict) -> None:
+        if not item["bucket"] or not item["key"]:
+            logger.error(f"Dropping malformed event record (message {item['message_id']})")
+            return
+        if outcome["statusCode"] >= 500 and item["message_id"] is not None:
+            # Leave the result pending; SQS redelivers the message
+            failed_messages.add(item["message_id"])
+            return
+        record = {
+            "bucket": item["bucket"],
+            "key": item["key"],
+            "status": "done" if outcome["statusCode"] == 200 else "error",
+            "statusCode": outcome["statusCode"],
+            "classified_at": time.time(),
         }
+        if "result" in outcome:
+            record["result"] = outcome["result"]
+        else:
+            record["error"] = outcome["error"]
+        if "derivative" in outcome:
+            record["derivative_key"] = outcome["derivative"]
+        try:
+            result_store.put(item["bucket"], item["key"], record)
+        except Exception as e:
+            logger.error(
+                f"Failed to store result for s3://{item['bucket']}/{item['key']}: {str(e)}"
+            )
+            if item["message_id"] is not None:
+                failed_messages.add(item["message_id"])
+
+    for start in range(0, len(items), Config.MAX_BATCH_ITEMS):
+        chunk = items[start : start + Config.MAX_BATCH_ITEMS]
+        outcomes = classify_batch(chunk, timings)
+        timings.increment("errors", sum(1 for outcome in outcomes if outcome["statusCode"] != 200))
+        with timings.stage("persist"), ThreadPoolExecutor(max_workers=Config.FETCH_WORKERS) as pool:
+            list(pool.map(persist, chunk, outcomes))
+
+    logger.info(
+        f"Event with {len(items)} objects processed, "
+        f"{len(failed_messages)} messages to retry"
+    )
+    timings.increment("images", len(items))
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in sorted(failed_messages)
+        ]
+    }
 
 
 def lambda_handler(event, context):
     request_start = time.time()
     logger.info("=== New request starting ===")
     logger.info(f"Request ID: {context.aws_request_id}")
+    timings = StageTimings()
+
+    # Event mode: invoked by S3 notifications or an SQS queue rather than HTTP
+    if "Records" in event:
+        response = handle_event(event, timings)
+        emit_metrics(
+            "event", timings, request_start,
+            timings.counts.get("images", 0), timings.counts.get("errors", 0),
+        )
+        return response
 
     # Extract S3 details from the event
     body = json.loads(event["body"])
-    bucket = body.get("bucket")
-    key = body.get("key")
 
+    # Poll mode: {"action": "result", "bucket": ..., "key": ...} returns the
+    # stored event-mode result, or 404 while it is still pending
+    if body.get("action") == "result":
+        if result_store is None:
+            return _response(501, {"error": "Result store is not configured"})
+        if not body.get("bucket") or not body.get("key"):
+            return _response(400, {"error": "Bucket and key are required"})
+        record = result_store.get(body["bucket"], body["key"])
+        if record is None:
+            return _response(404, {"status": "pending"})
+        return _response(200, record)
+
+    # Batch mode: {"items": [{"bucket": ..., "key": ...}, ...]}
+    if "items" in body:
+        items = body["items"]
+        if not isinstance(items, list) or not items:
+            return _response(400, {"error": "items must be a non-empty list"})
+        if len(items) > Config.MAX_BATCH_ITEMS:
+            return _response(
+                413, {"error": f"Too many items. Maximum: {Config.MAX_BATCH_ITEMS}"}
+            )
+        if not all(isinstance(item, dict) for item in items):
+            return _response(400, {"error": "Each item must be an object"})
+
+        results = classify_batch(items, timings, prefer_derivatives=Config.STORE_DERIVATIVES)
+        logger.info(
+            f"Batch of {len(items)} items completed in "
+            f"{time.time() - request_start:.2f} seconds"
+        )
+        logger.info(f"Cache stats: {json.dumps(result_cache.metrics())}")
+        emit_metrics(
+            "batch", timings, request_start,
+            len(results), sum(1 for result in results if result["statusCode"] != 200),
+        )
+        return _response(200, {"results": results})
+
+    response = classify_single(body.get("bucket"), body.get("key"), timings)
+    emit_metrics("single", timings, request_start, 1, int(response["statusCode"] != 200))
+    return response
+
+
+def classify_single(bucket: Optional[str], key: Optional[str], timings: StageTimings) -> Dict:
+    """Classify one S3 object and build the HTTP response."""
     if not bucket or not key:
         logger.error("Bucket or key not provided")
         return {
@@ -122,50 +487,15 @@ def lambda_handler(event, context):
         }
 
     logger.info(f"Processing image from s3://{bucket}/{key}")
-
-    # Retrieve and process image from S3
-    try:
-        s3_response = s3.get_object(Bucket=bucket, Key=key)
-        image_data = s3_response["Body"].read()
-        image = Image.open(BytesIO(image_data))
-        image = ImageProcessor.process_image(image)
-    except Exception as e:
-        logger.error(f"Failed to load and process image from S3: {str(e)}")
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Failed to load image from S3"}),
-        }
-
-    # Run prediction
-    try:
-        inference_start = time.time()
-        results = model(image)
-        inference_time = time.time() - inference_start
-        logger.info(f"Inference completed in {inference_time:.2f} seconds")
-    except Exception as e:
-        logger.error(f"Error during model inference: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Model inference error"}),
-        }
-
-    # Process and analyze results
-    try:
-        frog_scores = FrogClassifier.get_frog_confidences(results)
-        response_data = FrogClassifier.analyze_frog_confidence(frog_scores)
-    except Exception as e:
-        logger.error(f"Error processing model results: {str(e)}")
+    outcome = classify_batch(
+        [{"bucket": bucket, "key": key}], timings, prefer_derivatives=Config.STORE_DERIVATIVES
+    )[0]
+    logger.info(f"Cache stats: {json.dumps(result_cache.metrics())}")
+    if outcome["statusCode"] != 200:
         return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Error processing model results"}),
+            "statusCode": outcome["statusCode"],
+            "body": json.dumps({"error": outcome["error"]}),
         }
 
     # Return the classification response
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-        },
-        "body": json.dumps(response_data),
-    }
+    return _response(200, outcome["result"])
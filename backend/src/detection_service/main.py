@@ -1,12 +1,27 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, status
-from fastapi.responses import JSONResponse
-from ultralytics import YOLO
-from PIL import Image, ImageOps, ExifTags
+from fastapi import FastAPI, File, Request, Response, UploadFile, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from PIL import Image
+import asyncio
+import hashlib
 import io
 import logging
-from typing import Dict, Tuple
+import math
+import multiprocessing
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel, Field
 import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import core
+from .batching import BatchScheduler
+from .concurrency import AdaptiveLimiter
+from .executors import BoundedExecutor, SaturatedError
+from .metrics import MetricsRegistry, memory_usage, resident_memory_bytes
+from . import preprocessing
+from .preprocessing import ImageValidationError
 
 # Set up logging with a proper format for production
 logging.basicConfig(
@@ -27,56 +42,256 @@ class ClassificationResponse(BaseModel):
     confidence: float = Field(..., ge=0, le=1, description="Overall confidence score")
     details: FrogConfidences = Field(..., description="Individual frog type confidences")
 
-class Config:
-    """Application configuration."""
-    FROG_CLASSES = frozenset(['bullfrog', 'tailed_frog', 'tree_frog'])
-    FROG_THRESHOLD = 0.5
+class BatchItemResult(BaseModel):
+    """Outcome for a single image within a batch request."""
+    filename: Optional[str] = Field(None, description="Name of the uploaded file")
+    status_code: int = Field(..., description="HTTP status the item would have produced on its own")
+    result: Optional[ClassificationResponse] = Field(None, description="Classification result on success")
+    error: Optional[str] = Field(None, description="Error detail on failure")
+
+class BatchClassificationResponse(BaseModel):
+    """Per-item results for a batch classification request, in upload order."""
+    results: List[BatchItemResult]
+
+class Config(core.Config):
+    """API configuration; model, image and cache settings are shared in ``core.Config``."""
     ALLOWED_MIME_TYPES = frozenset(['image/jpeg', 'image/png', 'image/webp'])
-    MODEL_PATH = 'yolo11l-cls.pt'
-    
-    # Image processing configs
-    MAX_UPLOAD_SIZE_MB = 50
-    TARGET_SIZE = (1080, 1080)  # Standard processing size
-    MIN_DIMENSION = 320
-    MAX_DIMENSION = 5000
     JPEG_QUALITY = 90
 
+    # Dynamic batching configs
+    BATCH_MAX_WAIT_MS = 10
+
+    # Streaming upload configs: uploads are read in chunks and the header is
+    # validated from the first HEADER_PROBE_BYTES before the rest is buffered
+    UPLOAD_CHUNK_SIZE = 256 * 1024
+    HEADER_PROBE_BYTES = 1024 * 1024
+    MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for boundaries and part headers
+
+    # Batch endpoint configs: besides the per-file limit, a batch's uploads
+    # together may not exceed MAX_BATCH_UPLOAD_MB, since all of them are held
+    # in memory and sent to the preprocessing pool at once
+    MAX_BATCH_FILES = 64
+    MAX_BATCH_UPLOAD_MB = int(os.environ.get('MAX_BATCH_UPLOAD_MB', 200))
+
+    # Async pipeline configs: decode runs in worker processes, inference on the
+    # scheduler thread; both reject work with 429 once these bounds are hit
+    PREPROCESS_WORKERS = int(os.environ.get('PREPROCESS_WORKERS', os.cpu_count() or 1))
+    PREPROCESS_MAX_PENDING = 4 * PREPROCESS_WORKERS
+    INFERENCE_MAX_QUEUE = 2 * MAX_BATCH_FILES
+    RETRY_AFTER_SECONDS = 1
+
+    # Adaptive concurrency: requests that reach the model hold slots under an
+    # AIMD limit steered by inference latency, and get 503 beyond it. Past
+    # FALLBACK_UTILIZATION of the limit, admitted requests run on the fallback
+    # model (FALLBACK_MODEL) when one is configured.
+    CONCURRENCY_INITIAL_LIMIT = 2 * core.Config.BATCH_MAX_SIZE
+    CONCURRENCY_MIN_LIMIT = 4
+    CONCURRENCY_MAX_LIMIT = INFERENCE_MAX_QUEUE
+    CONCURRENCY_LATENCY_TOLERANCE = float(os.environ.get('CONCURRENCY_LATENCY_TOLERANCE', 2.5))
+    CONCURRENCY_BACKOFF = 0.9
+    FALLBACK_UTILIZATION = float(os.environ.get('FALLBACK_UTILIZATION', 0.75))
+
+    # Result cache configs
+    CACHE_MAX_ENTRIES = 4096
+
 # Load model at module level for efficient cold starts
 try:
-    model = YOLO(Config.MODEL_PATH)
+    detector = core.FrogDetector(Config)
     logger.info("Model loaded successfully")
 except Exception as e:
     logger.error(f"Failed to load model: {str(e)}")
     raise RuntimeError("Model initialization failed")
 
-app = FastAPI()
+model = detector.model
+result_cache = detector.result_cache
+
+# Prometheus metrics served at /metrics
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter(
+    "frog_http_requests_total", "HTTP requests by route and status code", ("endpoint", "status")
+)
+REQUEST_DURATION = metrics.histogram(
+    "frog_http_request_duration_seconds", "End-to-end HTTP request latency", ("endpoint",)
+)
+STAGE_DURATION = metrics.histogram(
+    "frog_stage_duration_seconds",
+    "Time per pipeline stage: upload_read, cache_lookup, preprocess_queue, decode, "
+    "orientation, resize, inference (per request, including batching wait), "
+    "inference_batch (per model call) and postprocess",
+    ("stage",)
+)
+FALLBACK_IMAGES = metrics.counter(
+    "frog_fallback_images_total", "Images classified by the fallback model because the service was under load"
+)
+
+def predict_batch(items: List[Tuple[Image.Image, Optional[str]]]) -> List[Dict]:
+    """Run the model on a batch of (image, sha256) and score it with one gather over the probability matrix."""
+    images, digests = zip(*items)
+    with STAGE_DURATION.time(stage="inference_batch"):
+        return detector.predict(images, digests=digests)
+
+# Single scheduler thread owns the model so concurrent requests share forward passes
+batcher = BatchScheduler(
+    predict_batch,
+    max_batch_size=Config.BATCH_MAX_SIZE,
+    max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+    max_queue_size=Config.INFERENCE_MAX_QUEUE
+)
+
+def predict_fallback_batch(items: List[Tuple[Image.Image, Optional[str]]]) -> List[Dict]:
+    """Run the fallback model on a batch of (image, sha256)."""
+    with STAGE_DURATION.time(stage="inference_batch"):
+        return detector.predict([image for image, _ in items], fallback=True)
+
+# The fallback model gets its own scheduler so its batches never wait on the main model's
+fallback_batcher: Optional[BatchScheduler] = None
+if detector.fallback is not None:
+    fallback_batcher = BatchScheduler(
+        predict_fallback_batch,
+        max_batch_size=Config.BATCH_MAX_SIZE,
+        max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+        max_queue_size=Config.INFERENCE_MAX_QUEUE
+    )
+
+limiter = AdaptiveLimiter(
+    initial_limit=Config.CONCURRENCY_INITIAL_LIMIT,
+    min_limit=Config.CONCURRENCY_MIN_LIMIT,
+    max_limit=Config.CONCURRENCY_MAX_LIMIT,
+    tolerance=Config.CONCURRENCY_LATENCY_TOLERANCE,
+    backoff=Config.CONCURRENCY_BACKOFF
+)
+
+# Decode/resize workers are started on first use. They are spawned (not forked)
+# so they only import the preprocessing module, never the model.
+preprocess_executor: Optional[BoundedExecutor] = None
+_preprocess_executor_lock = threading.Lock()
+
+def get_preprocess_executor() -> BoundedExecutor:
+    """Return the shared preprocessing process pool, creating it if needed."""
+    global preprocess_executor
+    with _preprocess_executor_lock:
+        if preprocess_executor is None:
+            pool = ProcessPoolExecutor(
+                max_workers=Config.PREPROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            preprocess_executor = BoundedExecutor(pool, Config.PREPROCESS_MAX_PENDING)
+        return preprocess_executor
+
+metrics.callback("frog_inference_queue_depth", "Images waiting for the batch scheduler", lambda: batcher.queue_depth)
+metrics.callback("frog_inference_queue_capacity", "Inference queue bound", lambda: Config.INFERENCE_MAX_QUEUE)
+metrics.callback(
+    "frog_inference_rejected_total", "Submissions refused because the inference queue was full",
+    lambda: batcher.rejected, kind="counter"
+)
+metrics.callback("frog_concurrency_limit", "Current adaptive limit on in-flight images", lambda: limiter.limit)
+metrics.callback("frog_concurrency_in_flight", "Images holding a concurrency slot", lambda: limiter.in_flight)
+metrics.callback(
+    "frog_concurrency_rejected_total", "Images shed with 503 because the concurrency limit was reached",
+    lambda: limiter.counters["rejected"], kind="counter"
+)
+metrics.callback(
+    "frog_preprocess_pending", "Decode tasks queued or running in the process pool",
+    lambda: preprocess_executor.pending if preprocess_executor else 0
+)
+metrics.callback("frog_preprocess_capacity", "Decode task bound", lambda: Config.PREPROCESS_MAX_PENDING)
+metrics.callback(
+    "frog_cache_hits_total", "Result cache hits (either tier)",
+    lambda: result_cache.counters["local_hits"] + result_cache.counters["shared_hits"], kind="counter"
+)
+metrics.callback(
+    "frog_cache_misses_total", "Result cache misses", lambda: result_cache.counters["misses"], kind="counter"
+)
+metrics.callback(
+    "frog_near_duplicate_hits_total", "Inferences skipped because a near-duplicate image was already classified",
+    lambda: detector.near_duplicates.counters["hits"] if detector.near_duplicates is not None else 0, kind="counter"
+)
+metrics.callback(
+    "frog_cascade_escalations_total", "Images the cascade prefilter passed on to the large model",
+    lambda: detector.cascade.stats.escalated if detector.cascade is not None else 0, kind="counter"
+)
+metrics.callback("process_resident_memory_bytes", "Resident memory of the API process", resident_memory_bytes)
+metrics.callback(
+    "process_proportional_memory_bytes",
+    "Proportional set size: shared pages (e.g. pre-fork model weights) split between the processes mapping them",
+    lambda: memory_usage().get("pss", 0)
+)
+metrics.callback(
+    "process_unique_memory_bytes", "Memory private to this process",
+    lambda: memory_usage().get("uss", 0)
+)
+
+def after_fork() -> None:
+    """Reset per-process state in a worker forked from a process that imported this module.
+
+    Threads don't survive fork and SQLite connections must not cross it. The
+    preprocessing pool is created lazily, so each worker starts its own.
+    """
+    global preprocess_executor
+    batcher.after_fork()
+    if fallback_batcher is not None:
+        fallback_batcher.after_fork()
+    if result_cache.shared is not None:
+        result_cache.shared.after_fork()
+    preprocess_executor = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if preprocess_executor is not None:
+        preprocess_executor.shutdown(wait=False)
+    if detector.vectors is not None:
+        detector.vectors.flush()
+
+app = FastAPI(lifespan=lifespan)
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds {Config.MAX_UPLOAD_SIZE_MB}MB limit"
+    )
+
+class BatchTooLargeError(HTTPException):
+    """The batch as a whole is over its byte budget; fails the request rather than one item."""
+
+def batch_too_large() -> BatchTooLargeError:
+    return BatchTooLargeError(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batch exceeds {Config.MAX_BATCH_UPLOAD_MB}MB in total"
+    )
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse requests whose declared length is over their endpoint's limit before the body is read."""
+    limits = {
+        "/classify-frog": (Config.MAX_UPLOAD_SIZE_MB, upload_too_large),
+        "/classify-frog/batch": (Config.MAX_BATCH_UPLOAD_MB, batch_too_large),
+    }
+    if request.url.path in limits:
+        limit_mb, error_for = limits[request.url.path]
+        content_length = request.headers.get("content-length", "")
+        max_bytes = limit_mb * 1024 * 1024 + Config.MULTIPART_OVERHEAD_BYTES
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            error = error_for()
+            return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time every request by its route template (bounded label values)."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", "unmatched")
+    REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
 
 class ImageProcessor:
     @staticmethod
     def fix_orientation(image: Image.Image) -> Image.Image:
-        """Fix image orientation based on EXIF data."""
-        try:
-            for orientation in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation] == 'Orientation':
-                    break
-            
-            exif = image._getexif()
-            if exif is not None:
-                exif = dict(exif.items())
-                orientation_value = exif.get(orientation)
-                
-                if orientation_value:
-                    exif_orientation_map = {
-                        3: Image.Transpose.ROTATE_180,
-                        6: Image.Transpose.ROTATE_270,
-                        8: Image.Transpose.ROTATE_90
-                    }
-                    if orientation_value in exif_orientation_map:
-                        image = image.transpose(exif_orientation_map[orientation_value])
-            
-            return image
-        except (AttributeError, KeyError, IndexError):
-            return image
+        """Fix image orientation based on EXIF data (all eight orientations)."""
+        return preprocessing.fix_orientation(image)
 
     @staticmethod
     def validate_image(file: UploadFile) -> None:
@@ -89,84 +304,223 @@ class ImageProcessor:
 
     @staticmethod
     def process_image(image: Image.Image) -> Image.Image:
-        """Process image for model inference."""
-        # Fix orientation based on EXIF data
-        image = ImageProcessor.fix_orientation(image)
-        
-        # Validate dimensions
-        if min(image.width, image.height) < Config.MIN_DIMENSION:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Image too small. Minimum dimension: {Config.MIN_DIMENSION}px"
-            )
-        
-        # Scale down if needed
-        if max(image.width, image.height) > Config.MAX_DIMENSION:
-            image.thumbnail((Config.MAX_DIMENSION, Config.MAX_DIMENSION))
-        
-        # Process for model
-        processed_image = ImageOps.contain(image, Config.TARGET_SIZE)
-        
-        # Ensure RGB mode
-        if processed_image.mode != 'RGB':
-            processed_image = processed_image.convert('RGB')
-
-        return processed_image
+        """Decode and resize an opened (not yet loaded) image straight to model resolution."""
+        try:
+            return detector.prepare_image(image)
+        except ImageValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     @staticmethod
-    def read_image_file(file: UploadFile) -> Image.Image:
-        """Read and validate image file."""
+    def probe_header(head: bytes, derivative: bool = False) -> Optional[Tuple[int, int]]:
+        """Validate magic bytes and header dimensions; None if more bytes are needed."""
         try:
-            # Check file size
-            file.file.seek(0, 2)
-            size_in_mb = file.file.tell() / (1024 * 1024)
-            file.file.seek(0)
-            
-            if size_in_mb > Config.MAX_UPLOAD_SIZE_MB:
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"File size exceeds {Config.MAX_UPLOAD_SIZE_MB}MB limit"
-                )
-
-            image_data = file.file.read()
-            return Image.open(io.BytesIO(image_data))
-
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error reading image: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid image file"
-            )
+            return detector.probe_header(head, derivative)
+        except ImageValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-class FrogClassifier:
     @staticmethod
-    def get_frog_confidences(results) -> Dict[str, float]:
-        """Extract confidence scores for frog-related classes."""
-        try:
-            probs = results[0].probs
-            names = results[0].names
-            
-            frog_scores = {class_name: 0.0 for class_name in Config.FROG_CLASSES}
-            
-            for class_name in Config.FROG_CLASSES:
-                for i, name in names.items():
-                    if name.lower() == class_name.lower():
-                        frog_scores[class_name] = float(probs.data[i])
-                        break
-            
-            return frog_scores
-        except Exception as e:
-            logger.error(f"Error processing prediction results: {str(e)}")
-            raise ValueError(f"Error processing prediction results: {str(e)}")
+    async def read_upload(
+        file: UploadFile, derivative: bool = False, max_bytes: Optional[int] = None
+    ) -> Tuple[Union[bytearray, memoryview], str, str]:
+        """Stream the upload into one buffer, rejecting it as early as possible.
+
+        The size limit is enforced while reading, and format and dimensions
+        are checked from the header before the rest of the file is read.
+        Bytes are hashed as they arrive, so the result cache key comes for free.
+        When the multipart parser recorded the size, chunks are copied into a
+        ``bytearray`` of that size as they are read; otherwise they go into a
+        single ``BytesIO`` whose buffer is handed on. Either way the upload is
+        held once, plus one chunk. ``max_bytes`` lowers the per-file limit
+        (e.g. to what is left of a batch's budget). Returns the raw bytes,
+        their cache key and their hex sha256.
+        """
+        max_bytes = min(detector.max_bytes, max_bytes) if max_bytes is not None else detector.max_bytes
+        # The multipart parser records the size while spooling
+        if file.size is not None and file.size > max_bytes:
+            raise upload_too_large()
+
+        await file.seek(0)
+        digest = hashlib.sha256()
+        total = 0
+        header = None
+        if file.size is not None:
+            buffer = bytearray(file.size)
+            view = memoryview(buffer)
+            # UploadFile.read, not readinto: SpooledTemporaryFile has no readinto before Python 3.11
+            while total < len(buffer):
+                chunk = await file.read(min(Config.UPLOAD_CHUNK_SIZE, len(buffer) - total))
+                if not chunk:
+                    break
+                count = len(chunk)
+                view[total:total + count] = chunk
+                digest.update(chunk)
+                total += count
+                if header is None and total - count < Config.HEADER_PROBE_BYTES:
+                    header = ImageProcessor.probe_header(bytes(view[:total]), derivative)
+            view.release()
+            if total < len(buffer):
+                del buffer[total:]
+            elif await file.read(1):
+                # More bytes than the parser recorded
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file")
+            data: Union[bytearray, memoryview] = buffer
+        else:
+            stream = io.BytesIO()
+            while chunk := await file.read(Config.UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise upload_too_large()
+                stream.write(chunk)
+                digest.update(chunk)
+                if header is None and total - len(chunk) < Config.HEADER_PROBE_BYTES:
+                    header = ImageProcessor.probe_header(stream.getvalue(), derivative)
+            data = stream.getbuffer()
+
+        # The whole file was probed without finding a complete header
+        if header is None and total < Config.HEADER_PROBE_BYTES:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file")
+
+        # key_from_digest extends the digest, so take the content hash first
+        content_hash = digest.hexdigest()
+        return data, result_cache.key_from_digest(digest), content_hash
 
     @staticmethod
-    def analyze_frog_confidence(frog_scores: Dict[str, float]) -> Tuple[bool, float]:
-        """Calculate total frog confidence and determine if image is of a frog."""
-        total_confidence = sum(frog_scores.values())
-        is_frog = total_confidence >= Config.FROG_THRESHOLD
-        return is_frog, total_confidence
+    def open_image(image_data: bytes) -> Image.Image:
+        """Open raw image bytes."""
+        try:
+            return preprocessing.open_image(image_data)
+        except ImageValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+def build_response(decision: Dict) -> ClassificationResponse:
+    """Convert a scored prediction (see ``FrogDetector.predict``) into a response."""
+    return ClassificationResponse(
+        is_frog=decision["is_frog"],
+        confidence=decision["confidence"],
+        details=FrogConfidences(**decision["details"])
+    )
+
+def server_busy(stage: str) -> HTTPException:
+    """429 telling the client to back off while a pipeline stage is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Server busy ({stage}), retry later",
+        headers={"Retry-After": str(Config.RETRY_AFTER_SECONDS)}
+    )
+
+def service_overloaded() -> HTTPException:
+    """503 shedding work the adaptive concurrency limit has no room for."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Service overloaded, retry later",
+        headers={"Retry-After": str(Config.RETRY_AFTER_SECONDS)}
+    )
+
+@asynccontextmanager
+async def admission(weight: int):
+    """Hold ``weight`` concurrency slots while images are decoded and classified.
+
+    Yields True when the request should run on the fallback model because
+    the limit is nearly used up.
+    """
+    if not limiter.try_acquire(weight):
+        raise service_overloaded()
+    try:
+        yield fallback_batcher is not None and limiter.utilization >= Config.FALLBACK_UTILIZATION
+    finally:
+        limiter.release(weight)
+
+def lookup_cache(cache_key: str) -> Optional[ClassificationResponse]:
+    """Look up a previous result for identical upload bytes."""
+    cached = result_cache.get(cache_key)
+    return ClassificationResponse(**cached) if cached is not None else None
+
+async def preprocess_images(
+    images_data: List[Union[bytes, bytearray, memoryview]], derivative: bool = False
+) -> List[Union[Image.Image, ImageValidationError]]:
+    """Decode uploads in the process pool, spreading them across workers."""
+    executor = get_preprocess_executor()
+    # Pool arguments are pickled, which copies them anyway; memoryviews (from
+    # uploads of unknown size) can't be, so they are copied here instead
+    images_data = [data.tobytes() if isinstance(data, memoryview) else data for data in images_data]
+    chunk_size = math.ceil(len(images_data) / Config.PREPROCESS_WORKERS)
+    futures = []
+    try:
+        for start in range(0, len(images_data), chunk_size):
+            futures.append(executor.submit(
+                preprocessing.decode_many,
+                images_data[start:start + chunk_size],
+                *detector.decode_args(derivative)
+            ))
+    except SaturatedError:
+        for future in futures:
+            future.cancel()
+        raise server_busy("preprocessing")
+
+    async def collect(future):
+        start = time.perf_counter()
+        decoded = await asyncio.wrap_future(future)
+        elapsed = time.perf_counter() - start
+        for _, timings in decoded:
+            # Worker stage timings; the rest of the wait was pool queueing and IPC
+            for stage, seconds in timings.items():
+                STAGE_DURATION.observe(seconds, stage=stage)
+            STAGE_DURATION.observe(max(0.0, elapsed - sum(timings.values())), stage="preprocess_queue")
+        return [image for image, _ in decoded]
+
+    chunks = await asyncio.gather(*(collect(future) for future in futures))
+    return [image for chunk in chunks for image in chunk]
+
+async def run_inference(
+    images: List[Image.Image], fallback: bool = False, digests: Optional[List[str]] = None
+) -> List[Union[Dict, Exception]]:
+    """Queue images on the batch scheduler and await their scored predictions.
+
+    Main-model latency is fed back to the concurrency limiter; pass
+    ``fallback`` (from ``admission``) to use the fallback model instead.
+    ``digests`` (each image's upload sha256) key its stored probability vector.
+    """
+    scheduler = fallback_batcher if fallback else batcher
+    start = time.perf_counter()
+    try:
+        futures = scheduler.submit_many(list(zip(images, digests or [None] * len(images))))
+    except SaturatedError:
+        raise server_busy("inference")
+    results = await asyncio.gather(
+        *(asyncio.wrap_future(future) for future in futures),
+        return_exceptions=True
+    )
+    if fallback:
+        FALLBACK_IMAGES.inc(len(images))
+    else:
+        # Normalise to one forward pass so large batch requests don't read as congestion
+        rounds = math.ceil(len(images) / Config.BATCH_MAX_SIZE)
+        limiter.observe((time.perf_counter() - start) / rounds, weight=len(images))
+    return results
+
+def find_near_duplicate(image: Image.Image) -> Tuple[Optional[int], Optional[Dict]]:
+    """Perceptual hash of a decoded image and the result of a near-duplicate, if any."""
+    if detector.near_duplicates is None:
+        return None, None
+    with STAGE_DURATION.time(stage="near_duplicate"):
+        return detector.find_near_duplicate(image)
+
+async def classify_prepared(
+    cache_key: str, result: Dict, image_hash: Optional[int] = None, fallback: bool = False
+) -> ClassificationResponse:
+    """Build a response from a scored prediction and remember it for repeat uploads.
+
+    Pass ``image_hash`` for fresh predictions so near-duplicates can reuse
+    them. Fallback-model results are not remembered, so the next upload of
+    the image gets the main model's answer.
+    """
+    response = build_response(result)
+    if fallback:
+        return response
+    payload = response.model_dump()
+    detector.remember(image_hash, payload)
+    await asyncio.to_thread(result_cache.set, cache_key, payload)
+    return response
 
 @app.post(
     "/classify-frog",
@@ -176,41 +530,70 @@ class FrogClassifier:
         413: {"description": "File too large"},
         415: {"description": "Unsupported media type"},
         400: {"description": "Bad request"},
-        500: {"description": "Internal server error"}
+        429: {"description": "Server busy, retry after the Retry-After delay"},
+        500: {"description": "Internal server error"},
+        503: {"description": "Overloaded, retry after the Retry-After delay"}
     }
 )
-def classify_frog(file: UploadFile = File(...)) -> ClassificationResponse:
-    """Classify whether an image contains a frog and return confidence scores."""
+async def classify_frog(
+    response: Response, file: UploadFile = File(...), derivative: bool = False
+) -> ClassificationResponse:
+    """Classify whether an image contains a frog and return confidence scores.
+
+    Pass ``?derivative=true`` when uploading a model-resolution copy (short
+    side ``MODEL_INPUT_SIZE``) instead of the original; it is then held to
+    that size rather than ``MIN_DIMENSION``. Under load the result may come
+    from the fallback model, marked by an ``X-Model-Tier: fallback`` header.
+    """
     start_time = time.time()
     
     try:
-        # Process image
+        # Stream the upload, rejecting bad sizes, formats and dimensions early
         ImageProcessor.validate_image(file)
-        original_image = ImageProcessor.read_image_file(file)
-        processed_image = ImageProcessor.process_image(original_image)
+        with STAGE_DURATION.time(stage="upload_read"):
+            image_data, cache_key, content_hash = await ImageProcessor.read_upload(file, derivative)
+
+        # The shared cache tier may hit disk, so look up off the event loop
+        with STAGE_DURATION.time(stage="cache_lookup"):
+            cached = await asyncio.to_thread(lookup_cache, cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit in {time.time() - start_time:.2f}s")
+            return cached
+
+        # Past the cache, the request holds a concurrency slot or is shed
+        async with admission(1) as fallback:
+            # Decode and resize in a worker process
+            processed = (await preprocess_images([image_data], derivative))[0]
+            if isinstance(processed, ImageValidationError):
+                raise HTTPException(status_code=processed.status_code, detail=processed.detail)
+
+            # Re-encoded or resized copies of an image already classified skip the model
+            image_hash, near_duplicate = find_near_duplicate(processed)
+            if near_duplicate is not None:
+                logger.info(f"Near-duplicate hit in {time.time() - start_time:.2f}s")
+                return await classify_prepared(cache_key, near_duplicate)
+
+            # Get prediction (coalesced with concurrent requests by the scheduler)
+            with STAGE_DURATION.time(stage="inference"):
+                result = (await run_inference([processed], fallback, [content_hash]))[0]
+            if isinstance(result, Exception):
+                raise result
 
-        # Get prediction
-        results = model(processed_image)
-        
         # Process results
-        frog_scores = FrogClassifier.get_frog_confidences(results)
-        is_frog, total_confidence = FrogClassifier.analyze_frog_confidence(frog_scores)
-        
+        with STAGE_DURATION.time(stage="postprocess"):
+            classification = await classify_prepared(cache_key, result, image_hash, fallback)
+        if fallback:
+            response.headers["X-Model-Tier"] = "fallback"
+
         # Log processing time
         processing_time = time.time() - start_time
         logger.info(
             f"Prediction completed in {processing_time:.2f}s - "
-            f"is_frog={is_frog}, confidence={total_confidence:.4f}"
-        )
-        
-        return ClassificationResponse(
-            is_frog=is_frog,
-            confidence=round(total_confidence, 4),
-            details=FrogConfidences(**{
-                k: round(v, 4) for k, v in frog_scores.items()
-            })
+            f"is_frog={classification.is_frog}, confidence={classification.confidence:.4f}"
         )
 
+        return classification
+
     except HTTPException:
         raise
     except Exception as e:
@@ -220,10 +603,170 @@ def classify_frog(file: UploadFile = File(...)) -> ClassificationResponse:
             detail="Internal server error during image processing"
         )
 
+@app.post(
+    "/classify-frog/batch",
+    response_model=BatchClassificationResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        413: {"description": "Too many files, or more than MAX_BATCH_UPLOAD_MB in total"},
+        400: {"description": "Bad request"},
+        429: {"description": "Server busy, retry after the Retry-After delay"},
+        503: {"description": "Overloaded, retry after the Retry-After delay"}
+    }
+)
+async def classify_frog_batch(
+    response: Response, files: List[UploadFile] = File(...), derivative: bool = False
+) -> BatchClassificationResponse:
+    """Classify many images in one request, reporting errors per item.
+
+    Uploads share a MAX_BATCH_UPLOAD_MB budget; a batch over it fails as a
+    whole with 413. ``?derivative=true`` marks every file as a model-resolution copy, as for
+    ``/classify-frog``. Under load the results may come from the fallback
+    model, marked by an ``X-Model-Tier: fallback`` header.
+    """
+    start_time = time.time()
+
+    if len(files) > Config.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many files. Maximum per batch: {Config.MAX_BATCH_FILES}"
+        )
+
+    # Each slot ends up holding a response or the HTTPException for that item
+    outcomes: List[Union[ClassificationResponse, HTTPException, None]] = [None] * len(files)
+
+    # Read, validate and check the cache; collect the misses for decoding.
+    # Each upload may use at most what is left of the batch's byte budget.
+    misses = []
+    budget = Config.MAX_BATCH_UPLOAD_MB * 1024 * 1024
+    for index, file in enumerate(files):
+        try:
+            ImageProcessor.validate_image(file)
+            with STAGE_DURATION.time(stage="upload_read"):
+                try:
+                    image_data, cache_key, content_hash = await ImageProcessor.read_upload(
+                        file, derivative, max_bytes=budget
+                    )
+                except HTTPException as e:
+                    if e.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE and budget < detector.max_bytes:
+                        raise batch_too_large()
+                    raise
+            budget -= len(image_data)
+            with STAGE_DURATION.time(stage="cache_lookup"):
+                cached = await asyncio.to_thread(lookup_cache, cache_key)
+            if cached is not None:
+                outcomes[index] = cached
+            else:
+                misses.append((index, cache_key, content_hash, image_data))
+        except BatchTooLargeError:
+            raise
+        except HTTPException as e:
+            outcomes[index] = e
+
+    # Decode in parallel worker processes, then queue every image at once so
+    # the scheduler can fill whole batches. The misses hold one concurrency
+    # slot each until they are classified.
+    if misses:
+        async with admission(len(misses)) as fallback:
+            ready = []
+            decoded = await preprocess_images([image_data for *_, image_data in misses], derivative)
+            for (index, cache_key, content_hash, _), image in zip(misses, decoded):
+                if isinstance(image, ImageValidationError):
+                    outcomes[index] = HTTPException(status_code=image.status_code, detail=image.detail)
+                    continue
+                image_hash, near_duplicate = find_near_duplicate(image)
+                if near_duplicate is not None:
+                    outcomes[index] = await classify_prepared(cache_key, near_duplicate)
+                else:
+                    ready.append((index, cache_key, content_hash, image, image_hash))
+
+            if ready:
+                with STAGE_DURATION.time(stage="inference"):
+                    results = await run_inference(
+                        [image for *_, image, _ in ready], fallback, [content_hash for _, _, content_hash, *_ in ready]
+                    )
+                if fallback:
+                    response.headers["X-Model-Tier"] = "fallback"
+                for (index, cache_key, _, _, image_hash), result in zip(ready, results):
+                    try:
+                        if isinstance(result, Exception):
+                            raise result
+                        with STAGE_DURATION.time(stage="postprocess"):
+                            outcomes[index] = await classify_prepared(cache_key, result, image_hash, fallback)
+                    except Exception as e:
+                        logger.error(f"Error processing batch item {files[index].filename}: {str(e)}")
+                        outcomes[index] = HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Internal server error during image processing"
+                        )
+
+    items = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, HTTPException):
+            items.append(BatchItemResult(
+                filename=file.filename,
+                status_code=outcome.status_code,
+                error=outcome.detail
+            ))
+        else:
+            items.append(BatchItemResult(
+                filename=file.filename,
+                status_code=status.HTTP_200_OK,
+                result=outcome
+            ))
+
+    processing_time = time.time() - start_time
+    logger.info(f"Batch of {len(files)} images completed in {processing_time:.2f}s")
+    return BatchClassificationResponse(results=items)
+
+def concurrency_status() -> Dict:
+    """Adaptive limiter state and whether new requests would go to the fallback model."""
+    return {
+        **limiter.metrics(),
+        "fallback": {
+            "enabled": fallback_batcher is not None,
+            "active": fallback_batcher is not None and limiter.utilization >= Config.FALLBACK_UTILIZATION,
+            "utilization_threshold": Config.FALLBACK_UTILIZATION,
+            "images": int(FALLBACK_IMAGES.value())
+        }
+    }
+
 @app.get("/health")
-def health_check():
-    """Health check endpoint for monitoring."""
+async def health_check():
+    """Health check endpoint for monitoring, with the current concurrency limit."""
     return {
         "status": "healthy",
-        "model_loaded": model is not None
-    }
\ No newline at end of file
+        "model_loaded": model is not None,
+        "concurrency": concurrency_status()
+    }
+
+@app.get("/stats")
+async def service_stats():
+    """Batch scheduler, concurrency, preprocessing pool, result cache, near-duplicate, cascade and vector store statistics."""
+    return {
+        "batching": batcher.metrics(),
+        "concurrency": concurrency_status(),
+        "preprocessing": {
+            "workers": Config.PREPROCESS_WORKERS,
+            "pending": preprocess_executor.pending if preprocess_executor else 0,
+            "max_pending": Config.PREPROCESS_MAX_PENDING
+        },
+        "cache": result_cache.metrics(),
+        "near_duplicates": (
+            {"enabled": True, **detector.near_duplicates.metrics()}
+            if detector.near_duplicates is not None else {"enabled": False}
+        ),
+        "cascade": (
+            {"enabled": True, **detector.cascade.metrics()}
+            if detector.cascade is not None else {"enabled": False}
+        ),
+        "vectors": (
+            {"enabled": True, **detector.vectors.metrics()}
+            if detector.vectors is not None else {"enabled": False}
+        )
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, stage, queue and memory metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
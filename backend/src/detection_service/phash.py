@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# dHash compares horizontally adjacent pixels of a (HASH_SIZE + 1) x HASH_SIZE
+# grayscale thumbnail, giving HASH_SIZE ** 2 bits
+HASH_SIZE = 8
+# Thumbnails flatter than this (grayscale standard deviation) carry too little
+# structure to hash: every blank or near-uniform image would collide
+MIN_DETAIL = 2.0
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """Difference hash of an image, or None if it is too uniform to fingerprint.
+
+    Stable under re-encoding, resizing and small crops or colour shifts, so
+    Hamming distance between hashes approximates visual similarity.
+    """
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    if pixels.std() < MIN_DETAIL:
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes under Hamming distance.
+
+    Each child edge is labelled with its distance to the parent, so a search
+    within radius r only descends edges in [d - r, d + r] (triangle
+    inequality) instead of comparing against every stored hash.
+    """
+
+    def __init__(self):
+        # Node: [hash, value, {distance: child}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: Any) -> None:
+        """Insert ``key``, replacing the value if it is already present."""
+        if self._root is None:
+            self._root = [key, value, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1] = value
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, value, {}]
+                self._size += 1
+                return
+            node = child
+
+    def nearest(self, key: int, max_distance: int) -> Optional[Tuple[int, Any]]:
+        """(distance, value) of the closest hash within ``max_distance``, or None."""
+        if self._root is None:
+            return None
+        best: Optional[Tuple[int, Any]] = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, node[1])
+                if distance == 0:
+                    break
+            radius = best[0] if best is not None else max_distance
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return best
+
+
+class NearDuplicateIndex:
+    """Bounded, thread-safe map from perceptual hash to a classification result.
+
+    Lookups return the result stored for the nearest hash within
+    ``max_distance`` bits. BK-trees can't delete cheaply, so once
+    ``max_entries`` is exceeded the oldest quarter is dropped and the tree is
+    rebuilt from the rest.
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 10000):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0, "unhashable": 0, "rebuilds": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, image_hash: Optional[int]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if image_hash is None:
+                self.counters["unhashable"] += 1
+                return None
+            self.counters["lookups"] += 1
+            match = self._tree.nearest(image_hash, self.max_distance)
+            if match is None:
+                return None
+            self.counters["hits"] += 1
+            return match[1]
+
+    def add(self, image_hash: Optional[int], value: Dict[str, Any]) -> None:
+        if image_hash is None:
+            return
+        with self._lock:
+            self._entries[image_hash] = value
+            self._entries.move_to_end(image_hash)
+            self._tree.add(image_hash, value)
+            if len(self._entries) > self.max_entries:
+                for _ in range(max(1, self.max_entries // 4)):
+                    self._entries.popitem(last=False)
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._tree = BKTree()
+        for image_hash, value in self._entries.items():
+            self._tree.add(image_hash, value)
+        self.counters["rebuilds"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "entries": len(self._entries),
+            "max_distance": self.max_distance,
+            "lookups": counters["lookups"],
+            # Each hit is a forward pass that didn't run
+            "inferences_saved": counters["hits"],
+            "hit_rate": round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else 0.0,
+            "unhashable": counters["unhashable"],
+            "rebuilds": counters["rebuilds"],
+        }
+
@@ -0,0 +1,200 @@
+import io
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Kept free of FastAPI and model imports: this module is loaded by
+# preprocessing worker processes, which must start quickly and stay small.
+
+
+class ImageValidationError(ValueError):
+    """An upload that cannot be classified, with the HTTP status it maps to."""
+
+    def __init__(self, status_code: int, detail: str):
+        # Pass both to ValueError so the error survives pickling across processes
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+# Leading bytes identifying each accepted upload format
+MAGIC_NUMBERS = (
+    ("JPEG", 0, b"\xff\xd8\xff"),
+    ("PNG", 0, b"\x89PNG\r\n\x1a\n"),
+    ("WEBP", 8, b"WEBP"),  # RIFF container: b"RIFF" <size> b"WEBP"
+)
+# File suffixes of the accepted formats, for tools that walk image folders
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def list_images(directory: str, limit: Optional[int] = None) -> List[str]:
+    """Image files under ``directory``, sorted for reproducible runs."""
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Identify the image format from its first bytes, or None if unsupported."""
+    for name, offset, magic in MAGIC_NUMBERS:
+        if head[offset:offset + len(magic)] == magic:
+            if name == "WEBP" and not head.startswith(b"RIFF"):
+                continue
+            return name
+    return None
+
+
+def check_dimensions(size: Tuple[int, int], min_dimension: int, max_pixels: Optional[int] = None) -> None:
+    """Reject images that are too small to classify or large enough to be decompression bombs."""
+    width, height = size
+    if min(width, height) < min_dimension:
+        raise ImageValidationError(400, f"Image too small. Minimum dimension: {min_dimension}px")
+    if max_pixels is not None and width * height > max_pixels:
+        raise ImageValidationError(413, f"Image too large. Maximum pixels: {max_pixels}")
+
+
+def probe_header(head: bytes, min_dimension: int, max_pixels: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """Validate format and dimensions from the leading bytes of an upload.
+
+    Returns the (width, height) from the header, or None when ``head`` ends
+    before the header does and more bytes are needed.
+    """
+    if sniff_format(head) is None:
+        raise ImageValidationError(400, "Invalid image file")
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            size = image.size
+    except Image.DecompressionBombError:
+        raise ImageValidationError(413, f"Image too large. Maximum pixels: {max_pixels}")
+    except Exception:
+        # Typically a header larger than ``head`` (e.g. big EXIF blocks)
+        return None
+    check_dimensions(size, min_dimension, max_pixels)
+    return size
+
+
+def fix_orientation(image: Image.Image) -> Image.Image:
+    """Fix image orientation based on EXIF data (all eight orientations)."""
+    try:
+        ImageOps.exif_transpose(image, in_place=True)
+    except (AttributeError, KeyError, IndexError, ValueError):
+        pass
+    return image
+
+
+def open_image(image_data: bytes) -> Image.Image:
+    """Open raw image bytes lazily; only the header is parsed."""
+    try:
+        # BytesIO shares an immutable bytes object rather than copying it
+        return Image.open(io.BytesIO(image_data))
+    except Exception as e:
+        logger.error(f"Error reading image: {str(e)}")
+        raise ImageValidationError(400, "Invalid image file")
+
+
+def prepare_image(
+    image: Image.Image,
+    min_dimension: int,
+    input_size: int,
+    max_pixels: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """Decode and resize an opened (not yet loaded) image straight to model resolution.
+
+    If ``timings`` is given, seconds spent in the decode, orientation and
+    resize stages are recorded in it.
+    """
+    # Validate dimensions from the header, before any pixels are decoded
+    check_dimensions(image.size, min_dimension, max_pixels)
+
+    stage_start = time.perf_counter()
+
+    def end_stage(name: str) -> None:
+        nonlocal stage_start
+        now = time.perf_counter()
+        if timings is not None:
+            timings[name] = now - stage_start
+        stage_start = now
+
+    try:
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale in the DCT domain while
+        # keeping both sides >= the model input. No-op for other formats.
+        image.draft("RGB", (input_size, input_size))
+        image.load()
+    except (OSError, SyntaxError) as e:
+        logger.error(f"Error decoding image: {str(e)}")
+        raise ImageValidationError(400, "Invalid image file")
+    end_stage("decode")
+
+    # Fix orientation based on EXIF data
+    image = fix_orientation(image)
+    end_stage("orientation")
+
+    # Single resize so the short side matches the classifier's input size
+    scale = input_size / min(image.width, image.height)
+    if scale < 1:
+        new_size = (
+            max(input_size, round(image.width * scale)),
+            max(input_size, round(image.height * scale)),
+        )
+        image = image.resize(new_size, Image.Resampling.BILINEAR, reducing_gap=3.0)
+
+    # Ensure RGB mode
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    end_stage("resize")
+
+    return image
+
+
+def encode_derivative(image: Image.Image, quality: int) -> bytes:
+    """JPEG bytes of a prepared image, small enough to store and re-read instead of the original.
+
+    Orientation was applied while preparing, so no EXIF is written.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def decode_for_model(
+    image_data: bytes,
+    min_dimension: int,
+    input_size: int,
+    max_pixels: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """Open, validate and resize raw bytes; the entry point for worker processes."""
+    return prepare_image(open_image(image_data), min_dimension, input_size, max_pixels, timings)
+
+
+def decode_many(
+    images_data: List[bytes], min_dimension: int, input_size: int, max_pixels: Optional[int] = None
+) -> List[Tuple[Union[Image.Image, ImageValidationError], Dict[str, float]]]:
+    """Decode several uploads in one worker task.
+
+    Returns an (image or error, stage timings) pair per upload, in order.
+    """
+    results: List[Tuple[Union[Image.Image, ImageValidationError], Dict[str, float]]] = []
+    for image_data in images_data:
+        timings: Dict[str, float] = {}
+        try:
+            results.append((decode_for_model(image_data, min_dimension, input_size, max_pixels, timings), timings))
+        except ImageValidationError as e:
+            results.append((e, timings))
+        except Exception as e:
+            logger.error(f"Unexpected error preprocessing image: {str(e)}")
+            results.append((ImageValidationError(500, "Internal server error during image processing"), timings))
+    return results
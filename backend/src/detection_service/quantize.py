@@ -0,0 +1,250 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from . import core, preprocessing
+from .backends import OnnxBackend, artifact_path, preprocess
+from .scoring import FrogScorer
+
+logger = logging.getLogger(__name__)
+
+
+def load_images(paths: Iterable[str]) -> List[Image.Image]:
+    """Decode files as production requests are decoded: oriented and resized to model resolution."""
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(preprocessing.decode_for_model(
+                f.read(), 1, core.Config.MODEL_INPUT_SIZE, core.Config.MAX_IMAGE_PIXELS
+            ))
+    return images
+
+
+class ImageFolderCalibrationReader:
+    """Feeds preprocessed calibration images to onnxruntime one at a time."""
+
+    def __init__(self, paths: Sequence[str], input_name: str, input_size: int):
+        self.paths = list(paths)
+        self.input_name = input_name
+        self.input_size = input_size
+        self._index = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._index >= len(self.paths):
+            return None
+        image = load_images([self.paths[self._index]])[0]
+        self._index += 1
+        return {self.input_name: preprocess(image, self.input_size)[np.newaxis]}
+
+    def rewind(self) -> None:
+        self._index = 0
+
+
+def _copy_metadata(source: str, target: str) -> None:
+    """Carry the ultralytics metadata (class names, imgsz) over to the quantized model."""
+    import onnx
+
+    source_model = onnx.load(source, load_external_data=False)
+    target_model = onnx.load(target)
+    existing = {prop.key for prop in target_model.metadata_props}
+    for prop in source_model.metadata_props:
+        if prop.key not in existing:
+            target_model.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(target_model, target)
+
+
+def quantize_model(
+    model_path: str,
+    mode: str,
+    calibration_dir: Optional[str] = None,
+    calibration_size: int = 128,
+) -> str:
+    """Quantize the exported FP32 ONNX model to INT8.
+
+    ``dynamic`` quantizes weights only and needs no data. ``static`` also
+    quantizes activations, using ranges observed over ``calibration_dir``.
+    """
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quant_pre_process,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    source = artifact_path("onnx", model_path)
+    target = artifact_path("onnx", model_path, mode)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"{source} not found; run detection_service.export first")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference and graph cleanup give the quantizer better coverage
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(source, prepared, skip_symbolic_shape=True)
+
+        if mode == "dynamic":
+            quantize_dynamic(prepared, target, weight_type=QuantType.QInt8, per_channel=True)
+        elif mode == "static":
+            if not calibration_dir:
+                raise ValueError("Static quantization requires a calibration image directory")
+            paths = preprocessing.list_images(calibration_dir, limit=calibration_size)
+            if not paths:
+                raise ValueError(f"No calibration images found in {calibration_dir}")
+
+            fp32 = OnnxBackend(source)
+            reader = ImageFolderCalibrationReader(paths, fp32.input_name, fp32.input_size)
+            quantize_static(
+                prepared,
+                target,
+                reader,
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+            logger.info(f"Calibrated on {len(paths)} images from {calibration_dir}")
+        else:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+
+    _copy_metadata(source, target)
+    logger.info(f"Wrote {mode} INT8 model to {target}")
+    return target
+
+
+def frog_decisions(probs: np.ndarray, names: Dict[int, str], threshold: float):
+    """Summed frog confidence and is_frog decision for each row of ``probs``."""
+    return FrogScorer(names, core.Config.FROG_CLASSES, threshold).decisions(probs)
+
+
+def _rss_bytes() -> int:
+    import psutil
+
+    return psutil.Process().memory_info().rss
+
+
+def _profile(backend_factory, images: Sequence[Image.Image], repeats: int) -> Dict:
+    rss_before = _rss_bytes()
+    load_start = time.perf_counter()
+    backend = backend_factory()
+    load_seconds = time.perf_counter() - load_start
+
+    probs = np.stack([backend.predict_probs([image])[0] for image in images])
+    latencies = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            backend.predict_probs([image])
+            latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "probs": probs,
+        "report": {
+            "model_path": backend.model_path,
+            "model_size_mb": round(os.path.getsize(backend.model_path) / 2**20, 2),
+            "load_seconds": round(load_seconds, 3),
+            "rss_increase_mb": round((_rss_bytes() - rss_before) / 2**20, 1),
+            "latency_ms": {
+                "mean": round(float(latencies_ms.mean()), 2),
+                "p50": round(float(np.percentile(latencies_ms, 50)), 2),
+                "p95": round(float(np.percentile(latencies_ms, 95)), 2),
+            },
+        },
+    }
+
+
+def evaluate(
+    model_path: str,
+    mode: str,
+    images_dir: str,
+    threshold: float = 0.5,
+    limit: Optional[int] = None,
+    repeats: int = 1,
+    threads: int = 0,
+) -> Dict:
+    """Compare the quantized model against FP32 on latency, memory and decisions."""
+    paths = preprocessing.list_images(images_dir, limit=limit)
+    if not paths:
+        raise ValueError(f"No images found in {images_dir}")
+    images = load_images(paths)
+
+    fp32 = _profile(lambda: OnnxBackend(artifact_path("onnx", model_path), threads), images, repeats)
+    int8 = _profile(lambda: OnnxBackend(artifact_path("onnx", model_path, mode), threads), images, repeats)
+
+    fp32_frog, fp32_conf = frog_decisions(fp32["probs"], fp32["backend"].names, threshold)
+    int8_frog, int8_conf = frog_decisions(int8["probs"], int8["backend"].names, threshold)
+
+    return {
+        "images": len(images),
+        "mode": mode,
+        "threshold": threshold,
+        "fp32": fp32["report"],
+        "int8": int8["report"],
+        "speedup": round(fp32["report"]["latency_ms"]["mean"] / int8["report"]["latency_ms"]["mean"], 2),
+        "is_frog_agreement": round(float((fp32_frog == int8_frog).mean()), 4),
+        "is_frog_disagreements": [p for p, a, b in zip(paths, fp32_frog, int8_frog) if a != b],
+        "top1_agreement": round(float((fp32["probs"].argmax(1) == int8["probs"].argmax(1)).mean()), 4),
+        "confidence_abs_error": {
+            "mean": round(float(np.abs(fp32_conf - int8_conf).mean()), 5),
+            "max": round(float(np.abs(fp32_conf - int8_conf).max()), 5),
+        },
+    }
+
+
+def agreement_failures(report: Dict, min_agreement: float) -> List[str]:
+    """Agreement figures in an ``evaluate`` report that fall below ``min_agreement``."""
+    return [
+        f"{name} {report[name]} is below {min_agreement}"
+        for name in ("top1_agreement", "is_frog_agreement")
+        if report[name] < min_agreement
+    ]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="INT8 quantization for the ONNX frog classifier.")
+    parser.add_argument("--model", default="yolo11l-cls.pt", help="Source model (artifacts live beside it)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("quantize", help="Write an INT8 model")
+    build.add_argument("--mode", choices=["dynamic", "static"], default="dynamic")
+    build.add_argument("--calibration-dir", help="Image folder for static calibration")
+    build.add_argument("--calibration-size", type=int, default=128)
+
+    check = subparsers.add_parser("evaluate", help="Compare INT8 against FP32")
+    check.add_argument("--mode", choices=["dynamic", "static"], default="dynamic")
+    check.add_argument("--images", required=True, help="Image folder to evaluate on")
+    check.add_argument("--threshold", type=float, default=0.5)
+    check.add_argument("--limit", type=int)
+    check.add_argument("--repeats", type=int, default=1)
+    check.add_argument("--threads", type=int, default=0)
+    check.add_argument("--min-agreement", type=float,
+                       help="Exit non-zero if top-1 or is_frog agreement with FP32 falls below this (e.g. 0.99)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.command == "quantize":
+        print(quantize_model(args.model, args.mode, args.calibration_dir, args.calibration_size))
+    else:
+        report = evaluate(
+            args.model, args.mode, args.images, args.threshold, args.limit, args.repeats, args.threads
+        )
+        print(json.dumps(report, indent=2))
+        if args.min_agreement is not None:
+            failures = agreement_failures(report, args.min_agreement)
+            for failure in failures:
+                logger.error(f"INT8 model rejected: {failure}")
+            if failures:
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Offline bulk re-scoring of the stored image corpus.
+
+Walks a local directory or an S3 prefix and writes every image's scores to a
+Parquet dataset, for re-scoring after a model swap or evaluating a new
+``FROG_THRESHOLD`` without touching the HTTP or Lambda handlers. Run from
+``backend/``::
+
+    python -m detection_service.rescore --source s3://frogstagram-posts/ --output rescored/
+    python -m detection_service.rescore --source ./images --output rescored/ --top-k 5
+
+Fetch and decode run in a pool of worker processes that stay a few chunks
+ahead of the batched inference stage in this process, so the model never
+waits on I/O. Rows are written as numbered part files every
+``--flush-rows`` images; they double as the checkpoint, so rerunning the
+same command after an interruption skips every key already written.
+
+Each row holds the decision and frog class scores at the run's threshold
+plus the top ``--top-k`` class probabilities (all classes by default), whose
+indices refer to the ``classes`` list in the dataset's ``manifest.json``.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from . import preprocessing
+from .preprocessing import ImageValidationError
+from .vectors import VectorStore, top_k
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Manifest fields that must match for a run to resume an existing output
+RESUME_FIELDS = ("source", "model_version", "threshold", "classes", "frog_classes", "top_k")
+
+# (key, key actually read, whether that is a derivative)
+WorkItem = Tuple[str, str, bool]
+
+
+class LocalSource:
+    """Image files under a directory, keyed by their path relative to it."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def list_keys(self) -> List[str]:
+        return [
+            os.path.relpath(path, self.root).replace(os.sep, "/") for path in preprocessing.list_images(self.root)
+        ]
+
+    def read(self, key: str, max_bytes: int, inspect_header: Callable[[bytes], object]) -> bytes:
+        path = os.path.join(self.root, key)
+        if os.path.getsize(path) > max_bytes:
+            raise ImageValidationError(413, f"File exceeds {max_bytes} bytes")
+        with open(path, "rb") as f:
+            data = f.read()
+        inspect_header(data)
+        return data
+
+
+class S3Source:
+    """Objects under an S3 prefix, fetched header-first like the Lambda does."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = client
+        self._fetcher = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from .s3io import make_s3_client
+
+            self._client = make_s3_client()
+        return self._client
+
+    def list_keys(self) -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            keys.extend(
+                item["Key"] for item in page.get("Contents", []) if item["Key"].lower().endswith(preprocessing.IMAGE_EXTENSIONS)
+            )
+        return sorted(keys)
+
+    def read(self, key: str, max_bytes: int, inspect_header: Callable[[bytes], object]) -> bytes:
+        from .s3io import ObjectTooLargeError, S3Fetcher
+
+        if self._fetcher is None:
+            self._fetcher = S3Fetcher(self.client, max_workers=1, max_bytes=max_bytes)
+        try:
+            return self._fetcher.fetch(self.bucket, key, inspect_header=inspect_header).data
+        except ObjectTooLargeError:
+            raise ImageValidationError(413, f"Object exceeds {max_bytes} bytes")
+
+
+def open_source(uri: str) -> Union[LocalSource, S3Source]:
+    """``s3://bucket/prefix`` or a local directory."""
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3Source(bucket, prefix)
+    return LocalSource(uri)
+
+
+def plan(
+    keys: Sequence[str],
+    is_derivative_key: Callable[[str], bool],
+    derivative_key: Callable[[str], str],
+    use_derivatives: bool = False,
+) -> List[WorkItem]:
+    """One work item per original; with ``use_derivatives`` read its stored derivative where one was listed."""
+    listed = set(keys)
+    items = []
+    for key in keys:
+        if is_derivative_key(key):
+            continue
+        derivative = derivative_key(key)
+        if use_derivatives and derivative in listed:
+            items.append((key, derivative, True))
+        else:
+            items.append((key, key, False))
+    return items
+
+
+# Worker process state: one source (and its S3 client) per process
+_worker_sources: Dict[str, Union[LocalSource, S3Source]] = {}
+
+
+def load_chunk(
+    uri: str, items: Sequence[WorkItem], min_dimension: int, input_size: int, max_pixels: int, max_bytes: int
+) -> List[Tuple[WorkItem, Optional[str], Union[Image.Image, ImageValidationError]]]:
+    """Fetch and decode a chunk of work items in a worker process.
+
+    Returns (item, sha256 of the bytes read, image or error) per item, in order.
+    """
+    source = _worker_sources.get(uri)
+    if source is None:
+        source = _worker_sources[uri] = open_source(uri)
+
+    results = []
+    for item in items:
+        _, read_key, derivative = item
+        # Derivatives are stored at model resolution, below MIN_DIMENSION
+        minimum = input_size if derivative else min_dimension
+        digest = None
+        try:
+            data = source.read(
+                read_key, max_bytes, lambda head: preprocessing.probe_header(head, minimum, max_pixels)
+            )
+            digest = hashlib.sha256(data).hexdigest()
+            results.append((item, digest, preprocessing.decode_for_model(data, minimum, input_size, max_pixels)))
+        except ImageValidationError as e:
+            results.append((item, digest, e))
+        except Exception as e:
+            logger.error(f"Failed to load {read_key}: {str(e)}")
+            results.append((item, digest, ImageValidationError(400, "Failed to load image")))
+    return results
+
+
+class ResultWriter:
+    """Parquet dataset of part files plus a manifest describing the run.
+
+    Each ``flush`` writes the buffered rows as the next ``part-NNNNN.parquet``
+    (to a temporary name, then renamed, so a crash never leaves a partial
+    part). Keys in existing parts are what a resumed run skips.
+    """
+
+    def __init__(self, directory: str, manifest: Dict, frog_classes: Sequence[str]):
+        self.directory = directory
+        self.manifest = manifest
+        self.frog_classes = list(frog_classes)
+        self.rows: List[Dict] = []
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                existing = json.load(f)
+            changed = [field for field in RESUME_FIELDS if existing.get(field) != manifest.get(field)]
+            if changed:
+                raise ValueError(
+                    f"{directory} holds a run with different {', '.join(changed)}; use a new output directory"
+                )
+        else:
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+        self.parts = len(part_paths(directory))
+
+    def written_keys(self, succeeded_only: bool = False) -> Set[str]:
+        """Keys already in the dataset; with ``succeeded_only``, just those whose latest row scored."""
+        frame = load_results(self.directory, columns=["key", "status"])
+        if succeeded_only:
+            frame = frame[frame["status"] == 200]
+        return set(frame["key"])
+
+    def add(self, row: Dict) -> None:
+        self.rows.append(row)
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        scores = pa.list_(pa.float32())
+        fields = [
+            pa.field("key", pa.string()),
+            pa.field("source_key", pa.string()),
+            pa.field("sha256", pa.string()),
+            pa.field("status", pa.int16()),
+            pa.field("error", pa.string()),
+            pa.field("is_frog", pa.bool_()),
+            pa.field("confidence", pa.float32()),
+            *(pa.field(f"score_{name}", pa.float32()) for name in self.frog_classes),
+            pa.field("top_classes", pa.list_(pa.int16())),
+            pa.field("top_probs", scores),
+        ]
+        schema = pa.schema(fields, metadata={"frog_rescore": json.dumps(self.manifest)})
+        columns = {field.name: [row.get(field.name) for row in self.rows] for field in fields}
+        table = pa.table(columns, schema=schema)
+
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.parts += 1
+        self.rows = []
+
+
+def part_paths(directory: str) -> List[str]:
+    """Completed part files of a dataset, in the order they were written."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("part-") and name.endswith(".parquet")
+    )
+
+
+def load_results(directory: str, columns: Optional[List[str]] = None):
+    """Read a rescored dataset as a pandas DataFrame, one row per key (the latest written)."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    paths = part_paths(directory)
+    if not paths:
+        return pd.DataFrame(columns=columns or ["key"])
+    frame = pd.concat([pq.read_table(path, columns=columns).to_pandas() for path in paths], ignore_index=True)
+    return frame.drop_duplicates("key", keep="last").reset_index(drop=True)
+
+
+def _chunks(items: Sequence[WorkItem], size: int) -> Iterator[Sequence[WorkItem]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def rescore(
+    source: str,
+    output: str,
+    config,
+    top: int = 0,
+    workers: int = 0,
+    chunk_size: int = 8,
+    flush_rows: int = 2048,
+    use_derivatives: bool = False,
+    retry_errors: bool = False,
+    limit: Optional[int] = None,
+    vectors: Optional[str] = None,
+) -> Dict:
+    """Score every image under ``source`` into the Parquet dataset at ``output``.
+
+    ``config`` is a ``core.Config`` (sub)class naming the model, backend and
+    threshold. ``top`` limits the stored class probabilities per image (0
+    keeps all). ``vectors`` names a ``VectorStore`` directory that also
+    receives each image's top-k probabilities. Returns a summary of the run.
+    """
+    from . import core
+
+    start = time.perf_counter()
+    detector = core.FrogDetector(config)
+    model, scorer = detector.model, detector.scorer
+    names = [model.names[index] for index in range(len(model.names))]
+    manifest = {
+        "source": source,
+        "model_path": config.MODEL_PATH,
+        "backend": config.INFERENCE_BACKEND,
+        "model_version": detector.result_cache.model_version,
+        "threshold": config.FROG_THRESHOLD,
+        "classes": names,
+        "frog_classes": list(scorer.classes),
+        "top_k": top or len(names),
+    }
+    writer = ResultWriter(output, manifest, scorer.classes)
+    store = None
+    if vectors:
+        store = VectorStore(vectors, manifest["model_version"], model.names, k=config.VECTOR_TOP_K)
+
+    items = plan(
+        open_source(source).list_keys(), detector.is_derivative_key, detector.derivative_key, use_derivatives
+    )
+    if limit:
+        items = items[:limit]
+    done = writer.written_keys(succeeded_only=retry_errors)
+    todo = [item for item in items if item[0] not in done]
+    logger.info(f"{len(items)} images under {source}, {len(items) - len(todo)} already scored")
+
+    counts = {"scored": 0, "errors": 0}
+    batch: List[Tuple[WorkItem, str, Image.Image]] = []
+
+    def score_batch() -> None:
+        probs = np.asarray(model.predict_probs([image for _, _, image in batch]), dtype=np.float32)
+        is_frog, confidence = scorer.decisions(probs)
+        frog_scores = scorer.scores(probs)
+        indices, top_probs = top_k(probs, manifest["top_k"])
+        for row, ((key, read_key, _), digest, _) in enumerate(batch):
+            writer.add({
+                "key": key,
+                "source_key": read_key,
+                "sha256": digest,
+                "status": 200,
+                "is_frog": bool(is_frog[row]),
+                "confidence": float(confidence[row]),
+                **{f"score_{name}": float(score) for name, score in zip(scorer.classes, frog_scores[row])},
+                "top_classes": indices[row].tolist(),
+                "top_probs": top_probs[row].tolist(),
+            })
+        if store is not None:
+            store.add([digest for _, digest, _ in batch], probs)
+        counts["scored"] += len(batch)
+        batch.clear()
+
+    decode_args = (*detector.decode_args(), detector.max_bytes)
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(todo, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Keep the pool a couple of chunks per worker ahead of inference
+        pending = deque()
+
+        def submit_next() -> None:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(pool.submit(load_chunk, source, chunk, *decode_args))
+
+        for _ in range(2 * workers):
+            submit_next()
+        while pending:
+            loaded = pending.popleft().result()
+            submit_next()
+            for item, digest, image in loaded:
+                if isinstance(image, ImageValidationError):
+                    writer.add({
+                        "key": item[0], "source_key": item[1], "sha256": digest,
+                        "status": image.status_code, "error": image.detail,
+                    })
+                    counts["errors"] += 1
+                    continue
+                batch.append((item, digest, image))
+                if len(batch) >= config.BATCH_MAX_SIZE:
+                    score_batch()
+            if len(writer.rows) >= flush_rows:
+                writer.flush()
+                logger.info(f"{counts['scored'] + counts['errors']}/{len(todo)} images written")
+        if batch:
+            score_batch()
+    writer.flush()
+    if store is not None:
+        store.flush()
+
+    elapsed = time.perf_counter() - start
+    processed = counts["scored"] + counts["errors"]
+    return {
+        "images": len(items),
+        "skipped": len(items) - len(todo),
+        **counts,
+        "parts": writer.parts,
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(processed / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None) -> None:
+    from . import core
+
+    parser = argparse.ArgumentParser(
+        description="Re-score every image under a directory or S3 prefix into a resumable Parquet dataset."
+    )
+    parser.add_argument("--source", required=True, help="Image directory or s3://bucket/prefix")
+    parser.add_argument("--output", required=True, help="Dataset directory; rerun with the same one to resume")
+    parser.add_argument("--model", default=core.Config.MODEL_PATH)
+    parser.add_argument("--backend", default=core.Config.INFERENCE_BACKEND)
+    parser.add_argument("--quantization", default=core.Config.MODEL_QUANTIZATION)
+    parser.add_argument("--threshold", type=float, default=core.Config.FROG_THRESHOLD)
+    parser.add_argument("--top-k", type=int, default=0, help="Class probabilities kept per image (0 = all)")
+    parser.add_argument("--workers", type=int, default=0, help="Fetch/decode processes (0 = one per core)")
+    parser.add_argument("--threads", type=int, default=0, help="Inference threads (0 = runtime default)")
+    parser.add_argument("--batch-size", type=int, default=core.Config.BATCH_MAX_SIZE)
+    parser.add_argument("--flush-rows", type=int, default=2048, help="Rows per part file (checkpoint interval)")
+    parser.add_argument("--use-derivatives", action="store_true",
+                        help="Read stored model-resolution derivatives instead of originals where listed")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-score keys whose latest row is an error")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--vectors", help="Also store top-k probability vectors here (see detection_service.vectors)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    class RescoreConfig(core.Config):
+        MODEL_PATH = args.model
+        INFERENCE_BACKEND = args.backend
+        INFERENCE_THREADS = args.threads
+        MODEL_QUANTIZATION = args.quantization
+        FROG_THRESHOLD = args.threshold
+        BATCH_MAX_SIZE = args.batch_size
+        # Score with the model alone; runtime shortcuts would change the stored scores
+        CASCADE_MODEL_PATH = None
+        FALLBACK_MODEL_PATH = None
+        NEAR_DUPLICATES_ENABLED = False
+        CACHE_BACKEND_URI = None
+        # Vectors go only where --vectors says, never into the API's store
+        VECTOR_STORE_PATH = None
+
+    summary = rescore(
+        args.source, args.output, RescoreConfig, top=args.top_k, workers=args.workers,
+        flush_rows=args.flush_rows, use_derivatives=args.use_derivatives,
+        retry_errors=args.retry_errors, limit=args.limit, vectors=args.vectors,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional
+from urllib.parse import quote, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+    """Where event-mode classifications are written for the app to poll.
+
+    Records are JSON-serializable dicts keyed by the source object's bucket and key.
+    """
+
+    def get(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, bucket: str, key: str, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def owns(self, bucket: str, key: str) -> bool:
+        """True if the object is one of our own records (so it is not classified)."""
+        return False
+
+
+class S3ResultStore(ResultStore):
+    """Stores one JSON object per image under ``s3://bucket/prefix/<bucket>/<key>.json``."""
+
+    def __init__(self, client, bucket: str, prefix: str = "results/"):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def _key(self, bucket: str, key: str) -> str:
+        return f"{self.prefix}{bucket}/{key}.json"
+
+    def get(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(bucket, key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def put(self, bucket: str, key: str, record: Dict[str, Any]) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(bucket, key),
+            Body=json.dumps(record).encode(),
+            ContentType="application/json",
+        )
+
+    def owns(self, bucket: str, key: str) -> bool:
+        return bucket == self.bucket and key.startswith(self.prefix) and key.endswith(".json")
+
+
+class FileResultStore(ResultStore):
+    """Stores one JSON file per image under a directory; a local stand-in for S3."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, bucket: str, key: str) -> str:
+        # Quote the whole name so object keys can't escape the directory
+        return os.path.join(self.directory, quote(f"{bucket}/{key}", safe="") + ".json")
+
+    def get(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(bucket, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, bucket: str, key: str, record: Dict[str, Any]) -> None:
+        path = self._path(bucket, key)
+        # Write then rename so pollers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+
+def result_store_from_uri(uri: Optional[str], s3_client=None) -> Optional[ResultStore]:
+    """Build a store from ``s3://bucket/prefix`` or ``file:///directory``."""
+    if not uri:
+        return None
+    parsed = urlparse(uri)
+    if parsed.scheme == "s3":
+        if s3_client is None:
+            raise ValueError("An S3 client is required for s3:// result stores")
+        return S3ResultStore(s3_client, parsed.netloc, parsed.path.lstrip("/"))
+    if parsed.scheme == "file":
+        return FileResultStore(parsed.netloc + parsed.path)
+    raise ValueError(f"Unsupported result store URI: {uri}")
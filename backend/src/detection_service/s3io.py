@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from botocore.config import Config as BotocoreConfig
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+def client_config(max_pool_connections: int = 10) -> BotocoreConfig:
+    """Connection settings for many small concurrent GETs from a warm container.
+
+    The pool is sized to the number of fetch threads so none of them waits
+    for a connection, and keep-alive lets warm invocations reuse sockets.
+    """
+    return BotocoreConfig(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=2,
+        read_timeout=10,
+        retries={"max_attempts": 3, "mode": "adaptive"},
+    )
+
+
+def make_s3_client(max_pool_connections: int = 10, local_root: Optional[str] = None):
+    """Return a pooled boto3 S3 client, or a filesystem stand-in when ``local_root`` is set."""
+    if local_root:
+        return LocalS3Client(local_root)
+    import boto3
+
+    return boto3.client("s3", config=client_config(max_pool_connections))
+
+
+class ObjectTooLargeError(ValueError):
+    """The object is larger than the fetcher's ``max_bytes``."""
+
+
+class FetchedObject(NamedTuple):
+    data: bytes
+    # sha256 of ``data``, fed while streaming (see ResultCache.key_from_digest)
+    digest: Any
+    # Wall time spent on the request(s)
+    seconds: float = 0.0
+
+
+class S3Fetcher:
+    """Streams S3 objects with a ranged header read first.
+
+    The first GET asks for only ``header_bytes``. That response carries the
+    header for early validation and the object's total size. Invalid or
+    oversized objects are rejected without downloading the body, and small
+    objects need no second request. Larger ones stream the remainder in
+    ``chunk_size`` reads.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_workers: int = 8,
+        header_bytes: int = 128 * 1024,
+        chunk_size: int = 1024 * 1024,
+        max_bytes: Optional[int] = None,
+    ):
+        self.client = client
+        self.header_bytes = header_bytes
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-fetch")
+
+    def _get_range(self, bucket: str, key: str, byte_range: str) -> Tuple[Dict, Optional[int]]:
+        response = self.client.get_object(Bucket=bucket, Key=key, Range=byte_range)
+        match = _CONTENT_RANGE.match(response.get("ContentRange") or "")
+        total = int(match.group(3)) if match and match.group(3) != "*" else None
+        return response, total
+
+    def read_header(self, bucket: str, key: str) -> Tuple[bytes, int]:
+        """Ranged read of the first ``header_bytes``; returns them and the object size."""
+        try:
+            response, total = self._get_range(bucket, key, f"bytes=0-{self.header_bytes - 1}")
+        except ClientError as e:
+            # S3 rejects any range on an empty object
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return b"", 0
+            raise
+        body = response["Body"]
+        try:
+            if total is None:
+                # The server ignored the range and is sending the whole object
+                data = body.read()
+                return data, len(data)
+            return body.read(), total
+        finally:
+            body.close()
+
+    def fetch(
+        self, bucket: str, key: str, inspect_header: Optional[Callable[[bytes], Any]] = None
+    ) -> FetchedObject:
+        """Fetch an object, calling ``inspect_header`` (which may raise) before the body."""
+        start = time.perf_counter()
+        head, total = self.read_header(bucket, key)
+        if self.max_bytes is not None and total > self.max_bytes:
+            raise ObjectTooLargeError(
+                f"s3://{bucket}/{key} is {total} bytes (limit {self.max_bytes})"
+            )
+        if inspect_header is not None:
+            inspect_header(head)
+
+        digest = hashlib.sha256(head)
+        if total <= len(head):
+            return FetchedObject(head, digest, time.perf_counter() - start)
+
+        chunks = [head]
+        body = self.client.get_object(Bucket=bucket, Key=key, Range=f"bytes={len(head)}-")["Body"]
+        try:
+            while True:
+                chunk = body.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                chunks.append(chunk)
+        finally:
+            body.close()
+        return FetchedObject(b"".join(chunks), digest, time.perf_counter() - start)
+
+    def prefetch(
+        self,
+        objects: Sequence[Tuple[str, str]],
+        inspect_header: Optional[Callable[[bytes], Any]] = None,
+    ) -> List[Future]:
+        """Start fetching every (bucket, key) concurrently; futures are in input order."""
+        return [
+            self._pool.submit(self.fetch, bucket, key, inspect_header) for bucket, key in objects
+        ]
+
+
+class _LocalBody:
+    """File-backed stand-in for botocore's StreamingBody, limited to a byte range."""
+
+    def __init__(self, path: str, start: int, length: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        if amt is None or amt > self._remaining:
+            amt = self._remaining
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class LocalS3Client:
+    """Filesystem-backed subset of the S3 client API (``root/<bucket>/<key>``).
+
+    Used by the tests and to benchmark fetching offline; ``latency_ms`` adds
+    a fixed delay per request to mimic network round trips.
+    """
+
+    def __init__(self, root: str, latency_ms: float = 0.0):
+        self.root = root
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ClientError({"Error": {"Code": "InvalidArgument"}}, "GetObject")
+        return path
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None) -> Dict:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        size = os.path.getsize(path)
+        if Range is None:
+            return {"Body": _LocalBody(path, 0, size), "ContentLength": size}
+
+        start, _, end = Range[len("bytes="):].partition("-")
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size:
+            raise ClientError({"Error": {"Code": "InvalidRange"}}, "GetObject")
+        return {
+            "Body": _LocalBody(path, start, end - start + 1),
+            "ContentLength": end - start + 1,
+            "ContentRange": f"bytes {start}-{end}/{size}",
+        }
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> Dict:
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body)
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure S3Fetcher throughput against a local directory of objects."
+    )
+    parser.add_argument("--root", required=True, help="Directory laid out as <bucket>/<key>")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated per-request latency")
+    args = parser.parse_args()
+
+    bucket_dir = os.path.join(args.root, args.bucket)
+    keys = sorted(
+        os.path.relpath(os.path.join(directory, name), bucket_dir)
+        for directory, _, names in os.walk(bucket_dir)
+        for name in names
+    )
+    client = LocalS3Client(args.root, latency_ms=args.latency_ms)
+    fetcher = S3Fetcher(client, max_workers=args.workers)
+
+    start = time.perf_counter()
+    total_bytes = sum(
+        len(future.result().data) for future in fetcher.prefetch([(args.bucket, key) for key in keys])
+    )
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "objects": len(keys),
+        "workers": args.workers,
+        "requests": client.requests,
+        "seconds": round(elapsed, 3),
+        "objects_per_second": round(len(keys) / elapsed, 1) if elapsed else None,
+        "mb_per_second": round(total_bytes / elapsed / 1e6, 1) if elapsed else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+
+class FrogScorer:
+    """Turns class probabilities into frog scores and decisions.
+
+    Frog class indices are looked up once, when the scorer is built for a
+    model, so scoring a batch is a single column gather over its (N,
+    num_classes) probability matrix rather than a name search per image.
+    Shared by the API and the Lambda so both produce identical responses.
+    """
+
+    def __init__(self, names: Mapping[int, str], frog_classes: Iterable[str], threshold: float):
+        lookup = {name.lower(): index for index, name in names.items() if isinstance(name, str)}
+        self.classes: Tuple[str, ...] = tuple(sorted(frog_classes))
+        missing = [name for name in self.classes if name.lower() not in lookup]
+        if missing:
+            raise ValueError(f"Model has no class named {', '.join(missing)}")
+        self.indices = np.array([lookup[name.lower()] for name in self.classes], dtype=np.intp)
+        self.threshold = threshold
+
+    def scores(self, probs: np.ndarray) -> np.ndarray:
+        """(N, num_frog_classes) float64 scores for an (N, num_classes) or single-row ``probs``."""
+        probs = np.asarray(probs)
+        return probs[..., self.indices].astype(np.float64).reshape(-1, len(self.indices))
+
+    def decisions(self, probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-row is_frog flags and summed frog confidence."""
+        confidence = self.scores(probs).sum(axis=1)
+        return confidence >= self.threshold, confidence
+
+    def confidences(self, probs: np.ndarray) -> Dict[str, float]:
+        """Frog class scores for one image's probability vector."""
+        return dict(zip(self.classes, self.scores(probs)[0].tolist()))
+
+    def decide(self, probs: np.ndarray) -> List[Dict[str, Any]]:
+        """Response payloads ({"is_frog", "confidence", "details"}) for each row of ``probs``."""
+        scores = self.scores(probs)
+        confidence = scores.sum(axis=1)
+        is_frog = confidence >= self.threshold
+        return [
+            {
+                "is_frog": bool(flag),
+                "confidence": round(total, 4),
+                "details": {name: round(score, 4) for name, score in zip(self.classes, row)},
+            }
+            for flag, total, row in zip(is_frog.tolist(), confidence.tolist(), scores.tolist())
+        ]
@@ -0,0 +1,163 @@
+"""Pre-fork multi-worker server for the FastAPI app.
+
+``uvicorn --workers N`` starts N fresh interpreters, each importing
+``main`` and loading its own copy of the model. Here the model is loaded
+and warmed up once, its weights are moved to shared memory and the heap
+is frozen, and only then are the workers forked. Every worker maps the
+same weight pages instead of holding a private copy, so adding a worker
+costs its private heap rather than another model.
+
+Run from ``backend/``::
+
+    python -m detection_service.serve --workers 4 --port 8000
+
+Each worker gets ``cpu_count // workers`` inference threads (and as many
+decode processes) unless ``--threads`` or the ``INFERENCE_THREADS`` and
+``PREPROCESS_WORKERS`` environment variables say otherwise, so the
+workers don't oversubscribe the cores between them.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Wait before replacing a worker that exited, so a crash loop doesn't spin
+RESTART_DELAY_SECONDS = 1.0
+
+
+def threads_per_worker(workers: int, cpus: Optional[int] = None) -> int:
+    """Split the cores evenly between workers, at least one thread each."""
+    return max(1, (cpus or os.cpu_count() or 1) // workers)
+
+
+def configure_threads(threads: int) -> None:
+    """Pin per-worker thread counts; must run before the model and torch are imported."""
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "INFERENCE_THREADS", "PREPROCESS_WORKERS"):
+        os.environ.setdefault(name, str(threads))
+
+
+def load_app():
+    """Import the app, load and warm up the model, and freeze it for sharing."""
+    # Objects allocated from here on are never collected in the parent, and
+    # gc.freeze() moves them out of the collector so that collections in the
+    # workers don't write to (and so copy) the shared pages
+    gc.disable()
+    from . import main
+
+    main.model.warmup()
+    main.model.share_memory()
+    gc.freeze()
+    return main
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Listening socket created in the parent and inherited by every worker."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(main, sock: socket.socket, threads: int, log_level: str) -> None:
+    """Body of a forked worker: reset per-process state, then serve until signalled."""
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if "torch" in sys.modules:
+        # The intra-op pool is rebuilt after fork; pin its size again
+        sys.modules["torch"].set_num_threads(threads)
+    main.after_fork()
+    gc.enable()
+
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Forks the workers, replaces any that exit, and stops them all on SIGINT/SIGTERM."""
+
+    def __init__(self, main, sock: socket.socket, workers: int, threads: int, log_level: str):
+        self.main = main
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}  # pid -> worker slot
+        self.stopping = False
+
+    def spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.main, self.sock, self.threads, self.log_level)
+            except BaseException:
+                logger.exception(f"Worker {slot} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        logger.info(f"Started worker {slot} (pid {pid})")
+
+    def stop(self, signum=None, frame=None) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        while self.children:
+            try:
+                pid, wait_status = os.wait()
+            except ChildProcessError:
+                break
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            logger.warning(f"Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(wait_status)}; restarting")
+            time.sleep(RESTART_DELAY_SECONDS)
+            if not self.stopping:
+                self.spawn(slot)
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the frog classifier from pre-forked workers sharing one copy of the model."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, help="Inference threads per worker (default: cores / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    threads = args.threads or threads_per_worker(args.workers)
+    configure_threads(threads)
+    sock = bind_socket(args.host, args.port)
+    app_module = load_app()
+    logger.info(f"Model loaded; forking {args.workers} workers with {threads} threads each")
+    Supervisor(app_module, sock, args.workers, threads, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
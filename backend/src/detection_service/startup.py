@@ -0,0 +1,43 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Modules that should never load on the slim inference path
+HEAVY_MODULES = ("torch", "ultralytics", "matplotlib", "pandas", "scipy", "seaborn", "cv2")
+
+
+class StartupProfiler:
+    """Records how long each cold-start stage (imports, model load, warm-up) takes.
+
+    Only depends on the standard library so it can be created before any
+    expensive import.
+    """
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> Dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.created_at) * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+            "modules_loaded": len(sys.modules),
+        }
+
+    def emit(self, logger: logging.Logger) -> Dict:
+        """Log the report as one JSON line so it can be filtered in CloudWatch."""
+        report = self.report()
+        logger.info(f"Startup profile: {json.dumps(report)}")
+        return report
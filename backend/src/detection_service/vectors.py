@@ -0,0 +1,276 @@
+"""Compact per-image probability vectors, for re-deciding without inference.
+
+A ``VectorStore`` keeps each classified image's top-k class probabilities
+(float16, with uint16 class indices) under the sha256 of its bytes, and
+``redecide`` recomputes ``is_frog`` for every stored image under a new
+threshold or class policy in a few NumPy gathers; classes outside an
+image's top k count as zero. ``python -m detection_service.vectors --store
+DIR --threshold 0.4`` reports which decisions a change would flip.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .scoring import FrogScorer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+DIGEST_DTYPE = np.dtype("V32")  # Raw sha256
+
+
+def top_k(probs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and probabilities of each row's ``k`` most likely classes, most likely first."""
+    k = min(k, probs.shape[1])
+    if k < probs.shape[1]:
+        candidates = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(probs.shape[1]), probs.shape)
+    order = np.argsort(-np.take_along_axis(probs, candidates, axis=1), axis=1, kind="stable")
+    indices = np.take_along_axis(candidates, order, axis=1)
+    return indices, np.take_along_axis(probs, indices, axis=1)
+
+
+class TopKVectors(NamedTuple):
+    """Stored vectors: row i is image ``digests[i]``'s top-k ``classes`` and their ``probs``."""
+    digests: np.ndarray  # (N,) V32
+    classes: np.ndarray  # (N, k) uint16
+    probs: np.ndarray  # (N, k) float16
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def hex_digests(self) -> List[str]:
+        return [digest.tobytes().hex() for digest in self.digests]
+
+
+def _segment_paths(directory: str) -> List[str]:
+    # Names start with a nanosecond timestamp, so sorting gives write order
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("segment-") and name.endswith(".npz")
+    )
+
+
+def load_vectors(directory: str) -> Tuple[Dict, TopKVectors]:
+    """Manifest and every stored vector, one per digest (the latest written)."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    k = manifest["top_k"]
+    digests, classes, probs = [np.empty(0, DIGEST_DTYPE)], [np.empty((0, k), np.uint16)], [np.empty((0, k), np.float16)]
+    for path in _segment_paths(directory):
+        with np.load(path) as segment:
+            digests.append(segment["digests"])
+            classes.append(segment["classes"])
+            probs.append(segment["probs"])
+    vectors = TopKVectors(np.concatenate(digests), np.concatenate(classes), np.concatenate(probs))
+
+    # np.unique keeps the first occurrence, so search newest-first
+    _, latest = np.unique(vectors.digests[::-1], return_index=True)
+    if len(latest) < len(vectors):
+        keep = np.sort(len(vectors) - 1 - latest)
+        vectors = TopKVectors(vectors.digests[keep], vectors.classes[keep], vectors.probs[keep])
+    return manifest, vectors
+
+
+class VectorStore:
+    """Append-only directory of vector segments for one model.
+
+    ``add`` buffers rows and every ``flush_rows`` hands them to a background
+    writer thread, which saves them as a new ``segment-<ns>-<pid>-<n>.npz``
+    (to a temporary name, then renamed), so several processes can share a
+    directory; ``flush`` writes the rest and waits for the writer. If the
+    directory already holds vectors from a different model version, class
+    list or k, a warning is logged and this store uses its own
+    ``store-<hash>`` subdirectory instead.
+    """
+
+    def __init__(self, directory: str, model_version: str, names: Mapping[int, str], k: int = 10,
+                 flush_rows: int = 1024):
+        self.directory = directory
+        self.classes = [names[index] for index in range(len(names))]
+        self.k = min(k, len(self.classes))
+        self.flush_rows = flush_rows
+        self.manifest = {"model_version": model_version, "classes": self.classes, "top_k": self.k}
+        self._digests: List[bytes] = []
+        self._classes: List[np.ndarray] = []
+        self._probs: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self._segments = 0
+        self._unwritten = 0
+        self._writes: "queue.Queue[Tuple[str, Tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.written = 0
+
+        existing = self._read_manifest()
+        changed = [field for field in self.manifest if existing and existing.get(field) != self.manifest[field]]
+        if changed:
+            # A redeploy can change the model fingerprint (it includes the
+            # file's mtime); keep serving and start a segment directory of its own
+            key = hashlib.sha256(json.dumps(self.manifest, sort_keys=True).encode()).hexdigest()[:16]
+            self.directory = os.path.join(directory, f"store-{key}")
+            logger.warning(
+                f"{directory} holds vectors with different {', '.join(changed)}; writing to {self.directory}"
+            )
+            existing = self._read_manifest()
+        if existing is None:
+            manifest_path = os.path.join(self.directory, MANIFEST)
+            with open(manifest_path + ".tmp", "w") as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _read_manifest(self) -> Optional[Dict]:
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    @property
+    def pending(self) -> int:
+        """Rows added but not yet on disk, buffered or queued for the writer."""
+        return self._unwritten
+
+    def add(self, digests: Sequence[Optional[str]], probs: np.ndarray) -> None:
+        """Buffer the top-k of each ``probs`` row under its hex sha256; rows without a digest are skipped."""
+        rows = [row for row, digest in enumerate(digests) if digest is not None]
+        if not rows:
+            return
+        indices, values = top_k(np.asarray(probs, dtype=np.float32)[rows], self.k)
+        with self._lock:
+            self._digests.extend(bytes.fromhex(digests[row]) for row in rows)
+            self._classes.append(indices.astype(np.uint16))
+            self._probs.append(values.astype(np.float16))
+            self._unwritten += len(rows)
+            segment = self._swap() if len(self._digests) >= self.flush_rows else None
+            if segment is not None and (self._writer is None or not self._writer.is_alive()):
+                # Started on first use, and again in a forked child
+                self._writer = threading.Thread(target=self._write_queued, name="vector-writer", daemon=True)
+                self._writer.start()
+        if segment is not None:
+            # add() runs on the batch scheduler thread, so it never waits on the disk
+            self._writes.put(segment)
+
+    def flush(self) -> None:
+        """Write the buffer and wait until every queued segment is on disk."""
+        with self._lock:
+            segment = self._swap()
+        if segment is not None:
+            self._write(*segment)
+        self._writes.join()
+
+    def _swap(self) -> Optional[Tuple[str, Tuple]]:
+        # Called with the lock held; the segment is written without it.
+        # Named here, so segment order matches buffer order
+        if not self._digests:
+            return None
+        pending = self._digests, self._classes, self._probs
+        self._digests, self._classes, self._probs = [], [], []
+        self._segments += 1
+        return f"segment-{time.time_ns():020d}-{os.getpid()}-{self._segments}.npz", pending
+
+    def _write(self, name: str, pending: Tuple) -> None:
+        digests = np.frombuffer(b"".join(pending[0]), dtype=DIGEST_DTYPE)
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, digests=digests, classes=np.concatenate(pending[1]), probs=np.concatenate(pending[2]))
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self.written += len(digests)
+            self._unwritten -= len(digests)
+
+    def _write_queued(self) -> None:
+        while True:
+            name, pending = self._writes.get()
+            try:
+                self._write(name, pending)
+            except Exception:
+                logger.exception(f"Failed to write vector segment {name}")
+            finally:
+                self._writes.task_done()
+
+    def load(self) -> TopKVectors:
+        """Every vector written so far (after flushing the buffer)."""
+        self.flush()
+        return load_vectors(self.directory)[1]
+
+    def metrics(self) -> Dict:
+        return {"top_k": self.k, "written": self.written, "pending": self.pending}
+
+
+def class_weights(names: Sequence[str], classes: Iterable[str]) -> np.ndarray:
+    """1.0 at each named class's index, 0.0 elsewhere; raises ValueError for unknown names."""
+    weights = np.zeros(len(names), dtype=np.float32)
+    weights[FrogScorer(dict(enumerate(names)), classes, 0.0).indices] = 1.0
+    return weights
+
+
+def redecide(
+    vectors: TopKVectors,
+    names: Sequence[str],
+    frog_classes: Iterable[str],
+    threshold: float,
+    lookalikes: Iterable[str] = (),
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Recompute (is_frog, confidence) for every stored vector under a new policy.
+
+    Confidence is the summed probability of ``frog_classes``, as in
+    ``FrogScorer``; an image is a frog when it reaches ``threshold`` and,
+    if ``lookalikes`` are given, outweighs their summed probability.
+    """
+    probs = vectors.probs.astype(np.float32)
+    confidence = (class_weights(names, frog_classes)[vectors.classes] * probs).sum(axis=1)
+    is_frog = confidence >= threshold
+    lookalikes = list(lookalikes)
+    if lookalikes:
+        lookalike = (class_weights(names, lookalikes)[vectors.classes] * probs).sum(axis=1)
+        is_frog &= confidence > lookalike
+    return is_frog, confidence
+
+
+def main(argv=None) -> None:
+    from . import core
+
+    parser = argparse.ArgumentParser(
+        description="Re-decide every image in a vector store under a new threshold or class policy."
+    )
+    parser.add_argument("--store", required=True, help="Vector store directory")
+    parser.add_argument("--threshold", type=float, default=core.Config.FROG_THRESHOLD)
+    parser.add_argument("--frog-classes", nargs="+", default=sorted(core.Config.FROG_CLASSES))
+    parser.add_argument("--lookalikes", nargs="*", default=[], help="Classes that veto a frog decision they outweigh")
+    parser.add_argument("--show-changed", type=int, default=10, help="Digests to list whose decision flips")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    start = time.perf_counter()
+    manifest, vectors = load_vectors(args.store)
+    loaded = time.perf_counter()
+    baseline, _ = redecide(vectors, manifest["classes"], core.Config.FROG_CLASSES, core.Config.FROG_THRESHOLD)
+    is_frog, _ = redecide(vectors, manifest["classes"], args.frog_classes, args.threshold, args.lookalikes)
+    decided = time.perf_counter()
+
+    changed = np.flatnonzero(is_frog != baseline)
+    print(json.dumps({
+        "records": len(vectors),
+        "model_version": manifest["model_version"],
+        "top_k": manifest["top_k"],
+        "frogs": int(is_frog.sum()),
+        "frogs_at_current_policy": int(baseline.sum()),
+        "changed": int(changed.size),
+        "changed_digests": [vectors.digests[i].tobytes().hex() for i in changed[:args.show_changed]],
+        "load_seconds": round(loaded - start, 3),
+        "redecide_seconds": round(decided - loaded, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import shutil
+
+import pytest
+
+from detection_service.main import Config
+
+
+@pytest.fixture(scope="session")
+def onnx_model_path(tmp_path_factory):
+    """Export a copy of the configured model to ONNX in a temporary directory."""
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from detection_service.export import export_model
+
+    model_path = tmp_path_factory.mktemp("export") / "model.pt"
+    shutil.copy(Config.MODEL_PATH, model_path)
+    return export_model(str(model_path), "onnx")
@@ -0,0 +1,129 @@
+import numpy as np
+from PIL import Image
+import pytest
+
+from detection_service.backends import BatchBuffer, TorchBackend, Prediction, artifact_path, load_backend, preprocess
+from detection_service.main import Config, detector
+
+
+def random_images():
+    rng = np.random.default_rng(0)
+    sizes = [(224, 224), (320, 480), (600, 330), (1000, 750)]
+    images = [Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8)) for w, h in sizes]
+    images.append(Image.new("L", (400, 400), 90))
+    return images
+
+
+@pytest.fixture(scope="module")
+def torch_backend():
+    return TorchBackend(Config.MODEL_PATH)
+
+
+@pytest.mark.parametrize("size", [(224, 224), (300, 500), (500, 300), (1001, 333)])
+def test_preprocess_matches_ultralytics_transforms(size):
+    """Backend-neutral preprocessing reproduces the torch predictor input."""
+    from ultralytics.data.augment import classify_transforms
+
+    rng = np.random.default_rng(1)
+    image = Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+    expected = classify_transforms(224)(image).numpy()
+
+    actual = preprocess(image, 224)
+    assert actual.shape == (3, 224, 224)
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+def test_batch_buffer_is_reused_and_matches_preprocess():
+    """Filling the preallocated buffer gives the same tensor as stacking per-image arrays."""
+    images = random_images()
+    buffer = BatchBuffer(224)
+    expected = np.stack([preprocess(image, 224) for image in images])
+
+    batch = buffer.fill(images)
+    assert batch.shape == (len(images), 3, 224, 224) and batch.dtype == np.float32
+    np.testing.assert_array_equal(batch, expected)
+
+    smaller = buffer.fill(images[:2])
+    assert np.shares_memory(smaller, batch)
+    np.testing.assert_array_equal(smaller, expected[:2])
+
+def test_torch_backend_matches_ultralytics_predictor(torch_backend):
+    """Calling the network on the buffer scores like the ultralytics predictor."""
+    from ultralytics import YOLO
+
+    images = random_images()
+    reference = YOLO(Config.MODEL_PATH)(images, verbose=False)
+    actual = torch_backend(images)
+
+    for expected, prediction in zip(reference, actual):
+        expected_probs = expected.probs.data.float().cpu().numpy()
+        np.testing.assert_allclose(prediction.probs, expected_probs, atol=1e-5)
+        assert detector.confidences(prediction) == pytest.approx(
+            detector.scorer.confidences(expected_probs), abs=1e-5
+        )
+
+def test_backend_call_returns_predictions(torch_backend):
+    """Backends accept a single image or a list and return one Prediction each."""
+    images = random_images()
+    single = torch_backend(images[0])
+    batch = torch_backend(images)
+
+    assert len(single) == 1 and len(batch) == len(images)
+    assert all(isinstance(p, Prediction) for p in batch)
+    assert batch[0].probs.shape == (len(torch_backend.names),)
+    np.testing.assert_allclose(batch[0].probs.sum(), 1.0, atol=1e-3)
+    np.testing.assert_allclose(single[0].probs, batch[0].probs, atol=1e-5)
+
+def test_artifact_paths():
+    assert artifact_path("torch", "models/yolo11l-cls.pt") == "models/yolo11l-cls.pt"
+    assert artifact_path("onnx", "models/yolo11l-cls.pt") == "models/yolo11l-cls.onnx"
+    assert artifact_path("openvino", "models/yolo11l-cls.pt") == "models/yolo11l-cls_openvino_model"
+    assert artifact_path("onnx", "models/yolo11l-cls.pt", "static") == "models/yolo11l-cls.int8-static.onnx"
+    with pytest.raises(ValueError):
+        artifact_path("torch", "models/yolo11l-cls.pt", "dynamic")
+    with pytest.raises(ValueError):
+        artifact_path("onnx", "models/yolo11l-cls.pt", "int4")
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        load_backend("tensorrt", Config.MODEL_PATH)
+
+def test_onnx_backend_matches_torch(torch_backend, onnx_model_path):
+    """ONNX Runtime scores agree with the PyTorch backend within tolerance."""
+    onnx_backend = load_backend("onnx", onnx_model_path.replace(".onnx", ".pt"), threads=1)
+    assert onnx_backend.names == torch_backend.names
+    assert onnx_backend.input_size == torch_backend.input_size
+
+    images = random_images()
+    torch_results = torch_backend(images)
+    onnx_results = onnx_backend(images)
+
+    for expected, actual in zip(torch_results, onnx_results):
+        np.testing.assert_allclose(actual.probs, expected.probs, atol=1e-3)
+        expected_scores = detector.confidences(expected)
+        actual_scores = detector.confidences(actual)
+        assert actual_scores.keys() == expected_scores.keys()
+        for name in expected_scores:
+            assert actual_scores[name] == pytest.approx(expected_scores[name], abs=1e-3)
+
+def test_prepared_artifact_is_memory_mapped(onnx_model_path):
+    """The ready-to-run artifact loads via mmap and scores like the plain export."""
+    from detection_service.backends import prepared_artifact_dir
+    from detection_service.export import prepare_runtime_artifact
+
+    source = onnx_model_path.replace(".onnx", ".pt")
+    prepare_runtime_artifact(onnx_model_path, "extended")
+
+    plain = load_backend("onnx", source)
+    prepared = load_backend("onnx", source, prepared=True)
+    assert prepared.model_path == prepared_artifact_dir(onnx_model_path)
+    assert prepared.names == plain.names
+
+    with open("/proc/self/maps") as f:
+        assert any(prepared.model_path in line for line in f)
+
+    images = random_images()
+    for expected, actual in zip(plain(images), prepared(images)):
+        np.testing.assert_allclose(actual.probs, expected.probs, atol=1e-4)
+
+    prepared.warmup()
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+import pytest
+
+from detection_service.batching import BatchScheduler
+from detection_service.executors import SaturatedError
+
+
+def echo_batches(calls):
+    """Predict function that records each batch and doubles every item."""
+    def predict(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+    return predict
+
+
+def test_single_item_round_trip():
+    """A lone request is flushed after the wait window."""
+    calls = []
+    scheduler = BatchScheduler(echo_batches(calls), max_batch_size=4, max_wait_ms=5)
+    assert scheduler.submit(21).result(timeout=2) == 42
+    assert calls == [[21]]
+
+def test_concurrent_requests_are_coalesced():
+    """Concurrent submissions share forward passes and get their own results back."""
+    calls = []
+    release = threading.Event()
+
+    def predict(items):
+        release.wait(timeout=2)
+        return echo_batches(calls)(items)
+
+    scheduler = BatchScheduler(predict, max_batch_size=8, max_wait_ms=50)
+    futures = [scheduler.submit(i) for i in range(8)]
+    release.set()
+
+    assert [f.result(timeout=2) for f in futures] == [i * 2 for i in range(8)]
+    assert len(calls) == 1
+    assert calls[0] == list(range(8))
+
+def test_batches_respect_max_size():
+    """No batch exceeds the configured maximum."""
+    calls = []
+    scheduler = BatchScheduler(echo_batches(calls), max_batch_size=3, max_wait_ms=20)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(lambda i: scheduler.submit(i).result(timeout=2), range(10)))
+
+    assert results == [i * 2 for i in range(10)]
+    assert all(len(batch) <= 3 for batch in calls)
+    assert sum(len(batch) for batch in calls) == 10
+
+def test_errors_propagate_to_every_waiter():
+    """A failing forward pass fails each request in the batch."""
+    def predict(items):
+        raise RuntimeError("boom")
+
+    scheduler = BatchScheduler(predict, max_batch_size=4, max_wait_ms=20)
+    futures = [scheduler.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="boom"):
+            future.result(timeout=2)
+
+    # Scheduler keeps serving after a failure
+    scheduler.predict_fn = echo_batches([])
+    assert scheduler.submit(1).result(timeout=2) == 2
+
+def test_cancelled_waiters_do_not_stop_the_scheduler():
+    """A waiter that times out cancels its future; later requests are still served."""
+    release = threading.Event()
+    calls = []
+
+    def predict(items):
+        release.wait(timeout=2)
+        return echo_batches(calls)(items)
+
+    scheduler = BatchScheduler(predict, max_batch_size=1, max_wait_ms=0)
+
+    async def time_out(future):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.wrap_future(future), 0.01)
+
+    running = scheduler.submit(1)
+    time.sleep(0.05)  # let the worker pick it up and block
+    queued = scheduler.submit(2)
+    asyncio.run(time_out(running))
+    asyncio.run(time_out(queued))
+    assert queued.cancelled() and not running.cancelled()
+
+    release.set()
+    assert running.result(timeout=2) == 2
+    assert scheduler.submit(3).result(timeout=2) == 6
+    # The cancelled request never reached the model
+    assert calls == [[1], [3]]
+
+def test_result_count_mismatch_is_an_error():
+    """Dropping results must not leave requests hanging."""
+    scheduler = BatchScheduler(lambda items: items[:-1], max_batch_size=4, max_wait_ms=20)
+    futures = [scheduler.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=2)
+
+def test_metrics_report_histogram_and_wait_times():
+    """Metrics expose queue depth, batch-size histogram and wait percentiles."""
+    scheduler = BatchScheduler(echo_batches([]), max_batch_size=2, max_wait_ms=5)
+    for i in range(3):
+        scheduler.submit(i).result(timeout=2)
+    time.sleep(0.01)
+
+    metrics = scheduler.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["total_items"] == 3
+    assert sum(size * count for size, count in metrics["batch_size_histogram"].items()) == 3
+    assert set(metrics["wait_ms"]) == {"p50", "p99", "max"}
+    assert metrics["wait_ms"]["max"] >= metrics["wait_ms"]["p50"] >= 0
+
+def test_invalid_batch_size():
+    with pytest.raises(ValueError):
+        BatchScheduler(echo_batches([]), max_batch_size=0)
+
+def test_bounded_queue_rejects_whole_submission():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait()
+        return items
+
+    scheduler = BatchScheduler(blocked, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+    first = scheduler.submit("a")
+    time.sleep(0.05)  # let the worker pick it up and block
+    queued = scheduler.submit_many(["b", "c"])
+    with pytest.raises(SaturatedError):
+        scheduler.submit_many(["d"])
+    assert scheduler.metrics()["rejected_submissions"] == 1
+    assert scheduler.queue_depth == 2
+
+    release.set()
+    assert first.result(timeout=1) == "a"
+    assert [future.result(timeout=1) for future in queued] == ["b", "c"]
@@ -0,0 +1,41 @@
+import io
+
+from PIL import Image
+import pytest
+
+from benchmarks.compare import compare
+from benchmarks.corpus import build_corpus, unique_variant
+from benchmarks.harness import summarize
+
+
+def test_summarize_percentiles_and_throughput():
+    stats = summarize([0.010, 0.020, 0.030, 0.040], items_per_sample=2)
+    assert stats["samples"] == 4
+    assert stats["min_ms"] == 10.0 and stats["max_ms"] == 40.0
+    assert stats["p50_ms"] == 30.0
+    assert stats["throughput_per_s"] == pytest.approx(8 / 0.1)
+    assert summarize([0.5, 0.5], wall_seconds=0.5)["throughput_per_s"] == 4.0
+
+def test_corpus_is_deterministic_and_variants_decode_identically():
+    first = build_corpus(["small"], ["JPEG", "PNG", "WEBP"], seed=3)
+    second = build_corpus(["small"], ["JPEG", "PNG", "WEBP"], seed=3)
+    assert [item.data for item in first] == [item.data for item in second]
+
+    for item in first:
+        variant = unique_variant(item.data, 7)
+        assert variant != item.data
+        original = Image.open(io.BytesIO(item.data))
+        decoded = Image.open(io.BytesIO(variant))
+        assert decoded.size == item.size
+        assert decoded.tobytes() == original.tobytes()
+
+def test_compare_flags_regressions_by_direction():
+    def run(p50, throughput):
+        return {"results": [
+            {"suite": "inference", "name": "torch-batch1", "stats": {"p50_ms": p50, "throughput_per_s": throughput}},
+        ]}
+
+    rows = compare(run(10.0, 100.0), run(12.0, 80.0), metric="p50_ms", threshold=0.1)
+    assert rows[0]["change"] == pytest.approx(0.2) and rows[0]["regression"]
+    assert compare(run(10.0, 100.0), run(9.0, 120.0), metric="throughput_per_s")[0]["regression"] is False
+    assert compare(run(10.0, 100.0), run(10.0, 80.0), metric="throughput_per_s")[0]["regression"] is True
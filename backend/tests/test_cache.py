@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from detection_service.cache import (
+    FileCacheBackend,
+    LRUCache,
+    ResultCache,
+    SQLiteCacheBackend,
+    backend_from_uri,
+    content_key,
+)
+
+RESULT = {"is_frog": True, "confidence": 0.9, "details": {"bullfrog": 0.9, "tailed_frog": 0.0, "tree_frog": 0.0}}
+
+
+def test_content_key_depends_on_bytes_model_and_threshold():
+    base = content_key(b"image", "model-a", 0.5)
+    assert base == content_key(b"image", "model-a", 0.5)
+    assert base != content_key(b"image2", "model-a", 0.5)
+    assert base != content_key(b"image", "model-b", 0.5)
+    assert base != content_key(b"image", "model-a", 0.6)
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+    assert cache.evictions == 1
+
+def test_lru_ttl_expiry():
+    cache = LRUCache(max_entries=2, ttl_seconds=0.01)
+    cache.set("a", {"v": 1})
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+@pytest.mark.parametrize("make_backend", [
+    lambda tmp_path: SQLiteCacheBackend(str(tmp_path / "cache.db")),
+    lambda tmp_path: FileCacheBackend(str(tmp_path / "cache")),
+])
+def test_shared_backends_round_trip(tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+    assert backend.get("missing") is None
+    backend.set("abc123", RESULT)
+    assert backend.get("abc123") == RESULT
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCacheBackend(path).set("k", RESULT)
+    assert SQLiteCacheBackend(path).get("k") == RESULT
+
+def test_backend_from_uri(tmp_path):
+    assert backend_from_uri(None) is None
+    assert isinstance(backend_from_uri(f"sqlite://{tmp_path}/c.db"), SQLiteCacheBackend)
+    assert isinstance(backend_from_uri(f"file://{tmp_path}/dir"), FileCacheBackend)
+    with pytest.raises(ValueError):
+        backend_from_uri("redis://localhost")
+
+def test_result_cache_tiers_and_counters(tmp_path):
+    shared = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    writer = ResultCache("model", 0.5, shared=shared)
+    reader = ResultCache("model", 0.5, shared=shared)
+
+    key = writer.key_for(b"image bytes")
+    assert writer.get(key) is None
+    writer.set(key, RESULT)
+    assert writer.get(key) == RESULT
+
+    # A second process sees the entry via the shared tier, then locally
+    assert reader.get(key) == RESULT
+    assert reader.get(key) == RESULT
+
+    assert writer.metrics()["misses"] == 1
+    assert writer.metrics()["local_hits"] == 1
+    assert reader.metrics()["shared_hits"] == 1
+    assert reader.metrics()["local_hits"] == 1
+    assert reader.metrics()["hit_rate"] == 1.0
+
+def test_shared_tier_failures_degrade_to_miss():
+    class BrokenBackend:
+        def get(self, key):
+            raise OSError("unavailable")
+
+        def set(self, key, value):
+            raise OSError("unavailable")
+
+    cache = ResultCache("model", 0.5, shared=BrokenBackend())
+    cache.set("k", RESULT)
+    assert cache.get("other") is None
+    assert cache.metrics()["shared_errors"] == 2
@@ -0,0 +1,82 @@
+import numpy as np
+from PIL import Image
+import pytest
+
+from detection_service.backends import InferenceBackend
+from detection_service.cascade import CascadeBackend, evaluate, parse_band
+from detection_service.scoring import FrogScorer
+
+NAMES = {0: "bullfrog", 1: "tree_frog", 2: "tailed_frog", 3: "tench"}
+FROG_CLASSES = frozenset(["bullfrog", "tailed_frog", "tree_frog"])
+
+
+class TableBackend(InferenceBackend):
+    """Looks up probabilities by the red channel of each (solid colour) image."""
+
+    def __init__(self, name, table, names=NAMES):
+        super().__init__(name)
+        self.names = names
+        self.table = table
+        self.calls = []
+
+    def predict_probs(self, images):
+        keys = [image.getpixel((0, 0))[0] for image in images]
+        self.calls.append(keys)
+        return np.array([self.table[key] for key in keys], dtype=np.float32)
+
+
+def frog_probs(confidence):
+    return [confidence, 0.0, 0.0, 1.0 - confidence]
+
+
+def images(*keys):
+    return [Image.new("RGB", (8, 8), (key, 0, 0)) for key in keys]
+
+
+def make_cascade(low=0.2, high=0.8):
+    small = TableBackend("small.pt", {0: frog_probs(0.05), 1: frog_probs(0.5), 2: frog_probs(0.95), 3: frog_probs(0.7)})
+    large = TableBackend("large.pt", {1: frog_probs(0.9), 3: frog_probs(0.3)})
+    scorer = FrogScorer(NAMES, FROG_CLASSES, 0.5)
+    return CascadeBackend(small, large, scorer, low, high), small, large
+
+
+def test_only_uncertain_images_reach_the_large_model():
+    cascade, small, large = make_cascade()
+    probs = cascade.predict_probs(images(0, 1, 2, 3))
+
+    assert small.calls == [[0, 1, 2, 3]]
+    assert large.calls == [[1, 3]]
+    np.testing.assert_allclose(probs[:, 0], [0.05, 0.9, 0.95, 0.3])
+
+    stats = cascade.metrics()
+    assert stats["images"] == 4 and stats["escalated"] == 2
+    assert stats["escalation_rate"] == 0.5
+    assert stats["band"] == [0.2, 0.8]
+
+def test_confident_batches_skip_the_large_model():
+    cascade, _, large = make_cascade()
+    cascade.predict_probs(images(0, 2))
+    assert large.calls == []
+    assert cascade.stats.snapshot()["large_ms_per_escalation"] == 0.0
+
+def test_band_and_class_names_are_validated():
+    with pytest.raises(ValueError, match="threshold"):
+        make_cascade(low=0.6, high=0.9)
+    small = TableBackend("small.pt", {}, names={0: "bullfrog"})
+    with pytest.raises(ValueError, match="class names"):
+        CascadeBackend(small, TableBackend("large.pt", {}), FrogScorer(NAMES, FROG_CLASSES, 0.5), 0.2, 0.8)
+    assert parse_band("0.3:0.7") == (0.3, 0.7)
+
+def test_evaluate_reports_bands(onnx_model_path, tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        Image.fromarray(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)).save(tmp_path / f"{i}.jpg")
+    model_path = onnx_model_path.replace(".onnx", ".pt")
+
+    report = evaluate(model_path, model_path, str(tmp_path), [(0.0, 1.0), (0.4, 0.6)], backend="onnx", threads=1)
+    assert report["images"] == 3
+    assert report["small_only_agreement"] == 1.0
+    full, narrow = report["bands"]
+    assert full["escalation_rate"] == 1.0
+    assert narrow["is_frog_agreement"] == 1.0 and narrow["is_frog_disagreements"] == []
+    assert set(narrow["latency_ms"]) == {"mean", "p50", "p99"}
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from detection_service.concurrency import AdaptiveLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_requests_beyond_the_limit_are_refused():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=4)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+    assert limiter.counters["rejected"] == 1
+    assert limiter.in_flight == 2
+
+def test_idle_limiter_admits_work_heavier_than_the_limit():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=4)
+    assert limiter.try_acquire(10)
+    assert not limiter.try_acquire(1)
+    limiter.release(10)
+    assert limiter.in_flight == 0
+
+def test_slow_samples_cut_the_limit_once_per_baseline_interval():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=20, min_limit=2, max_limit=40, tolerance=2.0, backoff=0.5, clock=clock)
+    limiter.observe(0.1)
+    limiter.observe(0.5)
+    assert limiter.limit == 10
+    # A burst of slow results within one baseline interval is one signal
+    limiter.observe(0.5)
+    assert limiter.limit == 10
+    clock.now += 0.1
+    for _ in range(10):
+        limiter.observe(0.5)
+        clock.now += 0.1
+    assert limiter.limit == limiter.min_limit
+
+def test_limit_grows_additively_while_in_use():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=5)
+    # Underused: no growth
+    for _ in range(8):
+        limiter.observe(0.1)
+    assert limiter.limit == 4
+    assert limiter.try_acquire(3)
+    # About one slot per ``limit`` samples, capped at max_limit
+    for _ in range(5):
+        limiter.observe(0.1)
+    assert limiter.limit == 5
+    for _ in range(20):
+        limiter.observe(0.1)
+    assert limiter.limit == 5
+
+def test_concurrent_acquire_never_exceeds_limit():
+    limiter = AdaptiveLimiter(initial_limit=3, min_limit=1, max_limit=3)
+    limiter.try_acquire()
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(200):
+            if limiter.try_acquire():
+                with lock:
+                    peak.append(limiter.in_flight)
+                limiter.release()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 3
+    assert limiter.in_flight == 1
+
+def test_metrics_report_limit_and_baseline():
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=2, max_limit=16)
+    assert limiter.metrics()["baseline_latency_ms"] is None
+    limiter.observe(0.025)
+    metrics = limiter.metrics()
+    assert metrics["limit"] == 8 and metrics["in_flight"] == 0
+    assert metrics["baseline_latency_ms"] == 25.0
+
+@pytest.mark.parametrize("kwargs", [
+    {"initial_limit": 0},
+    {"min_limit": 8, "initial_limit": 4},
+    {"tolerance": 1.0},
+    {"backoff": 1.0},
+])
+def test_invalid_settings_rejected(kwargs):
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(**kwargs)
@@ -0,0 +1,108 @@
+import io
+import json
+
+from PIL import Image
+import pytest
+
+from detection_service import core, lambda_function, main
+from detection_service.metrics import StageTimings
+from detection_service.preprocessing import ImageValidationError
+
+
+def jpeg_bytes(size, color=(40, 120, 60)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_entry_points_share_core_settings():
+    for config in (main.Config, lambda_function.Config):
+        assert issubclass(config, core.Config)
+        assert config.MIN_DIMENSION == core.Config.MIN_DIMENSION
+        assert config.MODEL_INPUT_SIZE == core.Config.MODEL_INPUT_SIZE
+        assert config.MAX_UPLOAD_SIZE_MB == core.Config.MAX_UPLOAD_SIZE_MB
+
+def test_decode_resizes_to_model_resolution_and_records_stages():
+    timings = StageTimings()
+    image = main.detector.decode(jpeg_bytes((2000, 1000)), timings)
+    assert image.mode == "RGB"
+    assert min(image.size) == core.Config.MODEL_INPUT_SIZE
+    assert {"decode", "orientation", "resize"} <= set(timings.durations)
+
+def test_decode_enforces_size_limits():
+    with pytest.raises(ImageValidationError) as excinfo:
+        main.detector.decode(jpeg_bytes((core.Config.MIN_DIMENSION - 1, 1000)))
+    assert excinfo.value.status_code == 400
+
+def test_predict_returns_response_payloads():
+    images = [main.detector.decode(jpeg_bytes((400, 400), color)) for color in ((0, 0, 0), (200, 30, 30))]
+    timings = StageTimings()
+    results = main.detector.predict(images, timings)
+    assert len(results) == 2
+    for result in results:
+        assert set(result) == {"is_frog", "confidence", "details"}
+        assert set(result["details"]) == core.Config.FROG_CLASSES
+    assert {"inference", "postprocess"} <= set(timings.durations)
+
+def test_api_and_lambda_agree(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from detection_service.s3io import LocalS3Client
+
+    data = jpeg_bytes((1200, 900), (90, 140, 20))
+    local = LocalS3Client(str(tmp_path))
+    local.put_object(Bucket="bucket", Key="same.jpg", Body=data)
+    monkeypatch.setattr(lambda_function.fetcher, "client", local)
+    lambda_result = lambda_function.classify_single("bucket", "same.jpg", StageTimings())
+
+    api_result = TestClient(main.app).post(
+        "/classify-frog", files={"file": ("same.jpg", data, "image/jpeg")}
+    ).json()
+    assert lambda_result["statusCode"] == 200
+    assert json.loads(lambda_result["body"]) == api_result
+
+def test_cascade_mode_wraps_the_large_model(onnx_model_path):
+    model_path = onnx_model_path.replace(".onnx", ".pt")
+
+    class CascadeConfig(core.Config):
+        INFERENCE_BACKEND = "onnx"
+        INFERENCE_THREADS = 1
+        MODEL_PATH = model_path
+        CASCADE_MODEL_PATH = model_path
+        CASCADE_LOW, CASCADE_HIGH = 0.0, 1.0
+
+    detector = core.FrogDetector(CascadeConfig)
+    assert detector.cascade is not None
+    assert "+cascade:" in detector.result_cache.model_version
+
+    results = detector.predict([detector.decode(jpeg_bytes((400, 400)))])
+    assert set(results[0]) == {"is_frog", "confidence", "details"}
+    assert detector.cascade.metrics()["escalated"] == 1
+    assert main.detector.cascade is None
+
+def test_fallback_model_reuses_cascade_prefilter(onnx_model_path):
+    model_path = onnx_model_path.replace(".onnx", ".pt")
+
+    class FallbackConfig(core.Config):
+        INFERENCE_BACKEND = "onnx"
+        INFERENCE_THREADS = 1
+        MODEL_PATH = model_path
+        CASCADE_MODEL_PATH = model_path
+        FALLBACK_MODEL_PATH = model_path
+
+    detector = core.FrogDetector(FallbackConfig)
+    assert detector.fallback is detector.cascade.small
+
+    image = detector.decode(jpeg_bytes((400, 400)))
+    assert detector.predict([image], fallback=True) == detector.predict([image])
+    assert main.detector.fallback is None
+
+def test_derivative_round_trip():
+    """A stored derivative decodes to the model resolution under the relaxed minimum."""
+    detector = main.detector
+    image = detector.decode(jpeg_bytes((900, 1200)))
+    data = detector.encode_derivative(image)
+    with pytest.raises(ImageValidationError):
+        detector.decode(data)
+    assert detector.decode(data, derivative=True).size == image.size
+    assert detector.is_derivative_key(detector.derivative_key("posts/frog.jpg"))
+    assert not detector.is_derivative_key("posts/frog.jpg")
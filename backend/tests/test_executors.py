@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from detection_service.executors import BoundedExecutor, SaturatedError
+
+
+def test_rejects_beyond_max_pending():
+    release = threading.Event()
+    executor = BoundedExecutor(ThreadPoolExecutor(max_workers=1), max_pending=2)
+    futures = [executor.submit(release.wait) for _ in range(2)]
+    assert executor.pending == 2
+
+    with pytest.raises(SaturatedError):
+        executor.submit(release.wait)
+
+    release.set()
+    for future in futures:
+        future.result(timeout=1)
+    executor.shutdown()
+    assert executor.pending == 0
+
+def test_slots_are_released_on_failure():
+    executor = BoundedExecutor(ThreadPoolExecutor(max_workers=1), max_pending=1)
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(lambda: 1 / 0).result(timeout=1)
+    # Done callbacks run just after waiters are woken
+    deadline = time.monotonic() + 1
+    while executor.pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert executor.submit(lambda: 2).result(timeout=1) == 2
+    executor.shutdown()
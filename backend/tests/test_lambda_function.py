@@ -0,0 +1,239 @@
+from types import SimpleNamespace
+import io
+import json
+
+from PIL import Image
+import pytest
+
+from detection_service import lambda_function
+from detection_service.results import FileResultStore
+from detection_service.s3io import LocalS3Client
+
+
+def jpeg_bytes(size=(320, 320), color=(0, 255, 0)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def invoke(body):
+    event = {"body": json.dumps(body)}
+    context = SimpleNamespace(aws_request_id="test-request")
+    response = lambda_function.lambda_handler(event, context)
+    return response["statusCode"], json.loads(response["body"])
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    local = LocalS3Client(str(tmp_path / "s3"))
+    local.put_object(Bucket="bucket", Key="frog.jpg", Body=jpeg_bytes())
+    local.put_object(Bucket="bucket", Key="other.jpg", Body=jpeg_bytes(color=(0, 0, 255)))
+    local.put_object(Bucket="bucket", Key="broken.jpg", Body=b"not an image")
+    monkeypatch.setattr(lambda_function, "s3", local)
+    monkeypatch.setattr(lambda_function.fetcher, "client", local)
+    return local
+
+
+def test_single_image(s3):
+    status, body = invoke({"bucket": "bucket", "key": "frog.jpg"})
+    assert status == 200
+    assert set(body) == {"is_frog", "confidence", "details"}
+
+def test_missing_key(s3):
+    status, body = invoke({"bucket": "bucket"})
+    assert status == 400
+
+def test_batch_mode_returns_per_item_results(s3):
+    status, body = invoke({"items": [
+        {"bucket": "bucket", "key": "frog.jpg"},
+        {"bucket": "bucket", "key": "missing.jpg"},
+        {"bucket": "bucket", "key": "broken.jpg"},
+        {"bucket": "bucket"},
+        {"bucket": "bucket", "key": "other.jpg"},
+    ]})
+    assert status == 200
+    results = body["results"]
+    assert [r["statusCode"] for r in results] == [200, 400, 400, 400, 200]
+    assert [r["key"] for r in results] == ["frog.jpg", "missing.jpg", "broken.jpg", None, "other.jpg"]
+    for item in (results[0], results[4]):
+        assert set(item["result"]) == {"is_frog", "confidence", "details"}
+    assert "error" in results[1]
+
+def test_batch_mode_matches_single_image(s3):
+    _, single = invoke({"bucket": "bucket", "key": "frog.jpg"})
+    _, batch = invoke({"items": [{"bucket": "bucket", "key": "frog.jpg"}]})
+    assert batch["results"][0]["result"]["confidence"] == pytest.approx(single["confidence"], abs=1e-3)
+
+@pytest.mark.parametrize("items, expected", [
+    ([], 400),
+    ("frog.jpg", 400),
+    (["frog.jpg"], 400),
+    ([{"bucket": "bucket", "key": "frog.jpg"}] * (lambda_function.Config.MAX_BATCH_ITEMS + 1), 413),
+])
+def test_batch_mode_validation(s3, items, expected):
+    status, _ = invoke({"items": items})
+    assert status == expected
+
+def test_repeated_object_hits_cache(s3):
+    data = jpeg_bytes(color=(1, 2, 3))
+    s3.put_object(Bucket="bucket", Key="repeat.jpg", Body=data)
+    s3.put_object(Bucket="bucket", Key="copy.jpg", Body=data)
+    before = lambda_function.result_cache.metrics()
+
+    _, first = invoke({"bucket": "bucket", "key": "repeat.jpg"})
+    _, batch = invoke({"items": [{"bucket": "bucket", "key": "copy.jpg"}]})
+
+    after = lambda_function.result_cache.metrics()
+    assert batch["results"][0]["result"] == first
+    assert after["misses"] == before["misses"] + 1
+    assert after["local_hits"] == before["local_hits"] + 1
+
+
+def s3_notification(*keys, bucket="bucket"):
+    return {"Records": [
+        {"eventSource": "aws:s3", "eventName": "ObjectCreated:Put",
+         "s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+        for key in keys
+    ]}
+
+
+def sqs_message(message_id, body):
+    return {"eventSource": "aws:sqs", "messageId": message_id, "body": json.dumps(body)}
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = FileResultStore(str(tmp_path / "results"))
+    monkeypatch.setattr(lambda_function, "result_store", store)
+    return store
+
+
+def test_s3_event_persists_results(s3, store):
+    s3.put_object(Bucket="bucket", Key="my frog.jpg", Body=jpeg_bytes(color=(9, 9, 9)))
+    response = lambda_function.lambda_handler(
+        s3_notification("frog.jpg", "my+frog.jpg", "broken.jpg"), SimpleNamespace(aws_request_id="event")
+    )
+    assert response == {"batchItemFailures": []}
+
+    assert store.get("bucket", "frog.jpg")["status"] == "done"
+    assert set(store.get("bucket", "my frog.jpg")["result"]) == {"is_frog", "confidence", "details"}
+    broken = store.get("bucket", "broken.jpg")
+    assert broken["status"] == "error" and broken["statusCode"] == 400
+
+def test_sqs_event_reports_only_transient_failures(s3, store, monkeypatch):
+    event = {"Records": [
+        sqs_message("m1", s3_notification("frog.jpg")),
+        sqs_message("m2", {"bucket": "bucket", "key": "other.jpg"}),
+        sqs_message("m3", {"Event": "s3:TestEvent"}),
+        {"eventSource": "aws:sqs", "messageId": "m4", "body": "not json"},
+        sqs_message("m5", {"bucket": "bucket", "key": "missing.jpg"}),
+    ]}
+    response = lambda_function.lambda_handler(event, SimpleNamespace(aws_request_id="sqs"))
+    assert response == {"batchItemFailures": []}
+    assert store.get("bucket", "frog.jpg")["status"] == "done"
+    assert store.get("bucket", "other.jpg")["status"] == "done"
+    assert store.get("bucket", "missing.jpg")["status"] == "error"
+
+    # Inference errors leave the result pending and ask SQS to redeliver
+    s3.put_object(Bucket="bucket", Key="retry.jpg", Body=jpeg_bytes(color=(7, 8, 9)))
+    monkeypatch.setattr(lambda_function.model, "predict_probs", lambda images: 1 / 0)
+    response = lambda_function.lambda_handler(
+        {"Records": [sqs_message("m6", {"bucket": "bucket", "key": "retry.jpg"})]},
+        SimpleNamespace(aws_request_id="sqs-retry"),
+    )
+    assert response == {"batchItemFailures": [{"itemIdentifier": "m6"}]}
+    assert store.get("bucket", "retry.jpg") is None
+
+def test_poll_mode(s3, store):
+    status, body = invoke({"action": "result", "bucket": "bucket", "key": "frog.jpg"})
+    assert status == 404 and body == {"status": "pending"}
+
+    lambda_function.lambda_handler(s3_notification("frog.jpg"), SimpleNamespace(aws_request_id="event"))
+    status, body = invoke({"action": "result", "bucket": "bucket", "key": "frog.jpg"})
+    assert status == 200
+    assert body["status"] == "done" and body["key"] == "frog.jpg"
+
+def test_oversized_and_bomb_objects_rejected_from_header(s3, monkeypatch):
+    monkeypatch.setattr(lambda_function.fetcher, "max_bytes", 1024)
+    s3.put_object(Bucket="bucket", Key="large.jpg", Body=jpeg_bytes(size=(640, 640)) + b"\0" * 2048)
+    status, body = invoke({"bucket": "bucket", "key": "large.jpg"})
+    assert status == 413
+
+    monkeypatch.setattr(lambda_function.fetcher, "max_bytes", None)
+    monkeypatch.setattr(lambda_function.Config, "MAX_IMAGE_PIXELS", 100 * 100)
+    requests_before = s3.requests
+    status, body = invoke({"bucket": "bucket", "key": "large.jpg"})
+    assert status == 413 and "Image too large" in body["error"]
+    assert s3.requests == requests_before + 1  # Only the ranged header read
+
+def test_invocations_emit_emf_metrics(s3, capsys):
+    s3.put_object(Bucket="bucket", Key="metrics.jpg", Body=jpeg_bytes(color=(4, 4, 4)))
+    invoke({"bucket": "bucket", "key": "metrics.jpg"})
+    invoke({"items": [{"bucket": "bucket", "key": "metrics.jpg"}, {"bucket": "bucket", "key": "missing.jpg"}]})
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    single, batch = records[-2:]
+    assert single["Mode"] == "single" and single["images"] == 1 and single["errors"] == 0
+    for stage in ("fetch_ms", "cache_lookup_ms", "decode_ms", "orientation_ms", "inference_ms", "postprocess_ms", "request_ms"):
+        assert stage in single
+    assert batch["Mode"] == "batch" and batch["images"] == 2
+    assert batch["cache_hits"] == 1 and batch["errors"] == 1
+
+def test_images_below_minimum_size_are_rejected(s3):
+    s3.put_object(Bucket="bucket", Key="tiny.jpg", Body=jpeg_bytes(size=(100, 100)))
+    status, body = invoke({"bucket": "bucket", "key": "tiny.jpg"})
+    assert status == 400
+    assert "Image too small" in body["error"]
+
+def test_near_duplicates_skip_inference(s3, monkeypatch, capsys):
+    import numpy as np
+    from detection_service.phash import NearDuplicateIndex
+
+    monkeypatch.setattr(lambda_function.detector, "near_duplicates", NearDuplicateIndex())
+    rng = np.random.default_rng(9)
+    image = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)).resize((800, 600), Image.Resampling.BICUBIC)
+    for key, img, quality in (("a.jpg", image, 95), ("b.jpg", image.resize((480, 360)), 50)):
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        s3.put_object(Bucket="bucket", Key=key, Body=buffer.getvalue())
+
+    first_status, first = invoke({"bucket": "bucket", "key": "a.jpg"})
+    status, body = invoke({"items": [{"bucket": "bucket", "key": "b.jpg"}]})
+    assert first_status == status == 200
+    assert body["results"][0]["result"] == first
+
+    record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert record["near_duplicate_hits"] == 1
+    assert lambda_function.detector.near_duplicates.metrics()["inferences_saved"] == 1
+
+def test_derivatives_stored_at_upload_and_read_instead_of_originals(s3, store, monkeypatch):
+    monkeypatch.setattr(lambda_function.Config, "STORE_DERIVATIVES", True)
+    s3.put_object(Bucket="bucket", Key="big.jpg", Body=jpeg_bytes(size=(1200, 900), color=(30, 90, 40)))
+    lambda_function.lambda_handler(s3_notification("big.jpg"), SimpleNamespace(aws_request_id="event"))
+
+    record = store.get("bucket", "big.jpg")
+    assert record["derivative_key"] == "big.jpg.model.jpg"
+    with Image.open(io.BytesIO(s3.get_object(Bucket="bucket", Key="big.jpg.model.jpg")["Body"].read())) as derivative:
+        assert min(derivative.size) == lambda_function.Config.MODEL_INPUT_SIZE
+
+    # The derivative's own ObjectCreated event is not classified
+    assert lambda_function.event_items(s3_notification("big.jpg.model.jpg")) == []
+
+    fetched = []
+    get_object = s3.get_object
+    monkeypatch.setattr(s3, "get_object", lambda **kwargs: fetched.append(kwargs["Key"]) or get_object(**kwargs))
+    status, body = invoke({"items": [{"bucket": "bucket", "key": "big.jpg"}]})
+    assert status == 200
+    assert body["results"][0]["derivative"] == "big.jpg.model.jpg"
+    assert body["results"][0]["result"] == record["result"]
+    assert set(fetched) == {"big.jpg.model.jpg"}
+
+def test_missing_derivative_falls_back_to_original(s3, monkeypatch):
+    monkeypatch.setattr(lambda_function.Config, "STORE_DERIVATIVES", True)
+    s3.put_object(Bucket="bucket", Key="new.jpg", Body=jpeg_bytes(size=(500, 400), color=(50, 60, 70)))
+    status, body = invoke({"bucket": "bucket", "key": "new.jpg"})
+    assert status == 200
+    # Classifying the original stored its derivative, which classifies on its own
+    status, derivative = invoke({"bucket": "bucket", "key": "new.jpg.model.jpg"})
+    assert status == 200
+    assert derivative == body
@@ -1,7 +1,16 @@
 from fastapi.testclient import TestClient
-from detection_service.main import app, Config
+from detection_service import main
+from fastapi import HTTPException, UploadFile
+from detection_service.main import app, Config, ImageProcessor
 from PIL import Image
+import asyncio
+import hashlib
 import io
+import numpy as np
+import struct
+import tempfile
+import tracemalloc
+import zlib
 import pytest
 from typing import BinaryIO
 
@@ -185,4 +194,381 @@ def test_response_time():
     end_time = time.time()
     
     assert response.status_code == 200
-    assert end_time - start_time < 5  # Response should be under 5 seconds
\ No newline at end of file
+    assert end_time - start_time < 5  # Response should be under 5 seconds
+
+# Batching stats tests
+def test_batching_stats():
+    """Test batch scheduler stats endpoint."""
+    img_byte_arr = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION))
+    client.post("/classify-frog", files={"file": ("test.jpg", img_byte_arr, "image/jpeg")})
+
+    response = client.get("/stats")
+    assert response.status_code == 200
+    data = response.json()["batching"]
+    assert data["queue_depth"] >= 0
+    assert data["total_items"] >= 1
+    assert data["max_batch_size"] == Config.BATCH_MAX_SIZE
+    assert all(key in data["wait_ms"] for key in ["p50", "p99", "max"])
+
+# Batch endpoint tests
+def test_batch_classification():
+    """Test batch endpoint returns per-item results and errors in order."""
+    files = [
+        ("files", ("a.jpg", create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION)), "image/jpeg")),
+        ("files", ("small.jpg", create_test_image((50, 50)), "image/jpeg")),
+        ("files", ("test.txt", b"Hello World", "text/plain")),
+        ("files", ("corrupt.jpg", b"corrupted image data", "image/jpeg")),
+        ("files", ("b.jpg", create_test_image((400, 600), (0, 0, 255)), "image/jpeg")),
+    ]
+    response = client.post("/classify-frog/batch", files=files)
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert [item["filename"] for item in results] == ["a.jpg", "small.jpg", "test.txt", "corrupt.jpg", "b.jpg"]
+    assert [item["status_code"] for item in results] == [200, 400, 415, 400, 200]
+    for item in (results[0], results[4]):
+        assert item["error"] is None
+        assert all(key in item["result"] for key in ["is_frog", "confidence", "details"])
+    assert "Image too small" in results[1]["error"]
+    assert results[1]["result"] is None
+
+def test_batch_matches_single_classification():
+    """Test batched inference agrees with the single-image endpoint."""
+    image = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION), (90, 140, 60)).getvalue()
+    single = client.post("/classify-frog", files={"file": ("a.jpg", image, "image/jpeg")}).json()
+    # Bytes after the JPEG end marker leave the pixels alone but change the cache key
+    inferred = main.batcher.stats.total_items
+    batch = client.post(
+        "/classify-frog/batch", files=[("files", ("a.jpg", image + b"\0", "image/jpeg"))]
+    ).json()
+    assert main.batcher.stats.total_items == inferred + 1
+    assert abs(batch["results"][0]["result"]["confidence"] - single["confidence"]) < 1e-3
+
+def test_batch_too_many_files():
+    """Test batch endpoint rejects oversized batches."""
+    files = [("files", (f"{i}.jpg", b"x", "image/jpeg")) for i in range(Config.MAX_BATCH_FILES + 1)]
+    response = client.post("/classify-frog/batch", files=files)
+    assert response.status_code == 413
+
+# Result cache tests
+def test_batch_total_size_limit_from_declared_length(monkeypatch):
+    """Test batches declaring more than the total budget are refused before reading."""
+    monkeypatch.setattr(Config, "MAX_BATCH_UPLOAD_MB", 1)
+    files = [("files", (f"{i}.jpg", b"\0" * (700 * 1024), "image/jpeg")) for i in range(2)]
+    response = client.post("/classify-frog/batch", files=files)
+    assert response.status_code == 413
+    assert "in total" in response.json()["detail"]
+
+def test_batch_total_size_limit_enforced_while_reading(monkeypatch):
+    """Test the budget also holds when the declared length passes the middleware."""
+    monkeypatch.setattr(Config, "MAX_BATCH_UPLOAD_MB", 1)
+    monkeypatch.setattr(Config, "MULTIPART_OVERHEAD_BYTES", 4 * 1024 * 1024)
+    image = create_test_image((400, 400), (12, 34, 56)).getvalue()
+    padding = b"\0" * (600 * 1024)
+    files = [("files", (f"{i}.jpg", image + bytes([i]) + padding, "image/jpeg")) for i in range(2)]
+    response = client.post("/classify-frog/batch", files=files)
+    assert response.status_code == 413
+    assert "in total" in response.json()["detail"]
+
+    # Within the budget, each file is read as usual
+    response = client.post("/classify-frog/batch", files=files[:1])
+    assert response.json()["results"][0]["status_code"] == 200
+
+def test_repeated_upload_hits_cache():
+    """Test identical uploads are answered from the result cache."""
+    image = Image.new("RGB", (Config.MIN_DIMENSION, Config.MIN_DIMENSION), (12, 34, 56))
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format="PNG")
+    payload = img_byte_arr.getvalue()
+
+    before = client.get("/stats").json()["cache"]
+    first = client.post("/classify-frog", files={"file": ("a.png", payload, "image/png")})
+    second = client.post("/classify-frog", files={"file": ("b.png", payload, "image/png")})
+    after = client.get("/stats").json()["cache"]
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert after["misses"] == before["misses"] + 1
+    assert after["local_hits"] == before["local_hits"] + 1
+
+# Fast decode path tests
+def test_large_jpeg_decoded_at_model_resolution():
+    """Test large JPEGs are reduced straight to the model input size."""
+    image = Image.new("RGB", (4000, 3000), (0, 255, 0))
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format="JPEG")
+
+    opened = ImageProcessor.open_image(img_byte_arr.getvalue())
+    processed = ImageProcessor.process_image(opened)
+    assert processed.mode == "RGB"
+    assert min(processed.size) == Config.MODEL_INPUT_SIZE
+    assert processed.size == (round(4000 * Config.MODEL_INPUT_SIZE / 3000), Config.MODEL_INPUT_SIZE)
+
+@pytest.mark.parametrize("orientation, expected_size", [
+    (1, (400, 300)),
+    (3, (400, 300)),
+    (6, (300, 400)),
+    (8, (300, 400)),
+    (5, (300, 400)),  # Transpose: mirrored orientations are handled too
+])
+def test_exif_orientation_applied(orientation, expected_size):
+    """Test EXIF orientation is applied before resizing."""
+    image = Image.new("RGB", (1200, 900), (0, 255, 0))
+    exif = image.getexif()
+    exif[0x0112] = orientation
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format="JPEG", exif=exif)
+
+    processed = ImageProcessor.process_image(ImageProcessor.open_image(img_byte_arr.getvalue()))
+    scale = Config.MODEL_INPUT_SIZE / min(expected_size)
+    assert processed.size == tuple(round(side * scale) for side in expected_size)
+
+def test_minimum_size_image_resized_to_input():
+    """Test minimum-size images are resized to the model input size."""
+    img_byte_arr = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION))
+    processed = ImageProcessor.process_image(ImageProcessor.open_image(img_byte_arr.getvalue()))
+    assert processed.size == (Config.MODEL_INPUT_SIZE, Config.MODEL_INPUT_SIZE)
+
+# Backpressure tests
+def test_saturated_inference_queue_returns_429(monkeypatch):
+    """Test a full inference queue sheds load with 429 and Retry-After."""
+    monkeypatch.setattr(main.batcher, "max_queue_size", 0)
+    img_byte_arr = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION), (1, 2, 3))
+    response = client.post(
+        "/classify-frog",
+        files={"file": ("test.jpg", img_byte_arr, "image/jpeg")}
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(Config.RETRY_AFTER_SECONDS)
+
+def test_saturated_preprocess_pool_returns_429(monkeypatch):
+    """Test a full preprocessing pool rejects the whole batch with 429."""
+    monkeypatch.setattr(main.get_preprocess_executor(), "max_pending", 0)
+    files = [("files", ("a.jpg", create_test_image((400, 400), (4, 5, 6)), "image/jpeg"))]
+    response = client.post("/classify-frog/batch", files=files)
+    assert response.status_code == 429
+    assert "preprocessing" in response.json()["detail"]
+
+def test_stats_reports_preprocessing_pool():
+    """Test stats expose the preprocessing pool bounds."""
+    stats = client.get("/stats").json()["preprocessing"]
+    assert stats["workers"] == Config.PREPROCESS_WORKERS
+    assert stats["max_pending"] == Config.PREPROCESS_MAX_PENDING
+    assert stats["pending"] >= 0
+
+# Streaming upload tests
+def test_decompression_bomb_rejected_from_header():
+    """Test headers declaring huge dimensions are rejected before decoding."""
+    ihdr = struct.pack(">IIBBBBB", 40000, 40000, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+    header += struct.pack(">I", 1024) + b"IDAT"
+    response = client.post(
+        "/classify-frog",
+        files={"file": ("bomb.png", header + b"\0" * 1024, "image/png")}
+    )
+    assert response.status_code == 413
+    assert "Image too large" in response.json()["detail"]
+
+def test_size_limit_enforced_while_streaming(monkeypatch):
+    """Test uploads of unknown size are cut off once they pass the limit."""
+    monkeypatch.setattr(Config, "MAX_UPLOAD_SIZE_MB", 1)
+    payload = create_test_image((400, 400)).getvalue() + b"\0" * (2 * 1024 * 1024)
+    upload = UploadFile(io.BytesIO(payload), size=None, filename="big.jpg")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ImageProcessor.read_upload(upload))
+    assert error.value.status_code == 413
+    assert upload.file.tell() < len(payload)
+
+def test_streamed_upload_matches_cache_key():
+    """Test incremental hashing gives the same key as hashing the whole payload."""
+    payload = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION)).getvalue()
+    upload = UploadFile(io.BytesIO(payload), size=len(payload), filename="a.jpg")
+    data, cache_key, content_hash = asyncio.run(ImageProcessor.read_upload(upload))
+    assert data == payload
+    assert cache_key == main.result_cache.key_for(payload)
+    assert content_hash == hashlib.sha256(payload).hexdigest()
+
+def test_upload_of_unknown_size_read_into_one_buffer():
+    """Test uploads without a recorded size are returned whole with the same hash."""
+    payload = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION)).getvalue() + b"\0" * 600_000
+    upload = UploadFile(io.BytesIO(payload), size=None, filename="a.jpg")
+    data, cache_key, content_hash = asyncio.run(ImageProcessor.read_upload(upload))
+    assert data == payload
+    assert content_hash == hashlib.sha256(payload).hexdigest()
+    assert cache_key == main.result_cache.key_for(payload)
+
+class SpooledFileWithoutReadinto:
+    """The read API of SpooledTemporaryFile before Python 3.11, which had no readinto."""
+
+    def __init__(self, data: bytes):
+        self._file = tempfile.SpooledTemporaryFile(max_size=1024)
+        self._file.write(data)  # Past max_size, so rolled to disk like a large upload
+        self._rolled = True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+def test_upload_read_without_readinto():
+    """Test uploads are read through UploadFile.read alone, as Python 3.10's spooled files require."""
+    payload = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION)).getvalue() + b"\0" * 600_000
+    for size in (len(payload), None):
+        upload = UploadFile(SpooledFileWithoutReadinto(payload), size=size, filename="a.jpg")
+        data, _, content_hash = asyncio.run(ImageProcessor.read_upload(upload))
+        assert data == payload
+        assert content_hash == hashlib.sha256(payload).hexdigest()
+
+def test_upload_held_once_while_reading():
+    """Test reading an upload of known size peaks at about one copy of it."""
+    payload = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION)).getvalue() + b"\0" * (8 * 1024 * 1024)
+    upload = UploadFile(io.BytesIO(payload), size=len(payload), filename="big.jpg")
+
+    async def read():
+        # Traced inside the loop: asyncio.run's own setup and teardown would dominate the peak
+        tracemalloc.start()
+        try:
+            data, _, _ = await ImageProcessor.read_upload(upload)
+            return data, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    data, peak = asyncio.run(read())
+    assert data == payload
+    # One copy, plus the header probe and per-chunk slack
+    assert peak < len(payload) + Config.HEADER_PROBE_BYTES + 2 * Config.UPLOAD_CHUNK_SIZE
+
+# Metrics tests
+def test_metrics_endpoint_reports_stages_and_requests():
+    """Test /metrics exposes per-stage histograms, request counts and memory."""
+    img_byte_arr = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION), (9, 8, 7))
+    client.post("/classify-frog", files={"file": ("test.jpg", img_byte_arr, "image/jpeg")})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    for stage in ("upload_read", "cache_lookup", "decode", "orientation", "resize", "inference", "postprocess"):
+        assert f'frog_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'frog_http_requests_total{endpoint="/classify-frog",status="200"}' in text
+    assert "frog_inference_queue_depth " in text
+    assert "process_resident_memory_bytes " in text
+
+# Near-duplicate tests
+def test_near_duplicate_uploads_skip_inference(monkeypatch):
+    """Test a re-encoded, resized copy of a classified image reuses its result."""
+    from detection_service.phash import NearDuplicateIndex
+
+    monkeypatch.setattr(main.detector, "near_duplicates", NearDuplicateIndex())
+    rng = np.random.default_rng(5)
+    image = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)).resize((800, 600), Image.Resampling.BICUBIC)
+
+    def upload(img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality)
+        return client.post("/classify-frog", files={"file": ("frog.jpg", buffer.getvalue(), "image/jpeg")})
+
+    first = upload(image, 95)
+    inferred = main.batcher.stats.total_items
+    second = upload(image.resize((640, 480)), 60)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert main.batcher.stats.total_items == inferred
+
+    stats = client.get("/stats").json()["near_duplicates"]
+    assert stats["enabled"] and stats["inferences_saved"] == 1
+
+# Adaptive concurrency tests
+def test_health_reports_concurrency_limit():
+    """Test /health surfaces the adaptive limit."""
+    concurrency = client.get("/health").json()["concurrency"]
+    assert Config.CONCURRENCY_MIN_LIMIT <= concurrency["limit"] <= Config.CONCURRENCY_MAX_LIMIT
+    assert concurrency["in_flight"] == 0
+    assert concurrency["fallback"]["enabled"] is False
+
+def test_requests_over_concurrency_limit_shed_with_503(monkeypatch):
+    """Test work beyond the concurrency limit is shed with 503 and Retry-After."""
+    from detection_service.concurrency import AdaptiveLimiter
+
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+    limiter.try_acquire()
+    monkeypatch.setattr(main, "limiter", limiter)
+    img_byte_arr = create_test_image((Config.MIN_DIMENSION, Config.MIN_DIMENSION), (7, 8, 9))
+    response = client.post("/classify-frog", files={"file": ("test.jpg", img_byte_arr, "image/jpeg")})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(Config.RETRY_AFTER_SECONDS)
+
+    batch = client.post(
+        "/classify-frog/batch",
+        files=[("files", ("a.jpg", create_test_image((400, 400), (7, 8, 10)), "image/jpeg"))]
+    )
+    assert batch.status_code == 503
+    assert limiter.in_flight == 1
+    assert client.get("/health").json()["concurrency"]["rejected"] == 2
+
+def test_fallback_model_used_under_load(monkeypatch):
+    """Test admitted requests switch to the fallback model past the utilization threshold."""
+    from detection_service.batching import BatchScheduler
+
+    fallback_result = {"is_frog": True, "confidence": 0.9, "details": {"bullfrog": 0.9, "tailed_frog": 0.0, "tree_frog": 0.0}}
+    scheduler = BatchScheduler(lambda images: [fallback_result] * len(images), max_batch_size=4, max_wait_ms=1)
+    monkeypatch.setattr(main, "fallback_batcher", scheduler)
+    monkeypatch.setattr(Config, "FALLBACK_UTILIZATION", 0.0)
+
+    img_bytes = create_test_image((400, 400), (11, 12, 13)).getvalue()
+    response = client.post("/classify-frog", files={"file": ("test.jpg", img_bytes, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.headers["X-Model-Tier"] == "fallback"
+    assert response.json() == fallback_result
+
+    # Fallback answers are not cached, so the main model answers once load drops
+    monkeypatch.setattr(main, "fallback_batcher", None)
+    response = client.post("/classify-frog", files={"file": ("test.jpg", img_bytes, "image/jpeg")})
+    assert "X-Model-Tier" not in response.headers
+    assert response.json()["confidence"] != 0.9
+
+def test_model_resolution_derivative_upload():
+    """Test a client-made derivative below MIN_DIMENSION is accepted only when flagged."""
+    size = (Config.MODEL_INPUT_SIZE, Config.MODEL_INPUT_SIZE + 60)
+    img_bytes = create_test_image(size, (21, 22, 23)).getvalue()
+    rejected = client.post("/classify-frog", files={"file": ("thumb.jpg", img_bytes, "image/jpeg")})
+    assert rejected.status_code == 400
+
+    accepted = client.post(
+        "/classify-frog?derivative=true", files={"file": ("thumb.jpg", img_bytes, "image/jpeg")}
+    )
+    assert accepted.status_code == 200
+    batch = client.post(
+        "/classify-frog/batch?derivative=true", files=[("files", ("thumb.jpg", img_bytes, "image/jpeg"))]
+    )
+    assert batch.json()["results"][0]["result"] == accepted.json()
+
+def test_probability_vectors_stored_by_content_hash(monkeypatch, tmp_path):
+    """Test fresh main-model predictions store a vector under the upload's sha256."""
+    from detection_service.vectors import VectorStore, redecide
+
+    store = VectorStore(str(tmp_path), "test", main.detector.model.names, k=len(main.detector.model.names))
+    monkeypatch.setattr(main.detector, "vectors", store)
+    payloads = [create_test_image((400, 400), (31 + 40 * i, 132, 33)).getvalue() for i in range(3)]
+    single = client.post("/classify-frog", files={"file": ("a.jpg", payloads[0], "image/jpeg")})
+    batch = client.post(
+        "/classify-frog/batch", files=[("files", (f"{i}.jpg", data, "image/jpeg")) for i, data in enumerate(payloads)]
+    )
+    assert client.get("/stats").json()["vectors"]["pending"] == 3
+
+    vectors = store.load()
+    assert sorted(vectors.hex_digests()) == sorted(hashlib.sha256(data).hexdigest() for data in payloads)
+    _, confidence = redecide(vectors, store.classes, Config.FROG_CLASSES, Config.FROG_THRESHOLD)
+    expected = {hashlib.sha256(payloads[0]).hexdigest(): single.json()["confidence"]}
+    expected.update(
+        (hashlib.sha256(data).hexdigest(), item["result"]["confidence"])
+        for data, item in zip(payloads, batch.json()["results"])
+    )
+    for digest, value in zip(vectors.hex_digests(), confidence.tolist()):
+        assert value == pytest.approx(expected[digest], abs=2e-3)
@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from detection_service.metrics import MetricsRegistry, StageTimings, emf_record, memory_usage, resident_memory_bytes
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.5):
+        histogram.observe(value, stage="decode")
+
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="decode",le="0.01"} 1' in text
+    assert 'stage_seconds_bucket{stage="decode",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="decode"} 3' in text
+    assert histogram.count(stage="decode") == 3
+
+def test_counters_and_callbacks():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("status",))
+    requests.inc(status=200)
+    requests.inc(2, status=500)
+    registry.callback("queue_depth", "Queue depth", lambda: 7)
+
+    text = registry.render()
+    assert 'requests_total{status="200"} 1' in text
+    assert 'requests_total{status="500"} 2' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 7" in text
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Duplicate")
+
+def test_emf_record_shape():
+    timings = StageTimings()
+    timings.add("decode", 0.002)
+    timings.add("decode", 0.003)
+    record = json.loads(emf_record(
+        "Test", {"Mode": "single"}, {f"{k}_ms": v * 1000 for k, v in timings.durations.items()},
+        counts={"images": 1}, megabytes={"memory_rss": 12.34},
+    ))
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Test"
+    assert directive["Dimensions"] == [["Mode"]]
+    assert {"Name": "decode_ms", "Unit": "Milliseconds"} in directive["Metrics"]
+    assert record["decode_ms"] == pytest.approx(5.0)
+    assert record["Mode"] == "single" and record["images"] == 1 and record["memory_rss"] == 12.3
+
+def test_resident_memory():
+    assert resident_memory_bytes() > 1024 * 1024
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs /proc smaps_rollup")
+def test_memory_usage_breakdown():
+    usage = memory_usage()
+    assert 0 < usage["uss"] <= usage["pss"] <= usage["rss"]
+    assert memory_usage("0") == {}
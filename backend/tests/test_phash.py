@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from detection_service.phash import BKTree, NearDuplicateIndex, dhash, hamming
+
+
+def textured_image(seed: int, size=(640, 480)) -> Image.Image:
+    """Smooth random blobs: enough structure to fingerprint, like a photo."""
+    rng = np.random.default_rng(seed)
+    coarse = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8))
+    return coarse.resize(size, Image.Resampling.BICUBIC)
+
+
+def reencode(image: Image.Image, quality: int) -> Image.Image:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_hash_survives_reencoding_resizing_and_small_crops():
+    original = textured_image(1)
+    base = dhash(original)
+    width, height = original.size
+    variants = [
+        reencode(original, 40),
+        original.resize((320, 240), Image.Resampling.BILINEAR),
+        original.crop((8, 6, width - 8, height - 6)),
+    ]
+    for variant in variants:
+        assert hamming(base, dhash(variant)) <= 6
+
+def test_different_images_are_far_apart():
+    hashes = [dhash(textured_image(seed)) for seed in range(20)]
+    distances = [hamming(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    assert min(distances) > 6
+
+def test_uniform_images_are_not_hashed():
+    assert dhash(Image.new("RGB", (400, 400), (20, 200, 20))) is None
+
+def test_bk_tree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    keys = [int(k) for k in rng.integers(0, 2**63, 500, dtype=np.int64)]
+    tree = BKTree()
+    for i, key in enumerate(keys):
+        tree.add(key, i)
+    assert len(tree) == len(set(keys))
+
+    for key in keys[:50]:
+        # Flip a few bits so the query is near, not equal
+        query = key ^ 0b1011
+        found = tree.nearest(query, 4)
+        best = min(hamming(query, k) for k in keys)
+        assert found is not None and found[0] == best
+
+    assert tree.nearest(keys[0], 0) == (0, 0)
+    assert BKTree().nearest(1, 10) is None
+
+def test_index_counts_saved_inferences_and_evicts_oldest():
+    index = NearDuplicateIndex(max_distance=2, max_entries=4)
+    assert index.lookup(0b1111) is None
+    index.add(0b1111, {"is_frog": True})
+    assert index.lookup(0b1110) == {"is_frog": True}
+    assert index.lookup(None) is None
+
+    for key in (1 << 20, 1 << 30, 1 << 40, 1 << 50):
+        index.add(key, {"is_frog": False})
+    # The oldest entry was evicted when the fifth was added
+    assert index.lookup(0b1111) is None
+    assert len(index) == 4
+
+    stats = index.metrics()
+    assert stats["inferences_saved"] == 1
+    assert stats["lookups"] == 3 and stats["unhashable"] == 1
+    assert stats["rebuilds"] == 1
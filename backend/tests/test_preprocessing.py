@@ -0,0 +1,56 @@
+import io
+import os
+import struct
+import zlib
+
+from PIL import Image
+import pytest
+
+from detection_service.preprocessing import ImageValidationError, list_images, probe_header, sniff_format
+
+
+def encode(size, fmt):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (0, 128, 0)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def png_header(width, height):
+    """A PNG signature, IHDR and the start of IDAT: enough to read dimensions, no pixels."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + chunk + struct.pack(">I", zlib.crc32(chunk)) + struct.pack(">I", 0) + b"IDAT"
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_sniff_format(fmt):
+    assert sniff_format(encode((8, 8), fmt)) == fmt
+
+@pytest.mark.parametrize("head", [b"", b"GIF89a", b"RIFF\x00\x00\x00\x00WAVE", b"not an image"])
+def test_sniff_rejects_other_content(head):
+    assert sniff_format(head) is None
+
+def test_probe_reads_dimensions_from_header_only():
+    assert probe_header(png_header(640, 480), 320) == (640, 480)
+
+def test_probe_rejects_small_and_oversized_headers():
+    with pytest.raises(ImageValidationError) as small:
+        probe_header(png_header(640, 100), 320)
+    assert small.value.status_code == 400
+
+    with pytest.raises(ImageValidationError) as bomb:
+        probe_header(png_header(50_000, 50_000), 320, max_pixels=64_000_000)
+    assert bomb.value.status_code == 413
+
+def test_probe_needs_more_bytes_for_truncated_header():
+    data = encode((400, 400), "JPEG")
+    assert probe_header(data[:4], 320) is None
+    assert probe_header(data, 320) == (400, 400)
+
+def test_list_images_filters_and_sorts(tmp_path):
+    for name in ("b.jpg", "a.PNG", "nested/c.webp", "notes.txt"):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"")
+    paths = list_images(str(tmp_path))
+    assert [os.path.relpath(p, tmp_path) for p in paths] == ["a.PNG", "b.jpg", os.path.join("nested", "c.webp")]
+    assert len(list_images(str(tmp_path), limit=2)) == 2
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+from PIL import Image
+import pytest
+
+from detection_service.backends import load_backend
+from detection_service import core
+from detection_service.preprocessing import list_images
+from detection_service import quantize
+from detection_service.quantize import evaluate, frog_decisions, load_images, quantize_model
+
+
+@pytest.fixture(scope="module")
+def image_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("images")
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        array = rng.integers(0, 256, (320 + 16 * i, 400, 3), dtype=np.uint8)
+        Image.fromarray(array).save(directory / f"{i}.jpg")
+    (directory / "notes.txt").write_text("not an image")
+    return str(directory)
+
+
+def test_images_decoded_like_requests(image_dir):
+    for image in load_images(list_images(image_dir)):
+        assert image.mode == "RGB"
+        assert min(image.size) == core.Config.MODEL_INPUT_SIZE
+
+def test_frog_decisions():
+    names = {0: "bullfrog", 1: "tree_frog", 2: "tailed_frog", 3: "tench"}
+    probs = np.array([[0.3, 0.2, 0.1, 0.4], [0.1, 0.1, 0.1, 0.7]], dtype=np.float32)
+    is_frog, confidence = frog_decisions(probs, names, 0.5)
+    assert is_frog.tolist() == [True, False]
+    np.testing.assert_allclose(confidence, [0.6, 0.3], atol=1e-6)
+
+@pytest.mark.parametrize("mode", ["dynamic", "static"])
+def test_quantized_model_loads_and_evaluates(onnx_model_path, image_dir, mode):
+    source = onnx_model_path.replace(".onnx", ".pt")
+    target = quantize_model(source, mode, calibration_dir=image_dir)
+    assert target.endswith(f".int8-{mode}.onnx")
+    assert os.path.getsize(target) < os.path.getsize(onnx_model_path)
+
+    backend = load_backend("onnx", source, quantization=mode)
+    fp32 = load_backend("onnx", source)
+    assert backend.names == fp32.names
+    probs = backend.predict_probs([Image.open(list_images(image_dir)[0])])
+    assert probs.shape == (1, len(fp32.names))
+
+    report = evaluate(source, mode, image_dir)
+    assert report["images"] == 4
+    assert 0.0 <= report["is_frog_agreement"] <= 1.0
+    for key in ("fp32", "int8"):
+        assert report[key]["latency_ms"]["mean"] > 0
+        assert "rss_increase_mb" in report[key]
+
+def test_static_requires_calibration_images(onnx_model_path, tmp_path):
+    source = onnx_model_path.replace(".onnx", ".pt")
+    with pytest.raises(ValueError):
+        quantize_model(source, "static")
+    with pytest.raises(ValueError):
+        quantize_model(source, "static", calibration_dir=str(tmp_path))
+
+def test_evaluate_gates_on_min_agreement(monkeypatch, capsys):
+    report = {"top1_agreement": 0.97, "is_frog_agreement": 1.0}
+    monkeypatch.setattr(quantize, "evaluate", lambda *args: report)
+    quantize.main(["evaluate", "--images", "unused", "--min-agreement", "0.95"])
+    with pytest.raises(SystemExit) as failed:
+        quantize.main(["evaluate", "--images", "unused", "--min-agreement", "0.99"])
+    assert failed.value.code == 1
+    assert quantize.agreement_failures(report, 0.99) == ["top1_agreement 0.97 is below 0.99"]
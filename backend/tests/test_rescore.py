@@ -0,0 +1,92 @@
+import json
+import os
+
+from PIL import Image
+import pytest
+
+from detection_service import core, main, rescore
+
+
+def write_jpeg(path, size, color):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, color).save(path, format="JPEG")
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "images"
+    write_jpeg(str(root / "a.jpg"), (400, 320), (0, 200, 0))
+    write_jpeg(str(root / "posts" / "b.jpg"), (640, 480), (40, 80, 120))
+    write_jpeg(str(root / "posts" / "c.jpg"), (500, 500), (200, 30, 30))
+    write_jpeg(str(root / "tiny.jpg"), (100, 100), (1, 2, 3))
+    (root / "broken.png").write_bytes(b"not an image")
+    return str(root)
+
+
+class RescoreConfig(main.Config):
+    BATCH_MAX_SIZE = 2
+    NEAR_DUPLICATES_ENABLED = False
+
+
+def test_plan_prefers_listed_derivatives():
+    detector = main.detector
+    keys = ["a.jpg", "a.jpg.model.jpg", "b.jpg"]
+    assert rescore.plan(keys, detector.is_derivative_key, detector.derivative_key) == [
+        ("a.jpg", "a.jpg", False), ("b.jpg", "b.jpg", False)
+    ]
+    assert rescore.plan(keys, detector.is_derivative_key, detector.derivative_key, use_derivatives=True) == [
+        ("a.jpg", "a.jpg.model.jpg", True), ("b.jpg", "b.jpg", False)
+    ]
+
+def test_rescore_writes_scores_matching_the_api_and_resumes(corpus, tmp_path):
+    output = str(tmp_path / "rescored")
+    summary = rescore.rescore(corpus, output, RescoreConfig, workers=1, chunk_size=2, flush_rows=2)
+    assert summary["images"] == 5 and summary["scored"] == 3 and summary["errors"] == 2
+    assert summary["parts"] >= 2
+
+    frame = rescore.load_results(output).set_index("key")
+    assert sorted(frame.index) == ["a.jpg", "broken.png", "posts/b.jpg", "posts/c.jpg", "tiny.jpg"]
+    assert frame.loc["tiny.jpg", "status"] == 400 and "too small" in frame.loc["tiny.jpg", "error"]
+    assert frame.loc["broken.png", "status"] == 400
+
+    with open(os.path.join(output, rescore.MANIFEST)) as f:
+        manifest = json.load(f)
+    assert manifest["top_k"] == len(manifest["classes"]) == len(main.model.names)
+
+    # Same decisions and frog scores as the API, and the full distribution
+    with open(os.path.join(corpus, "posts", "b.jpg"), "rb") as f:
+        expected = main.detector.predict([main.detector.decode(f.read())])[0]
+    row = frame.loc["posts/b.jpg"]
+    assert row["is_frog"] == expected["is_frog"]
+    assert row["confidence"] == pytest.approx(expected["confidence"], abs=1e-4)
+    for name, score in expected["details"].items():
+        assert row[f"score_{name}"] == pytest.approx(score, abs=1e-4)
+    assert len(row["top_probs"]) == len(manifest["classes"])
+    assert row["top_probs"].sum() == pytest.approx(1.0, abs=1e-3)
+    assert list(row["top_probs"]) == sorted(row["top_probs"], reverse=True)
+
+    # Rerunning resumes: everything is already written
+    summary = rescore.rescore(corpus, output, RescoreConfig, workers=1)
+    assert summary["skipped"] == 5 and summary["scored"] == summary["errors"] == 0
+
+    # Errors can be retried; the new rows supersede the old ones
+    summary = rescore.rescore(corpus, output, RescoreConfig, workers=1, retry_errors=True)
+    assert summary["skipped"] == 3 and summary["errors"] == 2
+    assert len(rescore.load_results(output)) == 5
+
+def test_resume_refuses_a_different_run(corpus, tmp_path):
+    output = str(tmp_path / "rescored")
+    rescore.rescore(corpus, output, RescoreConfig, workers=1, limit=1)
+
+    class NewThreshold(RescoreConfig):
+        FROG_THRESHOLD = 0.3
+
+    with pytest.raises(ValueError, match="threshold"):
+        rescore.rescore(corpus, output, NewThreshold, workers=1)
+
+def test_cli_ignores_api_vector_store(monkeypatch):
+    monkeypatch.setattr(core.Config, "VECTOR_STORE_PATH", "/srv/api-vectors")
+    runs = []
+    monkeypatch.setattr(rescore, "rescore", lambda source, output, config, **kwargs: runs.append(config) or {})
+    rescore.main(["--source", "images", "--output", "results"])
+    assert runs[0].VECTOR_STORE_PATH is None
@@ -0,0 +1,50 @@
+import io
+import os
+
+from botocore.exceptions import ClientError
+import pytest
+
+from detection_service.results import FileResultStore, S3ResultStore, result_store_from_uri
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+def test_file_store_round_trip(tmp_path):
+    store = FileResultStore(str(tmp_path))
+    assert store.get("bucket", "a/b.jpg") is None
+    store.put("bucket", "a/b.jpg", {"status": "done"})
+    store.put("bucket", "../escape.jpg", {"status": "error"})
+    assert store.get("bucket", "a/b.jpg") == {"status": "done"}
+    assert store.get("bucket", "../escape.jpg") == {"status": "error"}
+    assert sorted(os.listdir(tmp_path)) == ["bucket%2F..%2Fescape.jpg.json", "bucket%2Fa%2Fb.jpg.json"]
+
+def test_s3_store_round_trip():
+    client = FakeS3()
+    store = result_store_from_uri("s3://results-bucket/frog-results", client)
+    assert isinstance(store, S3ResultStore)
+    assert store.get("uploads", "posts/1.jpg") is None
+
+    store.put("uploads", "posts/1.jpg", {"status": "done"})
+    assert ("results-bucket", "frog-results/uploads/posts/1.jpg.json") in client.objects
+    assert store.get("uploads", "posts/1.jpg") == {"status": "done"}
+    assert store.owns("results-bucket", "frog-results/uploads/posts/1.jpg.json")
+    assert not store.owns("uploads", "posts/1.jpg")
+
+def test_result_store_from_uri(tmp_path):
+    assert result_store_from_uri(None) is None
+    assert isinstance(result_store_from_uri(f"file://{tmp_path}"), FileResultStore)
+    with pytest.raises(ValueError):
+        result_store_from_uri("s3://bucket/prefix")
+    with pytest.raises(ValueError):
+        result_store_from_uri("redis://localhost")
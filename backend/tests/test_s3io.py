@@ -0,0 +1,63 @@
+import hashlib
+
+import pytest
+from botocore.exceptions import ClientError
+
+from detection_service.s3io import LocalS3Client, ObjectTooLargeError, S3Fetcher, client_config
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = LocalS3Client(str(tmp_path))
+    client.put_object(Bucket="bucket", Key="small.bin", Body=b"x" * 100)
+    client.put_object(Bucket="bucket", Key="large.bin", Body=bytes(range(256)) * 1000)
+    client.put_object(Bucket="bucket", Key="empty.bin", Body=b"")
+    return client
+
+
+def test_small_objects_need_one_request(client):
+    fetcher = S3Fetcher(client, header_bytes=1024)
+    fetched = fetcher.fetch("bucket", "small.bin")
+    assert fetched.data == b"x" * 100
+    assert fetched.digest.hexdigest() == hashlib.sha256(b"x" * 100).hexdigest()
+    assert client.requests == 1
+
+def test_large_objects_stream_the_remainder(client):
+    fetcher = S3Fetcher(client, header_bytes=1024, chunk_size=10_000)
+    headers = []
+    fetched = fetcher.fetch("bucket", "large.bin", inspect_header=headers.append)
+    assert fetched.data == bytes(range(256)) * 1000
+    assert fetched.digest.hexdigest() == hashlib.sha256(fetched.data).hexdigest()
+    assert headers == [fetched.data[:1024]]
+    assert client.requests == 2
+
+def test_rejections_skip_the_body(client):
+    fetcher = S3Fetcher(client, header_bytes=1024, max_bytes=10_000)
+    with pytest.raises(ObjectTooLargeError):
+        fetcher.fetch("bucket", "large.bin")
+
+    def reject(head):
+        raise ValueError("bad header")
+
+    with pytest.raises(ValueError):
+        S3Fetcher(client, header_bytes=1024).fetch("bucket", "large.bin", inspect_header=reject)
+    assert client.requests == 2
+
+def test_empty_and_missing_objects(client):
+    fetcher = S3Fetcher(client)
+    assert fetcher.fetch("bucket", "empty.bin").data == b""
+    with pytest.raises(ClientError):
+        fetcher.fetch("bucket", "missing.bin")
+
+def test_prefetch_preserves_order(client):
+    fetcher = S3Fetcher(client, max_workers=4, header_bytes=1024)
+    futures = fetcher.prefetch([("bucket", "large.bin"), ("bucket", "small.bin"), ("bucket", "missing.bin")])
+    assert len(futures[0].result().data) == 256_000
+    assert futures[1].result().data == b"x" * 100
+    with pytest.raises(ClientError):
+        futures[2].result()
+
+def test_client_config_pool_size():
+    config = client_config(max_pool_connections=32)
+    assert config.max_pool_connections == 32
+    assert config.tcp_keepalive is True
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from detection_service.scoring import FrogScorer
+
+NAMES = {0: "tench", 1: "Bullfrog", 2: "tree_frog", 3: "goldfish", 4: "tailed_frog"}
+FROG_CLASSES = frozenset(["bullfrog", "tailed_frog", "tree_frog"])
+
+
+def reference(probs, threshold):
+    """The original per-request name search, for comparison."""
+    scores = {}
+    for class_name in FROG_CLASSES:
+        for i, name in NAMES.items():
+            if name.lower() == class_name:
+                scores[class_name] = float(probs[i])
+    total = sum(scores.values())
+    return {
+        "is_frog": total >= threshold,
+        "confidence": round(total, 4),
+        "details": {k: round(v, 4) for k, v in scores.items()},
+    }
+
+
+def test_indices_are_resolved_once():
+    scorer = FrogScorer(NAMES, FROG_CLASSES, 0.5)
+    assert scorer.classes == ("bullfrog", "tailed_frog", "tree_frog")
+    assert scorer.indices.tolist() == [1, 4, 2]
+
+def test_missing_class_fails_at_construction():
+    with pytest.raises(ValueError, match="tailed_frog"):
+        FrogScorer({0: "bullfrog", 1: "tree_frog"}, FROG_CLASSES, 0.5)
+
+def test_batch_decisions_match_per_image_search():
+    rng = np.random.default_rng(0)
+    probs = rng.dirichlet(np.ones(len(NAMES)) * 0.3, size=32).astype(np.float32)
+    scorer = FrogScorer(NAMES, FROG_CLASSES, 0.5)
+
+    decisions = scorer.decide(probs)
+    assert decisions == [reference(row, 0.5) for row in probs]
+    assert any(d["is_frog"] for d in decisions) and not all(d["is_frog"] for d in decisions)
+
+    is_frog, confidence = scorer.decisions(probs)
+    assert is_frog.tolist() == [d["is_frog"] for d in decisions]
+    np.testing.assert_allclose(confidence, [sum(reference(row, 0.5)["details"].values()) for row in probs], atol=1e-3)
+
+def test_single_probability_vector():
+    scorer = FrogScorer(NAMES, FROG_CLASSES, 0.5)
+    probs = np.array([0.1, 0.2, 0.3, 0.15, 0.25], dtype=np.float32)
+    assert scorer.confidences(probs) == pytest.approx({"bullfrog": 0.2, "tailed_frog": 0.25, "tree_frog": 0.3})
+    assert scorer.decide(probs) == [reference(probs, 0.5)]
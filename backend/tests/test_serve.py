@@ -0,0 +1,60 @@
+import os
+import pickle
+
+import pytest
+
+from detection_service import serve
+from detection_service.batching import BatchScheduler
+from detection_service.cache import SQLiteCacheBackend
+
+
+def test_threads_are_split_between_workers():
+    assert serve.threads_per_worker(4, cpus=16) == 4
+    assert serve.threads_per_worker(3, cpus=8) == 2
+    assert serve.threads_per_worker(8, cpus=4) == 1
+
+def test_configure_threads_keeps_explicit_settings(monkeypatch):
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "INFERENCE_THREADS", "PREPROCESS_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PREPROCESS_WORKERS", "1")
+    serve.configure_threads(3)
+    assert os.environ["OMP_NUM_THREADS"] == "3"
+    assert os.environ["INFERENCE_THREADS"] == "3"
+    assert os.environ["PREPROCESS_WORKERS"] == "1"
+
+def run_in_fork(fn):
+    """Run ``fn`` in a forked child and return its (picklable) result."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            payload = pickle.dumps(("ok", fn()))
+        except BaseException as e:
+            payload = pickle.dumps(("error", repr(e)))
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(payload)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        outcome, value = pickle.loads(f.read())
+    os.waitpid(pid, 0)
+    assert outcome == "ok", value
+    return value
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_scheduler_and_sqlite_cache_work_after_fork(tmp_path):
+    scheduler = BatchScheduler(lambda items: [item + 1 for item in items], max_wait_ms=1)
+    assert scheduler.submit(1).result(timeout=2) == 2
+    cache = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    cache.set("parent", {"value": 1})
+
+    def child():
+        scheduler.after_fork()
+        cache.after_fork()
+        cache.set("child", {"value": 2})
+        return scheduler.submit(41).result(timeout=2), cache.get("parent")
+
+    assert run_in_fork(child) == (42, {"value": 1})
+    assert cache.get("child") == {"value": 2}
+    assert scheduler.submit(2).result(timeout=2) == 3
@@ -0,0 +1,34 @@
+import json
+import logging
+import time
+
+from detection_service.startup import StartupProfiler
+
+
+def test_stages_are_timed_and_reported(caplog):
+    profiler = StartupProfiler()
+    with profiler.stage("import:thing"):
+        time.sleep(0.01)
+    with profiler.stage("model_load"):
+        pass
+
+    with caplog.at_level(logging.INFO):
+        report = profiler.emit(logging.getLogger("test"))
+
+    assert list(report["stages_ms"]) == ["import:thing", "model_load"]
+    assert report["stages_ms"]["import:thing"] >= 10
+    assert report["total_ms"] >= report["stages_ms"]["import:thing"]
+    assert isinstance(report["heavy_modules_loaded"], list)
+
+    logged = caplog.records[-1].getMessage()
+    assert logged.startswith("Startup profile: ")
+    assert json.loads(logged[len("Startup profile: "):]) == report
+
+def test_stage_recorded_when_it_raises():
+    profiler = StartupProfiler()
+    try:
+        with profiler.stage("model_load"):
+            raise RuntimeError("missing model")
+    except RuntimeError:
+        pass
+    assert "model_load" in profiler.report()["stages_ms"]
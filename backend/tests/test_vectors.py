@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from detection_service.scoring import FrogScorer
+from detection_service.vectors import TopKVectors, VectorStore, load_vectors, main, redecide, top_k
+
+NAMES = {0: "tench", 1: "bullfrog", 2: "tree_frog", 3: "African_chameleon", 4: "tailed_frog", 5: "goldfish"}
+CLASS_LIST = [NAMES[index] for index in range(len(NAMES))]
+FROG_CLASSES = frozenset(["bullfrog", "tailed_frog", "tree_frog"])
+
+
+def digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def random_probs(n, seed=0):
+    logits = np.random.default_rng(seed).normal(scale=3.0, size=(n, len(NAMES)))
+    probs = np.exp(logits)
+    return (probs / probs.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_top_k_orders_classes_by_probability():
+    probs = np.array([[0.1, 0.5, 0.15, 0.25], [0.4, 0.3, 0.2, 0.1]], dtype=np.float32)
+    indices, values = top_k(probs, 2)
+    assert indices.tolist() == [[1, 3], [0, 1]]
+    np.testing.assert_allclose(values, [[0.5, 0.25], [0.4, 0.3]])
+    indices, values = top_k(probs, 10)
+    assert indices.tolist() == [[1, 3, 2, 0], [0, 1, 2, 3]]
+
+
+def test_store_round_trips_compact_vectors(tmp_path):
+    probs = random_probs(50)
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=4, flush_rows=25)
+    for start in range(0, 50, 15):
+        store.add([digest(i) for i in range(start, min(start + 15, 50))], probs[start:start + 15])
+    assert store.written + store.pending == 50
+
+    vectors = store.load()
+    assert store.written == 50 and store.pending == 0
+    assert len(vectors) == 50
+    assert vectors.classes.dtype == np.uint16 and vectors.probs.dtype == np.float16
+    assert vectors.hex_digests() == [digest(i) for i in range(50)]
+    indices, values = top_k(probs, 4)
+    np.testing.assert_array_equal(vectors.classes, indices)
+    np.testing.assert_allclose(vectors.probs, values, atol=1e-3)
+
+
+def test_rows_without_digest_are_skipped(tmp_path):
+    store = VectorStore(str(tmp_path), "v1", NAMES)
+    store.add([digest(0), None], random_probs(2))
+    assert store.load().hex_digests() == [digest(0)]
+
+
+def test_latest_vector_wins_across_segments(tmp_path):
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=2)
+    store.add([digest(0), digest(1)], np.array([[0.9, 0.1, 0, 0, 0, 0], [0, 0.9, 0.1, 0, 0, 0]]))
+    store.flush()
+    store.add([digest(0)], np.array([[0, 0, 0, 0, 0.8, 0.2]]))
+
+    assert store.load().hex_digests() == [digest(1), digest(0)]
+    manifest, vectors = load_vectors(str(tmp_path))
+    assert manifest == {"model_version": "v1", "classes": CLASS_LIST, "top_k": 2}
+    assert vectors.classes[1].tolist() == [4, 5]
+
+
+def test_flush_writes_without_holding_the_lock(tmp_path, monkeypatch):
+    from detection_service import vectors
+
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=2)
+    savez = np.savez
+
+    def add_while_writing(file, **arrays):
+        # A prediction arriving mid-write must not wait for the disk
+        assert store._lock.acquire(blocking=False)
+        store._lock.release()
+        store.add([digest(1)], random_probs(1))
+        savez(file, **arrays)
+
+    monkeypatch.setattr(vectors.np, "savez", add_while_writing)
+    store.add([digest(0)], random_probs(1))
+    store.flush()
+    assert store.written == 1 and store.pending == 1
+    monkeypatch.undo()
+    assert store.load().hex_digests() == [digest(0), digest(1)]
+
+
+def test_full_buffer_is_written_off_the_adding_thread(tmp_path, monkeypatch):
+    from detection_service import vectors
+
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=2, flush_rows=2)
+    savez = np.savez
+    release = threading.Event()
+
+    def slow_savez(file, **arrays):
+        assert threading.current_thread() is store._writer
+        assert release.wait(timeout=5)
+        savez(file, **arrays)
+
+    monkeypatch.setattr(vectors.np, "savez", slow_savez)
+    store.add([digest(0), digest(1)], random_probs(2))
+    # add() returned while the write is still blocked
+    assert store.written == 0 and store.pending == 2
+    release.set()
+    store.flush()
+    assert store.written == 2 and store.pending == 0
+    monkeypatch.undo()
+    assert store.load().hex_digests() == [digest(0), digest(1)]
+
+
+def test_other_model_gets_its_own_directory(tmp_path, caplog):
+    VectorStore(str(tmp_path), "v1", NAMES, k=4).add([digest(0)], random_probs(1))
+    assert VectorStore(str(tmp_path), "v1", NAMES, k=4).directory == str(tmp_path)
+
+    # A redeploy that only touches the model file changes its fingerprint
+    store = VectorStore(str(tmp_path), "v1-redeployed", NAMES, k=4)
+    assert "different model_version" in caplog.text
+    assert os.path.dirname(store.directory) == str(tmp_path)
+    store.add([digest(1)], random_probs(1))
+    assert store.load().hex_digests() == [digest(1)]
+    assert load_vectors(store.directory)[0]["model_version"] == "v1-redeployed"
+    assert VectorStore(str(tmp_path), "v1-redeployed", NAMES, k=4).directory == store.directory
+    assert load_vectors(str(tmp_path))[0]["model_version"] == "v1"
+
+    assert VectorStore(str(tmp_path), "v1", NAMES, k=3).directory not in (str(tmp_path), store.directory)
+
+
+def test_redecide_matches_scorer_with_full_vectors(tmp_path):
+    probs = random_probs(1000, seed=1)
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=len(NAMES))
+    store.add([digest(i) for i in range(1000)], probs)
+    vectors = store.load()
+
+    for threshold in (0.1, 0.5, 0.8):
+        expected_frog, expected_confidence = FrogScorer(NAMES, FROG_CLASSES, threshold).decisions(probs)
+        is_frog, confidence = redecide(vectors, CLASS_LIST, FROG_CLASSES, threshold)
+        np.testing.assert_allclose(confidence, expected_confidence, atol=2e-3)
+        # float16 only moves decisions that sat within rounding of the threshold
+        borderline = np.abs(expected_confidence - threshold) < 2e-3
+        np.testing.assert_array_equal(is_frog[~borderline], expected_frog[~borderline])
+
+
+def test_redecide_treats_classes_outside_top_k_as_zero():
+    vectors = TopKVectors(
+        np.zeros(2, dtype="V32"),
+        np.array([[1, 3], [0, 5]], dtype=np.uint16),
+        np.array([[0.6, 0.3], [0.5, 0.4]], dtype=np.float16),
+    )
+    is_frog, confidence = redecide(vectors, CLASS_LIST, FROG_CLASSES, 0.5)
+    assert is_frog.tolist() == [True, False]
+    np.testing.assert_allclose(confidence, [0.6, 0.0], atol=1e-3)
+
+
+def test_lookalikes_veto_frogs_they_outweigh():
+    vectors = TopKVectors(
+        np.zeros(3, dtype="V32"),
+        np.array([[2, 3, 0], [3, 2, 0], [1, 3, 0]], dtype=np.uint16),
+        np.array([[0.5, 0.3, 0.2], [0.45, 0.35, 0.2], [0.3, 0.3, 0.4]], dtype=np.float16),
+    )
+    is_frog, _ = redecide(vectors, CLASS_LIST, FROG_CLASSES, 0.3)
+    assert is_frog.tolist() == [True, True, True]
+    is_frog, _ = redecide(vectors, CLASS_LIST, FROG_CLASSES, 0.3, lookalikes=["African_chameleon"])
+    assert is_frog.tolist() == [True, False, False]
+    with pytest.raises(ValueError):
+        redecide(vectors, CLASS_LIST, FROG_CLASSES, 0.3, lookalikes=["axolotl"])
+
+
+def test_cli_reports_changed_decisions(tmp_path, capsys, monkeypatch):
+    from detection_service import core
+
+    monkeypatch.setattr(core.Config, "FROG_THRESHOLD", 0.5)
+    store = VectorStore(str(tmp_path), "v1", NAMES, k=3)
+    store.add([digest(0), digest(1)], np.array([[0, 0.6, 0, 0, 0, 0.4], [0, 0.35, 0, 0.65, 0, 0]]))
+    store.flush()
+
+    main(["--store", str(tmp_path), "--threshold", "0.3"])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["records"] == 2
+    assert summary["frogs_at_current_policy"] == 1
+    assert summary["frogs"] == 2
+    assert summary["changed_digests"] == [digest(1)]
@@ -2,19 +2,40 @@ import type { RequestHandler } from '@sveltejs/kit';
 
 const API_URL = 'https://etvgap7uqg.execute-api.us-east-1.amazonaws.com';
 
+// Uploads are classified as soon as they land in S3. This route checks the
+// stored result once and answers 202 while it is pending, so the page polls
+// instead of holding a request open; `classify: true` classifies synchronously.
+const callLambda = (body: Record<string, unknown>) =>
+	fetch(API_URL, {
+		method: 'POST',
+		headers: {
+			'Content-Type': 'application/json'
+		},
+		body: JSON.stringify(body)
+	});
+
 export const POST: RequestHandler = async ({ request }) => {
 	try {
 		// Parse the request body from the client
-		const { bucket, key } = await request.json();
+		const { bucket, key, classify } = await request.json();
+
+		if (!classify) {
+			const stored = await callLambda({ action: 'result', bucket, key });
+			if (stored.status === 404) {
+				return new Response(JSON.stringify({ status: 'pending' }), { status: 202 });
+			}
+			if (stored.ok) {
+				const record = await stored.json();
+				if (record.status === 'done') {
+					return new Response(JSON.stringify(record.result), { status: 200 });
+				}
+				return new Response(JSON.stringify({ error: record.error }), { status: record.statusCode ?? 500 });
+			}
+			// Any other status means event mode isn't deployed; classify now
+		}
 
 		// Make the POST request to the Lambda endpoint
-		const lambdaResponse = await fetch(API_URL, {
-			method: 'POST',
-			headers: {
-				'Content-Type': 'application/json'
-			},
-			body: JSON.stringify({ bucket, key })
-		});
+		const lambdaResponse = await callLambda({ bucket, key });
 
 		if (!lambdaResponse.ok) {
 			return new Response(JSON.stringify({ error: 'Failed to call Lambda function' }), {